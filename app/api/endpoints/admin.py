@@ -6,7 +6,7 @@ and security oversight. Requires admin privileges.
 """
 
 import logging
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
@@ -16,6 +16,11 @@ from app.db.models import User
 from app.core.security import get_current_user, require_admin, get_password_hash, verify_password
 from app.utils.audit_logger import audit_admin_action, AuditEventType
 from app.middleware.session_monitoring import get_session_monitor
+from app.services.vector_store_service import get_vector_store_service
+from app.services.email.email_store import EmailStore
+from app.services.embedding_service import get_embedding_service
+from app.services.llm_scheduler import get_llm_scheduler
+from app.utils.caching import get_cache_stats
 
 logger = logging.getLogger("personal_ai_agent")
 router = APIRouter()
@@ -67,6 +72,88 @@ class SystemStats(BaseModel):
     active_sessions: int
 
 
+class VectorUserMemory(BaseModel):
+    user_id: Optional[int]
+    loaded_indices: int
+    resident_bytes: int
+    mapped_bytes: int
+
+
+class EmailIndexCacheStats(BaseModel):
+    budget_bytes: int
+    cached_bytes: int
+    cached_indices: int
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    invalidations: int
+
+
+class VectorStoreMemoryStats(BaseModel):
+    budget_bytes: int
+    resident_bytes: int
+    mapped_bytes: int
+    loaded_indices: int
+    mapped_indices: int
+    evictions: int
+    users: List[VectorUserMemory]
+    email_index_cache: EmailIndexCacheStats
+
+
+class EmbeddingExecutorStats(BaseModel):
+    workers: int
+    max_pending: int
+    pending: int
+    max_observed_pending: int
+    completed: int
+    failed: int
+    busy_seconds: float
+
+
+class EmbeddingCacheStats(BaseModel):
+    max_bytes: int
+    cached_bytes: int
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    writes: int
+    evictions: int
+
+
+class EmbeddingStats(BaseModel):
+    model_name: str
+    microbatching_enabled: bool
+    max_batch_size: int
+    max_wait_ms: float
+    requests: int
+    batches: int
+    mean_batch_size: float
+    batch_sizes: Dict[str, int]
+    mean_wait_ms: float
+    max_wait_observed_ms: float
+    executor: EmbeddingExecutorStats
+    cache: Optional[EmbeddingCacheStats]
+
+
+class LLMQueueStats(BaseModel):
+    max_pending: int
+    max_pending_per_user: int
+    pending: int
+    waiting_users: int
+    running: bool
+    max_observed_pending: int
+    completed: int
+    failed: int
+    cancelled: int
+    rejected_full: int
+    rejected_user: int
+    mean_wait_ms: float
+    max_wait_ms: float
+    mean_service_ms: float
+
+
 def get_client_ip(request: Request) -> str:
     """Extract client IP address from request"""
     return request.client.host if request.client else "unknown"
@@ -294,6 +381,14 @@ async def delete_user(
     db.delete(user)
     db.commit()
     
+    # Drop the user's document and email vectors
+    try:
+        removed_vectors = get_vector_store_service().delete_user_vectors(user_id)
+        removed_emails = EmailStore().delete_user_emails(user_id)
+        logger.info(f"Removed {removed_vectors} document vectors and {removed_emails} email indices for user {username}")
+    except Exception as e:
+        logger.error(f"Error deleting vectors for user {username}: {str(e)}")
+    
     # Audit the action
     audit_admin_action(
         admin_user_id=str(current_user.id),
@@ -380,4 +475,108 @@ async def get_system_stats(
         ip_address=get_client_ip(request)
     )
     
-    return stats
\ No newline at end of file
+    return stats
+
+
+@router.get("/vector-store/stats", response_model=VectorStoreMemoryStats)
+async def get_vector_store_stats(
+    request: Request,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get vector index memory usage.
+    
+    Requires admin privileges. Shows resident and memory-mapped bytes of the
+    loaded vector indices per user, the memory budget and LRU evictions so far,
+    and the hit/miss counters of the resident email index cache.
+    """
+    stats = VectorStoreMemoryStats(
+        **get_vector_store_service().get_memory_stats(),
+        email_index_cache=EmailIndexCacheStats(**EmailStore.get_cache_stats())
+    )
+    
+    # Audit the action
+    audit_admin_action(
+        admin_user_id=str(current_user.id),
+        admin_username=current_user.username,
+        action="get_vector_store_stats",
+        ip_address=get_client_ip(request)
+    )
+    
+    return stats
+
+
+@router.get("/embeddings/stats", response_model=EmbeddingStats)
+async def get_embedding_stats(
+    request: Request,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get query embedding micro-batching statistics.
+    
+    Requires admin privileges. Shows how many single-text embedding requests
+    were merged into how many encode calls, the batch-size distribution, how
+    long requests waited for their batch, the queue of the embedding worker
+    threads and the hit rate of the persistent embedding cache.
+    """
+    stats = EmbeddingStats(**get_embedding_service().get_stats())
+    
+    # Audit the action
+    audit_admin_action(
+        admin_user_id=str(current_user.id),
+        admin_username=current_user.username,
+        action="get_embedding_stats",
+        ip_address=get_client_ip(request)
+    )
+    
+    return stats
+
+
+@router.get("/llm/stats", response_model=LLMQueueStats)
+async def get_llm_queue_stats(
+    request: Request,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get LLM inference queue statistics.
+    
+    Requires admin privileges. Shows how many answers are waiting for the
+    model and for how many users, how long they waited and took to generate,
+    and how many requests were turned away because the queue was full.
+    """
+    stats = LLMQueueStats(**get_llm_scheduler().get_stats())
+    
+    # Audit the action
+    audit_admin_action(
+        admin_user_id=str(current_user.id),
+        admin_username=current_user.username,
+        action="get_llm_queue_stats",
+        ip_address=get_client_ip(request)
+    )
+    
+    return stats
+
+
+@router.get("/cache/stats", response_model=Dict[str, Dict[str, Any]])
+async def get_in_memory_cache_stats(
+    request: Request,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get in-memory cache statistics.
+    
+    Requires admin privileges. Shows size, hit rate and evictions of each
+    in-memory cache, including the answer cache (exact and near-duplicate
+    hits, invalidations and memory use).
+    """
+    stats = get_cache_stats()
+    
+    # Audit the action
+    audit_admin_action(
+        admin_user_id=str(current_user.id),
+        admin_username=current_user.username,
+        action="get_cache_stats",
+        ip_address=get_client_ip(request)
+    )
+    
+    return stats
@@ -10,10 +10,12 @@ from datetime import datetime
 from pathlib import Path
 
 from app.core.config import settings
+from app.core.exceptions import VectorStoreError
 from app.core.security import get_current_user
 from app.db.database import get_db
 from app.db.models import Document, User
 from app.schemas.document import DocumentCreate, DocumentResponse
+from app.services.vector_store_service import get_vector_store_service
 from app.utils.document_processor import process_document
 from app.utils.file_security import (
     sanitize_filename, 
@@ -250,6 +252,12 @@ def delete_document(
         except Exception as e:
             logger.error(f"Error deleting document file: {str(e)}, document ID {document_id}")
     
+    # Remove the document's vectors so searches stop returning them right away
+    try:
+        get_vector_store_service().delete_document_vectors(document.vector_namespace)
+    except VectorStoreError as e:
+        logger.error(f"Error deleting document vectors: {e.message}, document ID {document_id}")
+    
     # Delete the document from the database
     db.delete(document)
     db.commit()
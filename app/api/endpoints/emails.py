@@ -23,6 +23,7 @@ from app.services.email import (
 )
 from app.utils.processors.email_processor import EmailDocumentProcessor
 from app.core.config import settings
+from app.core.exceptions import InferenceQueueFullError
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/emails", tags=["emails"])
@@ -139,6 +140,8 @@ async def query_emails(
             result_count=result['result_count']
         )
         
+    except InferenceQueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Error processing email query: {e}")
         raise HTTPException(
@@ -165,8 +168,8 @@ async def search_emails(
         List of matching email chunks
     """
     try:
-        from app.services.embedding_service import SentenceTransformerEmbeddingService
-        embedding_service = SentenceTransformerEmbeddingService()
+        from app.services.embedding_service import get_embedding_service
+        embedding_service = get_embedding_service()
         
         # Generate query embedding
         query_embedding = await embedding_service.generate_embedding(request.query)
@@ -366,9 +369,10 @@ async def delete_email(
                 detail="Email not found"
             )
         
-        # Delete from vector store
-        if email.vector_namespace:
-            email_store.delete_email(current_user.id, str(email_id))
+        # Delete from vector store (stored under the ID embedded in the namespace, e.g. 'gmail_42')
+        storage_email_id = email_store.get_storage_email_id(email.vector_namespace)
+        if storage_email_id:
+            email_store.delete_email(current_user.id, storage_email_id)
         
         # Delete from database
         db.delete(email)
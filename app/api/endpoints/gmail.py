@@ -788,7 +788,10 @@ async def search_emails(
 
 async def _process_synced_emails(email_account_id: int, user_id: int):
     """
-    Process and classify newly synced emails using our email processing pipeline
+    Process and classify newly synced emails using our email processing pipeline.
+    
+    Emails are handled in batches: every email in a batch is chunked, all of the
+    batch's chunks are embedded in one call and stored in one index append.
     """
     from app.db.session_manager import background_session
     
@@ -802,81 +805,127 @@ async def _process_synced_emails(email_account_id: int, user_id: int):
                 logger.error(f"Email account {email_account_id} not found for background processing")
                 return
             
-            # Get unprocessed emails (those without vector_namespace)
-            unprocessed_emails = db.query(Email).filter(
-                Email.email_account_id == email_account_id,
-                Email.vector_namespace.is_(None)  # Not yet processed
-            ).limit(50).all()  # Process in batches
-            
-            logger.info(f"Found {len(unprocessed_emails)} unprocessed emails for account {email_account.email_address}")
-            
-            # Process each email within the same session
-            for email in unprocessed_emails:
-                try:
-                    # Convert database email to our email processing format
-                    email_data = {
-                        'message_id': email.message_id,
-                        'subject': email.subject or '',
-                        'sender': email.sender_email,
-                        'recipient': email.recipient_emails,
-                        'body_text': email.body_text or '',
-                        'body_html': email.body_html or '',
-                        'date': email.sent_at,
-                        'attachments': []  # We'll handle attachments later
-                    }
-                    
-<<<<<<< HEAD
-                    # Simplified email type detection (no classification needed)
-                    email.email_type = 'email'  # Simplified - all emails are just 'email'
-                    
-                    # Process email content for vector storage with user-aware chunking
-                    processed_chunks = await email_processor.process_email(email_data, email.user_id)
-=======
-                    # Classify email using our classifier
-                    classification_tags = email_classifier.classify_email(email_data)
-                    
-                    # Update email type based on classification
-                    if 'receipt' in classification_tags:
-                        email.email_type = 'transactional'
-                    elif 'work' in classification_tags:
-                        email.email_type = 'business'
-                    elif 'personal' in classification_tags:
-                        email.email_type = 'personal'
-                    elif 'promotional' in classification_tags:
-                        email.email_type = 'promotional'
-                    else:
-                        email.email_type = 'generic'
-                    
-                    # Process email content for vector storage
-                    processed_chunks = await email_processor.process_email(email_data, email.user_id, classification_tags)
->>>>>>> origin/fix/rate-limiting-and-search-improvements
-                    
-                    if processed_chunks:
-                        # Generate unique email ID for storage
-                        email_id = f"gmail_{email.id}"
-                        
-                        # Store in vector database
-                        success = email_store.store_email_chunks(processed_chunks, email.user_id, email_id)
-                        
-                        if success:
-                            # Update vector namespace
-                            email.vector_namespace = f"user_{email.user_id}_email_{email_id}"
-                            logger.info(f"Successfully processed email {email.id}: '{email.subject[:50]}...'")
-                        else:
-                            logger.error(f"Failed to store vector chunks for email {email.id}")
-                    else:
-                        logger.warning(f"No chunks generated for email {email.id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing email {email.id}: {e}")
-                    continue
+            batch_size = max(1, settings.GMAIL_PROCESSING_BATCH_SIZE)
+            total_processed = 0
+            last_id = 0
+            while True:
+                # Get unprocessed emails (those without vector_namespace), past the last batch
+                unprocessed_emails = db.query(Email).filter(
+                    Email.email_account_id == email_account_id,
+                    Email.vector_namespace.is_(None),  # Not yet processed
+                    Email.id > last_id
+                ).order_by(Email.id).limit(batch_size).all()
+                if not unprocessed_emails:
+                    break
+                last_id = unprocessed_emails[-1].id
+                
+                logger.info(f"Processing {len(unprocessed_emails)} unprocessed emails for account {email_account.email_address}")
+                total_processed += await _process_email_batch(unprocessed_emails)
+                
+                # Commit each batch so a long backlog is not lost to a later failure
+                db.commit()
+                if len(unprocessed_emails) < batch_size:
+                    break
             
             # Session is automatically committed by the context manager
-            logger.info(f"Processed {len(unprocessed_emails)} emails for account {email_account.email_address}")
-        
+            logger.info(f"Processed {total_processed} emails for account {email_account.email_address}")
+    
     except Exception as e:
         import traceback
         logger.error(f"Error processing synced emails for account {email_account_id}, user {user_id}: {e}")
         logger.error(f"Background processing traceback: {traceback.format_exc()}")
         # Session rollback is handled automatically by the context manager
-        # Background task failures should not affect the main sync response
\ No newline at end of file
+        # Background task failures should not affect the main sync response
+
+
+async def _process_email_batch(emails: List[Email]) -> int:
+    """
+    Classify, chunk, embed and store a batch of database emails.
+    
+    Args:
+        emails: Unprocessed emails (attached to the caller's session)
+    
+    Returns:
+        Number of emails stored
+    """
+    batch = []
+    for email in emails:
+        try:
+            # Convert database email to our email processing format
+            email_data = {
+                'message_id': email.message_id,
+                'subject': email.subject or '',
+                'sender': email.sender_email,
+                'recipient': email.recipient_emails,
+                'body_text': email.body_text or '',
+                'body_html': email.body_html or '',
+                'date': email.sent_at,
+                'attachments': []  # We'll handle attachments later
+            }
+
+<<<<<<< HEAD
+            # Simplified email type detection (no classification needed)
+            email.email_type = 'email'  # Simplified - all emails are just 'email'
+            classification_tags = None
+=======
+            # Classify email using our classifier
+            classification_tags = email_classifier.classify_email(email_data)
+            
+            # Update email type based on classification
+            if 'receipt' in classification_tags:
+                email.email_type = 'transactional'
+            elif 'work' in classification_tags:
+                email.email_type = 'business'
+            elif 'personal' in classification_tags:
+                email.email_type = 'personal'
+            elif 'promotional' in classification_tags:
+                email.email_type = 'promotional'
+            else:
+                email.email_type = 'generic'
+>>>>>>> origin/fix/rate-limiting-and-search-improvements
+            
+            batch.append((email, email_data, classification_tags))
+        except Exception as e:
+            logger.error(f"Error processing email {email.id}: {e}")
+    
+    if not batch:
+        return 0
+    
+    # Chunk every email, then embed all of the batch's chunks in one call
+    try:
+        processed = await email_processor.process_emails(
+            [(email_data, email.user_id, classification_tags) for email, email_data, classification_tags in batch]
+        )
+    except Exception as e:
+        logger.error(f"Error embedding a batch of {len(batch)} emails: {e}")
+        return 0
+    
+    # Store each user's emails with one index append
+    by_user: Dict[int, List] = {}
+    for (email, _, _), processed_chunks in zip(batch, processed):
+        if processed_chunks:
+            by_user.setdefault(email.user_id, []).append((email, processed_chunks))
+        else:
+            logger.warning(f"No chunks generated for email {email.id}")
+    
+    stored = 0
+    for email_user_id, user_emails in by_user.items():
+        try:
+            # Generate unique email IDs for storage
+            stored_ids = set(email_store.store_email_batch(
+                [(f"gmail_{email.id}", processed_chunks) for email, processed_chunks in user_emails],
+                email_user_id
+            ))
+        except Exception as e:
+            logger.error(f"Failed to store vector chunks for {len(user_emails)} emails of user {email_user_id}: {e}")
+            continue
+        
+        for email, _ in user_emails:
+            email_id = f"gmail_{email.id}"
+            if email_id in stored_ids:
+                # Update vector namespace
+                email.vector_namespace = f"user_{email.user_id}_email_{email_id}"
+                stored += 1
+    
+    logger.info(f"Stored {stored} of {len(emails)} emails in batch")
+    return stored
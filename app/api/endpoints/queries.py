@@ -1,15 +1,21 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import asyncio
+import json
 import logging
 import time
 
 from app.core.security import get_current_user
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db
 from app.db.models import Document, Query, User
+from app.core.exceptions import InferenceQueueFullError
 from app.schemas.query import QueryCreate, QueryResponse
 from app.utils.llm import generate_answer
 from app.services.vector_store_service import search_similar_chunks, check_query_type
+from app.services.embedding_service import QueryContext
 # Using dynamic query handler for intelligent document parsing
 from app.utils.dynamic_query_handler import dynamic_query_handler
 from app.services.fallback_message_service import fallback_message_service
@@ -41,23 +47,23 @@ def has_documents_cached(user_id: int, db: Session) -> bool:
     return has_docs
 
 
-async def _search_emails(query: str, user_id: int, source_params: dict) -> List[dict]:
+async def _search_emails(query: str, user_id: int, source_params: dict,
+                         query_context: Optional[QueryContext] = None) -> List[dict]:
     """
     Helper function to search emails and return formatted chunks
     """
     from app.services.email.email_store import EmailStore
-    from app.services.embedding_service import SentenceTransformerEmbeddingService
     
     logger.info(f"DEBUG: _search_emails called for user {user_id} with query '{query}'")
     email_store = EmailStore()
-    embedding_service = SentenceTransformerEmbeddingService()
+    if query_context is None:
+        query_context = QueryContext(query)
     email_chunks = []
     
     try:
-        # Generate query embedding
-        logger.info(f"DEBUG: Generating embedding for query '{query}'")
-        query_embedding = await embedding_service.generate_embedding(query)
-        logger.info(f"DEBUG: Generated embedding of length {len(query_embedding)}")
+        # Reuse the request's query embedding (computed once per /ask)
+        query_embedding = await query_context.get_embedding(query)
+        logger.info(f"DEBUG: Using query embedding of length {len(query_embedding)}")
         
         # Detect if this is a financial/invoice query for smart email filtering
         financial_keywords = ["invoice", "receipt", "payment", "bill", "cost", "price", "amount", "total", "$", "paid", "charge"]
@@ -123,6 +129,134 @@ async def ask_question(
     """
     Ask a question about the documents
     """
+    return await _answer_question(query, current_user, db)
+
+
+@router.post("/ask/stream", status_code=status.HTTP_200_OK)
+async def ask_question_stream(
+    query: QueryCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ask a question about the documents, streaming the answer as Server-Sent Events
+    
+    Events:
+        token: {"text": ...} - a piece of the answer as the LLM produces it
+        correction: {"answer": ...} - the response filters changed the streamed answer; replace it
+        final: the /ask response (id, answer, sources, from_cache, response_time_ms) plus time_to_first_token_ms
+        error: {"status_code": ..., "detail": ...} - the answer failed after streaming started
+    
+    Answers that don't come from the LLM (cached, specialized handlers, fallback messages)
+    arrive as a single final event. Errors before the first token (including a full LLM
+    queue) are returned as ordinary HTTP errors.
+    
+    The request's session is closed once the response is returned, so the answer
+    runs on its own session, closed when the answer finishes or is cancelled.
+    """
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_token(text: str):
+        # Called on the LLM worker thread
+        loop.call_soon_threadsafe(events.put_nowait, text)
+    
+    answering = asyncio.create_task(_answer_question_with_own_session(query, current_user, on_token))
+    # Tokens reach the queue through call_soon_threadsafe; the end marker takes the same path so
+    # it lands behind every token the worker sent before handing back its result
+    answering.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+    
+    # Hold the response until there is something to send, so early failures keep their status code
+    try:
+        first_token = await events.get()
+    except asyncio.CancelledError:
+        answering.cancel()
+        raise
+    if first_token is None:
+        answering.result()
+    
+    return StreamingResponse(
+        _answer_events(first_token, events, answering, start_time),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _answer_question_with_own_session(query: QueryCreate, current_user: User,
+                                            on_token: Callable[[str], None]) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return await _answer_question(query, current_user, db, on_token=on_token)
+    finally:
+        db.close()
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+async def _answer_events(first_token: Optional[str], events: asyncio.Queue, answering: asyncio.Task,
+                         start_time: float) -> AsyncIterator[str]:
+    """Token events until generation ends, then a correction if the filters changed the answer, then the final event
+    
+    Closing the generator early (the client went away) cancels the answer.
+    """
+    try:
+        streamed = []
+        first_token_ms = (time.time() - start_time) * 1000 if first_token is not None else None
+        token = first_token
+        while token is not None:
+            streamed.append(token)
+            yield _sse_event("token", {"text": token})
+            token = await events.get()
+        # Anything still queued behind the end marker is part of the answer too
+        while not events.empty():
+            token = events.get_nowait()
+            if token is not None:
+                streamed.append(token)
+                yield _sse_event("token", {"text": token})
+        
+        try:
+            result = await answering
+        except HTTPException as e:
+            yield _sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+            return
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield _sse_event("error", {
+                "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "detail": error_message_service.get_http_error_detail('processing_error', str(e))
+            })
+            return
+        
+        if streamed and result["answer"].strip() != "".join(streamed).strip():
+            yield _sse_event("correction", {"answer": result["answer"]})
+        final = dict(result)
+        final["time_to_first_token_ms"] = round(first_token_ms, 2) if first_token_ms is not None else None
+        yield _sse_event("final", final)
+    finally:
+        if not answering.done():
+            answering.cancel()
+
+
+async def _answer_question(
+    query: QueryCreate,
+    current_user: User,
+    db: Session,
+    on_token: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """
+    Answer a question about the user's documents and emails, and log it
+    
+    Args:
+        query: The question and source selection
+        current_user: User asking
+        db: Database session
+        on_token: If given, called with each piece of the LLM's answer as it is produced
+        
+    Returns:
+        The /ask response
+    """
     start_time = time.time()
     logger.info(f"Query request from user {current_user.username}: '{query.question}'")
     
@@ -298,6 +432,9 @@ async def ask_question(
         else:
             logger.info(f"🔍 DEBUG: No email prioritization keywords found in query for user {current_user.id}")
         
+        # Per-request context so the query is embedded once for all searches
+        query_context = QueryContext(query.question)
+        
         # Search for similar chunks using vector search based on source selection
         try:
             document_chunks = []
@@ -310,7 +447,7 @@ async def ask_question(
                 # Search emails first when prioritized
                 if source_params['search_emails']:
                     logger.info(f"DEBUG: Calling _search_emails for user {current_user.id}")
-                    email_chunks = await _search_emails(query.question, current_user.id, source_params)
+                    email_chunks = await _search_emails(query.question, current_user.id, source_params, query_context)
                     logger.info(f"DEBUG: Found {len(email_chunks)} email chunks (prioritized) for user {current_user.id}")
                 else:
                     logger.info(f"DEBUG: search_emails=False, skipping email search for user {current_user.id}")
@@ -320,7 +457,8 @@ async def ask_question(
                     document_chunks = await search_similar_chunks(
                         query.question,
                         user_id=current_user.id,
-                        document_id=source_params['document_id']
+                        document_id=source_params['document_id'],
+                        query_context=query_context
                     )
                     logger.info(f"DEBUG: Found {len(document_chunks)} document chunks (after email priority)")
             else:
@@ -330,12 +468,13 @@ async def ask_question(
                     document_chunks = await search_similar_chunks(
                         query.question,
                         user_id=current_user.id,
-                        document_id=source_params['document_id']
+                        document_id=source_params['document_id'],
+                        query_context=query_context
                     )
                     logger.info(f"Found {len(document_chunks)} document chunks")
                 
                 if source_params['search_emails']:
-                    email_chunks = await _search_emails(query.question, current_user.id, source_params)
+                    email_chunks = await _search_emails(query.question, current_user.id, source_params, query_context)
                     logger.info(f"Found {len(email_chunks)} email chunks")
             
             # Combine chunks with prioritization
@@ -530,7 +669,9 @@ async def ask_question(
         else:
             # Try dynamic query routing first
             try:
-                dynamic_answer = await dynamic_query_handler.handle_query(query.question, current_user.id, chunks, db)
+                dynamic_answer = await dynamic_query_handler.handle_query(
+                    query.question, current_user.id, chunks, db, query_context=query_context
+                )
                 if dynamic_answer:
                     logger.info("Query handled by specialized handler")
                     answer = dynamic_answer
@@ -539,11 +680,15 @@ async def ask_question(
                     # Fall back to LLM generation
                     logger.info("No specialized handler available, using LLM")
                     try:
-                        answer, from_cache = await generate_answer(query.question, chunks)
+                        answer, from_cache = await generate_answer(
+                            query.question, chunks, user_id=current_user.id, on_token=on_token, query_context=query_context
+                        )
                     except (BrokenPipeError, OSError, IOError) as pipe_error:
                         logger.error(f"Broken pipe error while generating answer: {str(pipe_error)}")
                         answer = error_message_service.get_connection_error_message()
                         from_cache = False
+                    except InferenceQueueFullError:
+                        raise
                     except Exception as llm_error:
                         logger.error(f"Error generating answer: {str(llm_error)}")
                         if "broken pipe" in str(llm_error).lower() or "errno 32" in str(llm_error).lower():
@@ -554,15 +699,22 @@ async def ask_question(
                                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail=error_message_service.get_http_error_detail('generation_error')
                             )
+            except InferenceQueueFullError:
+                # Busy: answered with 503/429, not retried
+                raise
             except Exception as routing_error:
                 logger.error(f"Error in query routing: {str(routing_error)}")
                 # Fall back to LLM generation if routing fails
                 try:
-                    answer, from_cache = await generate_answer(query.question, chunks)
+                    answer, from_cache = await generate_answer(
+                        query.question, chunks, user_id=current_user.id, on_token=on_token, query_context=query_context
+                    )
                 except (BrokenPipeError, OSError, IOError) as pipe_error:
                     logger.error(f"Broken pipe error while generating answer: {str(pipe_error)}")
                     answer = error_message_service.get_connection_error_message()
                     from_cache = False
+                except InferenceQueueFullError:
+                    raise
                 except Exception as llm_error:
                     logger.error(f"Error generating answer: {str(llm_error)}")
                     if "broken pipe" in str(llm_error).lower() or "errno 32" in str(llm_error).lower():
@@ -622,8 +774,8 @@ async def ask_question(
                 "response_time_ms": round(response_time, 2),
                 "sources": sources
             }
-    except HTTPException:
-        # Re-raise HTTP exceptions
+    except (HTTPException, InferenceQueueFullError):
+        # Re-raise HTTP exceptions (the queue error becomes 503/429 in the app's handler)
         raise
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}, query: '{query.question}', by user {current_user.username}")
@@ -77,10 +77,35 @@ class Settings:
     VECTOR_DB_PATH: str = os.getenv("VECTOR_DB_PATH", str(BASE_DIR / DATA_DIR / VECTOR_DB_DIR))
     VECTOR_SEARCH_TOP_K: int = int(os.getenv("VECTOR_SEARCH_TOP_K", str(VECTOR_SEARCH_TOP_K_DEFAULT)))
     VECTOR_SIMILARITY_THRESHOLD: float = float(os.getenv("VECTOR_SIMILARITY_THRESHOLD", str(VECTOR_SIMILARITY_THRESHOLD_DEFAULT)))
+    VECTOR_STORE_LAYOUT: str = os.getenv("VECTOR_STORE_LAYOUT", VECTOR_STORE_LAYOUT_DEFAULT).lower()
+    VECTOR_SEGMENT_MERGE_THRESHOLD: int = int(os.getenv("VECTOR_SEGMENT_MERGE_THRESHOLD", str(VECTOR_SEGMENT_MERGE_THRESHOLD_DEFAULT)))
+    VECTOR_COMPACTION_TOMBSTONE_RATIO: float = float(os.getenv("VECTOR_COMPACTION_TOMBSTONE_RATIO", str(VECTOR_COMPACTION_TOMBSTONE_RATIO_DEFAULT)))
+    VECTOR_INDEX_MODE: str = os.getenv("VECTOR_INDEX_MODE", VECTOR_INDEX_MODE_DEFAULT).lower()
+    VECTOR_ANN_MODE: str = os.getenv("VECTOR_ANN_MODE", VECTOR_ANN_MODE_DEFAULT).lower()
+    VECTOR_ANN_MIN_VECTORS: int = int(os.getenv("VECTOR_ANN_MIN_VECTORS", str(VECTOR_ANN_MIN_VECTORS_DEFAULT)))
+    VECTOR_ANN_RETRAIN_GROWTH: float = float(os.getenv("VECTOR_ANN_RETRAIN_GROWTH", str(VECTOR_ANN_RETRAIN_GROWTH_DEFAULT)))
+    VECTOR_HNSW_M: int = int(os.getenv("VECTOR_HNSW_M", str(VECTOR_HNSW_M_DEFAULT)))
+    VECTOR_HNSW_EF_CONSTRUCTION: int = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", str(VECTOR_HNSW_EF_CONSTRUCTION_DEFAULT)))
+    VECTOR_HNSW_EF_SEARCH: int = int(os.getenv("VECTOR_HNSW_EF_SEARCH", str(VECTOR_HNSW_EF_SEARCH_DEFAULT)))
+    VECTOR_IVF_NPROBE: int = int(os.getenv("VECTOR_IVF_NPROBE", str(VECTOR_IVF_NPROBE_DEFAULT)))
+    VECTOR_INDEX_MMAP: bool = os.getenv("VECTOR_INDEX_MMAP", str(VECTOR_INDEX_MMAP_DEFAULT)).lower() == "true"
+    VECTOR_MEMORY_BUDGET_BYTES: int = int(os.getenv("VECTOR_MEMORY_BUDGET_BYTES", str(VECTOR_MEMORY_BUDGET_BYTES_DEFAULT)))
+    EMAIL_INDEX_CACHE_BUDGET_BYTES: int = int(os.getenv("EMAIL_INDEX_CACHE_BUDGET_BYTES", str(EMAIL_INDEX_CACHE_BUDGET_BYTES_DEFAULT)))
     
     # Embedding model settings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL_PRIMARY)
     EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", str(EMBEDDING_BATCH_SIZE_DEFAULT)))
+    EMBEDDING_BATCH_TOKEN_BUDGET: int = int(os.getenv("EMBEDDING_BATCH_TOKEN_BUDGET", str(EMBEDDING_BATCH_TOKEN_BUDGET_DEFAULT)))
+    EMBEDDING_BATCH_MAX_TEXTS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", str(EMBEDDING_BATCH_MAX_TEXTS_DEFAULT)))
+    EMBEDDING_DEVICE: Optional[str] = os.getenv("EMBEDDING_DEVICE") or None  # e.g. "cpu", "cuda"; unset = automatic
+    EMBEDDING_MICROBATCH_ENABLED: bool = os.getenv("EMBEDDING_MICROBATCH_ENABLED", str(EMBEDDING_MICROBATCH_ENABLED_DEFAULT)).lower() == "true"
+    EMBEDDING_MICROBATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_MICROBATCH_MAX_SIZE", str(EMBEDDING_MICROBATCH_MAX_SIZE_DEFAULT)))
+    EMBEDDING_MICROBATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_MICROBATCH_MAX_WAIT_MS", str(EMBEDDING_MICROBATCH_MAX_WAIT_MS_DEFAULT)))
+    EMBEDDING_EXECUTOR_WORKERS: int = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", str(EMBEDDING_EXECUTOR_WORKERS_DEFAULT)))
+    EMBEDDING_EXECUTOR_MAX_PENDING: int = int(os.getenv("EMBEDDING_EXECUTOR_MAX_PENDING", str(EMBEDDING_EXECUTOR_MAX_PENDING_DEFAULT)))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", str(EMBEDDING_CACHE_ENABLED_DEFAULT)).lower() == "true"
+    EMBEDDING_CACHE_PATH: Optional[str] = os.getenv("EMBEDDING_CACHE_PATH") or None  # default: {VECTOR_DB_PATH}/embedding_cache.sqlite
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(EMBEDDING_CACHE_MAX_BYTES_DEFAULT)))
     
     # LLM settings
     LLM_MODEL_PATH: str = os.getenv(
@@ -93,6 +118,13 @@ class Settings:
     LLM_TOP_P: float = float(os.getenv("LLM_TOP_P", str(LLM_TOP_P_DEFAULT)))
     LLM_TOP_K: int = int(os.getenv("LLM_TOP_K", str(LLM_TOP_K_DEFAULT)))
     LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", str(LLM_MAX_TOKENS_DEFAULT)))
+    LLM_QUEUE_MAX_PENDING: int = int(os.getenv("LLM_QUEUE_MAX_PENDING", str(LLM_QUEUE_MAX_PENDING_DEFAULT)))
+    LLM_QUEUE_MAX_PENDING_PER_USER: int = int(os.getenv("LLM_QUEUE_MAX_PENDING_PER_USER", str(LLM_QUEUE_MAX_PENDING_PER_USER_DEFAULT)))
+    LLM_TOKEN_COUNT_CACHE_SIZE: int = int(os.getenv("LLM_TOKEN_COUNT_CACHE_SIZE", str(LLM_TOKEN_COUNT_CACHE_SIZE_DEFAULT)))
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_RESPONSE_CACHE_MAX_ENTRIES", str(LLM_RESPONSE_CACHE_MAX_ENTRIES_DEFAULT)))
+    LLM_RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", str(LLM_RESPONSE_CACHE_TTL_SECONDS_DEFAULT)))
+    LLM_RESPONSE_CACHE_SIMILARITY: float = float(os.getenv("LLM_RESPONSE_CACHE_SIMILARITY", str(LLM_RESPONSE_CACHE_SIMILARITY_DEFAULT)))
+    LLM_PREFIX_CACHE_ENABLED: bool = os.getenv("LLM_PREFIX_CACHE_ENABLED", str(LLM_PREFIX_CACHE_ENABLED_DEFAULT)).lower() == "true"
     
     # Metal acceleration settings
     USE_METAL: bool = metal_enabled
@@ -119,6 +151,7 @@ class Settings:
     
     GMAIL_MAX_EMAILS_PER_SYNC: int = int(os.getenv("GMAIL_MAX_EMAILS_PER_SYNC", str(GMAIL_MAX_EMAILS_PER_SYNC)))
     GMAIL_DEFAULT_SYNC_LIMIT: int = int(os.getenv("GMAIL_DEFAULT_SYNC_LIMIT", str(GMAIL_DEFAULT_SYNC_LIMIT)))
+    GMAIL_PROCESSING_BATCH_SIZE: int = int(os.getenv("GMAIL_PROCESSING_BATCH_SIZE", str(GMAIL_PROCESSING_BATCH_SIZE)))
     
     # Email processing settings
     EMAIL_STORAGE_DIR: str = str(BASE_DIR / DATA_DIR / "emails")
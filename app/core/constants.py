@@ -28,6 +28,18 @@ LLM_TOP_P_DEFAULT = 0.9
 LLM_TOP_K_DEFAULT = 40
 LLM_MAX_TOKENS_DEFAULT = 512  # Reduced to allow more context
 LLM_REPEAT_PENALTY_DEFAULT = 1.1
+# Generations wait in per-user round-robin queues; beyond these /ask answers 503 / 429
+LLM_QUEUE_MAX_PENDING_DEFAULT = 8
+LLM_QUEUE_MAX_PENDING_PER_USER_DEFAULT = 2
+# Keep the model state after each prompt template's static prefix, so only context and question are evaluated
+LLM_PREFIX_CACHE_ENABLED_DEFAULT = True
+# Exact token counts of context chunks kept per model (entries), for packing prompts into the window
+LLM_TOKEN_COUNT_CACHE_SIZE_DEFAULT = 4096
+# Cached answers per user and retrieved chunks: LRU size, lifetime, and the query
+# similarity at which a rephrased question reuses an answer
+LLM_RESPONSE_CACHE_MAX_ENTRIES_DEFAULT = 512
+LLM_RESPONSE_CACHE_TTL_SECONDS_DEFAULT = 3600
+LLM_RESPONSE_CACHE_SIMILARITY_DEFAULT = 0.97
 
 # Embedding Constants
 EMBEDDING_MODEL_PRIMARY = "sentence-transformers/all-MiniLM-L6-v2"
@@ -35,6 +47,21 @@ EMBEDDING_MODEL_FALLBACK = "paraphrase-MiniLM-L3-v2"
 EMBEDDING_DIMENSION = 384
 EMBEDDING_BATCH_SIZE_DEFAULT = 32
 EMBEDDING_NORMALIZE = True
+EMBEDDING_MAX_SEQ_LENGTH_DEFAULT = 256  # when the model does not report its own
+# Texts are sorted by length and batched up to this many padded tokens
+# (0 = EMBEDDING_BATCH_SIZE texts of the model's maximum length)
+EMBEDDING_BATCH_TOKEN_BUDGET_DEFAULT = 0
+EMBEDDING_BATCH_MAX_TEXTS_DEFAULT = 256
+# Concurrent single-query embeddings are merged into one encode call
+EMBEDDING_MICROBATCH_ENABLED_DEFAULT = True
+EMBEDDING_MICROBATCH_MAX_SIZE_DEFAULT = 32
+EMBEDDING_MICROBATCH_MAX_WAIT_MS_DEFAULT = 5
+# Encode calls run on worker threads off the event loop; callers wait once this many are queued
+EMBEDDING_EXECUTOR_WORKERS_DEFAULT = 1
+EMBEDDING_EXECUTOR_MAX_PENDING_DEFAULT = 64
+# Persistent cache of embeddings keyed by model and normalized text
+EMBEDDING_CACHE_ENABLED_DEFAULT = True
+EMBEDDING_CACHE_MAX_BYTES_DEFAULT = 1024 * 1024 * 1024
 
 # Vector Store Constants
 VECTOR_SEARCH_TOP_K_DEFAULT = 5
@@ -46,6 +73,57 @@ MAX_CHUNKS_PER_TYPE = 2
 MAX_TOTAL_CHUNKS = 3
 HIGH_QUALITY_SCORE_THRESHOLD = 0.85
 
+# Vector storage layout: one index per document namespace (legacy), one
+# ID-mapped index per user, or one ID-mapped index per user and category
+VECTOR_STORE_LAYOUT_NAMESPACE = "namespace"
+VECTOR_STORE_LAYOUT_USER = "user"
+VECTOR_STORE_LAYOUT_USER_CATEGORY = "user_category"
+VECTOR_STORE_LAYOUTS = [
+    VECTOR_STORE_LAYOUT_NAMESPACE,
+    VECTOR_STORE_LAYOUT_USER,
+    VECTOR_STORE_LAYOUT_USER_CATEGORY
+]
+VECTOR_STORE_LAYOUT_DEFAULT = VECTOR_STORE_LAYOUT_NAMESPACE
+VECTOR_STORE_USERS_DIR = "users"
+
+# Append-only segments: merge a namespace's delta segments into its base
+# index in the background once this many have accumulated
+VECTOR_SEGMENT_MERGE_THRESHOLD_DEFAULT = 8
+# Compact an index (drop tombstoned vectors) once this fraction of it is deleted
+VECTOR_COMPACTION_TOMBSTONE_RATIO_DEFAULT = 0.2
+
+# Index modes: exact flat search, or an approximate (ANN) index built from the
+# flat vectors. "auto" stays flat below VECTOR_ANN_MIN_VECTORS and switches to
+# VECTOR_ANN_MODE above it.
+VECTOR_INDEX_MODE_FLAT = "flat"
+VECTOR_INDEX_MODE_HNSW = "hnsw"
+VECTOR_INDEX_MODE_IVF_FLAT = "ivf_flat"
+VECTOR_INDEX_MODE_IVF_PQ = "ivf_pq"
+VECTOR_INDEX_MODE_AUTO = "auto"
+VECTOR_ANN_MODES = [
+    VECTOR_INDEX_MODE_HNSW,
+    VECTOR_INDEX_MODE_IVF_FLAT,
+    VECTOR_INDEX_MODE_IVF_PQ
+]
+VECTOR_INDEX_MODES = [VECTOR_INDEX_MODE_FLAT, VECTOR_INDEX_MODE_AUTO] + VECTOR_ANN_MODES
+VECTOR_INDEX_MODE_DEFAULT = VECTOR_INDEX_MODE_AUTO
+VECTOR_ANN_MODE_DEFAULT = VECTOR_INDEX_MODE_HNSW
+VECTOR_ANN_MIN_VECTORS_DEFAULT = 20000
+VECTOR_ANN_RETRAIN_GROWTH_DEFAULT = 2.0  # retrain IVF once the index doubles
+VECTOR_HNSW_M_DEFAULT = 32
+VECTOR_HNSW_EF_CONSTRUCTION_DEFAULT = 80
+VECTOR_HNSW_EF_SEARCH_DEFAULT = 64
+VECTOR_IVF_NPROBE_DEFAULT = 16
+
+# Loaded indices: memory-map base index files where possible and evict the
+# least recently used indices once resident + mapped bytes pass the budget
+# (0 disables eviction)
+VECTOR_INDEX_MMAP_DEFAULT = True
+VECTOR_MEMORY_BUDGET_BYTES_DEFAULT = 2 * 1024 * 1024 * 1024
+# Email indices kept resident between searches (vectors, chunks and email
+# metadata), least recently used evicted beyond this many bytes
+EMAIL_INDEX_CACHE_BUDGET_BYTES_DEFAULT = 512 * 1024 * 1024
+
 # Database Constants (PostgreSQL)
 DATABASE_TIMEOUT_DEFAULT = 30
 DATABASE_POOL_PRE_PING = True
@@ -111,6 +189,7 @@ GMAIL_SCOPES = [
 GMAIL_MAX_EMAILS_PER_SYNC = 1000
 GMAIL_DEFAULT_SYNC_LIMIT = 100
 GMAIL_API_RATE_LIMIT = 250  # Requests per minute
+GMAIL_PROCESSING_BATCH_SIZE = 64  # Synced emails chunked, embedded and stored together
 
 # Email Processing Constants
 EMAIL_CHUNK_SIZE_BUSINESS = 800
@@ -130,6 +209,22 @@ EMAIL_CHUNK_OVERLAP_GENERIC = 100
 # Email Classification Constants
 EMAIL_TYPES = ['business', 'personal', 'promotional', 'transactional', 'support', 'generic']
 EMAIL_CLASSIFICATION_CONFIDENCE_THRESHOLD = 0.6
+# Classification tags in bit order of the per-email tag bitmask (append only)
+EMAIL_CLASSIFICATION_TAGS = [
+    'receipt', 'job_offer', 'travel', 'newsletter', 'financial',
+    'work', 'personal', 'security', 'promotional'
+]
+
+# Email search re-scoring: the first tag of an email found here boosts its score,
+# and emails younger than each age (days) get that boost
+EMAIL_TAG_PRIORITY_BOOST = {
+    'security': 0.15,
+    'job_offer': 0.12,
+    'financial': 0.10,
+    'work': 0.08,
+    'receipt': 0.05
+}
+EMAIL_RECENCY_BOOSTS = [(7, 0.1), (30, 0.05)]
 
 # Token Encryption Constants
 TOKEN_ENCRYPTION_SALT = b'email_token_salt_2024'
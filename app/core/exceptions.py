@@ -47,4 +47,12 @@ class AuthenticationError(PersonalAIException):
 
 class FileUploadError(PersonalAIException):
     """Raised when file upload fails"""
-    pass
\ No newline at end of file
+    pass
+
+
+class InferenceQueueFullError(PersonalAIException):
+    """Raised when the LLM inference queue (or a user's share of it) is full"""
+    def __init__(self, message: str, retry_after: int, per_user: bool = False):
+        super().__init__(message, details=f"retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.per_user = per_user
\ No newline at end of file
@@ -10,6 +10,7 @@ from sqlalchemy import text
 
 from app.core.config import settings
 from app.core.constants import DEFAULT_DESCRIPTION, OPENAPI_URL_SUFFIX
+from app.core.exceptions import InferenceQueueFullError
 from app.db.database import get_db, Base, engine
 from app.api.endpoints import auth, documents, queries, gmail, emails, sources, admin, updates
 from app.middleware.rate_limiting import apply_rate_limits, limiter
@@ -47,6 +48,14 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
     
+    # Build the vector namespace catalog once so searches never scan the storage directories
+    try:
+        from app.services.vector_store_service import get_vector_store_service
+        catalog = get_vector_store_service().catalog
+        logger.info(f"Vector catalog ready with {len(catalog)} namespaces")
+    except Exception as e:
+        logger.error(f"Failed to build vector catalog: {str(e)}")
+    
     logger.info("Application startup completed")
     
     yield
@@ -267,7 +276,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
             "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept",
-            "Access-Control-Allow-Credentials": "true"
+            "Access-Control-Allow-Credentials": "true",
+            **(exc.headers or {})
         }
     )
     
@@ -276,4 +286,14 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     
     return response
 
+@app.exception_handler(InferenceQueueFullError)
+async def inference_queue_full_handler(request: Request, exc: InferenceQueueFullError):
+    """The LLM queue is full: 429 if this user already has questions waiting, else 503, with a retry hint"""
+    status_code = 429 if exc.per_user else 503
+    return await http_exception_handler(request, HTTPException(
+        status_code=status_code,
+        detail=exc.message,
+        headers={"Retry-After": str(exc.retry_after)}
+    ))
+
 # Deprecated startup event removed - using modern lifespan approach above 
\ No newline at end of file
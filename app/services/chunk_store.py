@@ -0,0 +1,476 @@
+"""
+SQLite-backed chunk store for FAISS vector indices.
+
+Replaces the pickled document maps that sat next to each index. Every chunk is
+one row keyed by its vector ID (the FAISS ID in consolidated indices, the
+position in per-namespace indices) holding the chunk text once, its metadata as
+JSON, and - in consolidated indices - the document namespace and the chunk's
+offset within that document. Opening a store costs a few milliseconds whatever
+its size, and searches read only the rows of the vectors they hit.
+
+Short scalar metadata values are also indexed in a (field, value) table, so
+metadata filters compile to an allow-list of vector IDs that is handed to FAISS
+as a selector instead of being applied to oversampled results afterwards.
+
+Chunk text is tokenized at write time into an FTS5 table (BM25-ranked), the
+lexical half of hybrid retrieval; it shares the vector IDs as rowids.
+
+A store lives in `{base}.chunks` next to `{base}.index`. A legacy `{base}.pkl`
+is converted the first time the store is opened.
+"""
+
+import os
+import json
+import pickle
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+
+from app.services.lexical import tokenize
+
+logger = logging.getLogger("personal_ai_agent")
+
+CHUNK_STORE_SUFFIX = ".chunks"
+LEGACY_DOCMAP_SUFFIX = ".pkl"
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+
+# Metadata strings longer than this are not indexed (filters on them scan the JSON instead)
+MAX_INDEXED_VALUE_LENGTH = 256
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id INTEGER PRIMARY KEY,
+    namespace TEXT,
+    chunk_index INTEGER,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_namespace ON chunks(namespace);
+CREATE TABLE IF NOT EXISTS chunk_fields (
+    vector_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS idx_chunk_fields_value ON chunk_fields(field, value);
+CREATE INDEX IF NOT EXISTS idx_chunk_fields_vector ON chunk_fields(vector_id);
+"""
+
+# Tokens are pre-split by app.services.lexical.tokenize; '.' is kept so amounts stay one token
+_LEXICAL_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_lexical USING fts5(terms, tokenize="unicode61 tokenchars '.'");
+"""
+
+
+class ChunkStore:
+    """Chunk rows of one vector index, keyed by vector ID"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._removed = False
+        self.lexical_enabled = True
+
+    @staticmethod
+    def path_for_index(index_path: str) -> str:
+        """Chunk store path that sits next to a base index file"""
+        return f"{os.path.splitext(index_path)[0]}{CHUNK_STORE_SUFFIX}"
+
+    @staticmethod
+    def exists_for_index(index_path: str) -> bool:
+        """Whether an index has a chunk store (or a legacy pickled document map to convert)"""
+        base = os.path.splitext(index_path)[0]
+        return os.path.exists(f"{base}{CHUNK_STORE_SUFFIX}") or os.path.exists(f"{base}{LEGACY_DOCMAP_SUFFIX}")
+
+    @classmethod
+    def for_index(
+        cls,
+        index_path: str,
+        convert: Optional[Callable[[Any], Dict[str, Any]]] = None
+    ) -> "ChunkStore":
+        """
+        Open the chunk store next to a base index file, converting a legacy pickled document map first
+
+        Args:
+            index_path: Path of the base .index file
+            convert: Maps one legacy pickled entry to a {"content", "metadata"} entry
+
+        Returns:
+            The chunk store (created empty if neither file exists)
+        """
+        store = cls(cls.path_for_index(index_path))
+        legacy_path = f"{os.path.splitext(index_path)[0]}{LEGACY_DOCMAP_SUFFIX}"
+        if not os.path.exists(store.path) and os.path.exists(legacy_path):
+            store._convert_legacy(legacy_path, convert)
+        return store
+
+    def _convert_legacy(self, legacy_path: str, convert: Optional[Callable[[Any], Dict[str, Any]]]):
+        """Import a pickled document map (list or vector-ID dict) and remove it"""
+        with open(legacy_path, 'rb') as f:
+            document_map = pickle.load(f)
+        items = document_map.items() if isinstance(document_map, dict) else enumerate(document_map)
+        if convert is not None:
+            items = ((vector_id, convert(entry)) for vector_id, entry in items)
+
+        # Build the store under a temporary name so a crash never leaves a partial one in place
+        tmp_path = f"{self.path}.tmp"
+        self.remove_files(tmp_path)
+        tmp_store = ChunkStore(tmp_path)
+        try:
+            tmp_store._put_rows(items, replace=True)
+        finally:
+            tmp_store.close()
+        os.replace(tmp_path, self.path)
+        os.remove(legacy_path)
+        logger.info(f"Converted pickled document map {legacy_path} to chunk store {self.path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_LEXICAL_SCHEMA)
+            except sqlite3.OperationalError as e:
+                # SQLite built without FTS5: searches fall back to vectors only
+                logger.warning(f"Lexical index unavailable for {self.path}: {e}")
+                self.lexical_enabled = False
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                self._migrate(conn, version)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection, version: int):
+        """Fill the indices added since a store was written"""
+        with conn:
+            rows = conn.execute("SELECT vector_id, content, metadata FROM chunks").fetchall()
+            if version < 1:
+                conn.execute("DELETE FROM chunk_fields")
+                conn.executemany(
+                    "INSERT INTO chunk_fields (vector_id, field, value) VALUES (?, ?, ?)",
+                    (
+                        (vector_id, field, value)
+                        for vector_id, _, metadata in rows
+                        for field, value in self._indexed_fields(json.loads(metadata))
+                    )
+                )
+            if version < 2 and self.lexical_enabled:
+                conn.execute("DELETE FROM chunks_lexical")
+                conn.executemany(
+                    "INSERT INTO chunks_lexical (rowid, terms) VALUES (?, ?)",
+                    ((vector_id, " ".join(tokenize(content))) for vector_id, content, _ in rows)
+                )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION if self.lexical_enabled else 1}")
+
+    @staticmethod
+    def _is_indexable(value: Any) -> bool:
+        if isinstance(value, str):
+            return len(value) <= MAX_INDEXED_VALUE_LENGTH
+        return isinstance(value, (bool, int, float))
+
+    @classmethod
+    def _indexed_fields(cls, metadata: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        """(field, value) pairs of the metadata values that go into the field index"""
+        if not isinstance(metadata, dict):
+            return []
+        return [(str(field), value) for field, value in metadata.items() if cls._is_indexable(value)]
+
+    @staticmethod
+    def _to_row(vector_id: int, entry: Dict[str, Any]) -> Tuple:
+        return (
+            int(vector_id),
+            entry.get("namespace"),
+            entry.get("chunk_index"),
+            entry.get("content", ""),
+            json.dumps(entry.get("metadata", {}), default=str)
+        )
+
+    @staticmethod
+    def _from_row(namespace: Optional[str], chunk_index: Optional[int], content: str, metadata: str) -> Dict[str, Any]:
+        entry = {"content": content, "metadata": json.loads(metadata)}
+        if namespace is not None:
+            entry["namespace"] = namespace
+        if chunk_index is not None:
+            entry["chunk_index"] = chunk_index
+        return entry
+
+    def _put_rows(self, items: Iterable[Tuple[int, Dict[str, Any]]], replace: bool) -> int:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        written = 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for vector_id, entry in items:
+                    row = self._to_row(vector_id, entry)
+                    if replace:
+                        conn.execute("DELETE FROM chunk_fields WHERE vector_id = ?", (row[0],))
+                        if self.lexical_enabled:
+                            conn.execute("DELETE FROM chunks_lexical WHERE rowid = ?", (row[0],))
+                    cursor = conn.execute(
+                        f"{verb} INTO chunks (vector_id, namespace, chunk_index, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                        row
+                    )
+                    if cursor.rowcount <= 0:
+                        continue
+                    written += 1
+                    conn.executemany(
+                        "INSERT INTO chunk_fields (vector_id, field, value) VALUES (?, ?, ?)",
+                        ((row[0], field, value) for field, value in self._indexed_fields(entry.get("metadata", {})))
+                    )
+                    if self.lexical_enabled:
+                        conn.execute(
+                            "INSERT INTO chunks_lexical (rowid, terms) VALUES (?, ?)",
+                            (row[0], " ".join(tokenize(row[3])))
+                        )
+        return written
+
+    def put_many(self, vector_ids: Iterable[int], entries: Iterable[Dict[str, Any]], replace: bool = True) -> int:
+        """
+        Write chunk rows in one transaction
+
+        Args:
+            vector_ids: Vector ID of each entry
+            entries: {"content", "metadata"} entries (plus "namespace" / "chunk_index" in consolidated indices)
+            replace: Overwrite existing rows; False keeps them (used when replaying segments)
+
+        Returns:
+            Number of rows written
+        """
+        return self._put_rows(zip(vector_ids, entries), replace)
+
+    def get(self, vector_id: int) -> Optional[Dict[str, Any]]:
+        """Read one chunk entry (None if there is no such vector ID)"""
+        return self.get_many([vector_id]).get(int(vector_id))
+
+    def get_many(self, vector_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Read the chunk entries of the given vector IDs only"""
+        vector_ids = [int(vector_id) for vector_id in vector_ids]
+        entries: Dict[int, Dict[str, Any]] = {}
+        if not vector_ids or self._removed:
+            return entries
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(vector_ids), _QUERY_BATCH):
+                batch = vector_ids[i:i + _QUERY_BATCH]
+                rows = conn.execute(
+                    "SELECT vector_id, namespace, chunk_index, content, metadata FROM chunks "
+                    f"WHERE vector_id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for vector_id, namespace, chunk_index, content, metadata in rows:
+                    entries[vector_id] = self._from_row(namespace, chunk_index, content, metadata)
+        return entries
+
+    @classmethod
+    def _compile_filter(cls, metadata_filter: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        """
+        Compile equality filters on metadata fields into SQL conditions on the chunks table
+
+        Indexable values are looked up in the field index; other values (None, long
+        strings, lists, dicts) are compared against the stored JSON.
+        """
+        clauses, params = [], []
+        for field, value in metadata_filter.items():
+            if cls._is_indexable(value):
+                clauses.append("vector_id IN (SELECT vector_id FROM chunk_fields WHERE field = ? AND value = ?)")
+                params.extend([str(field), value])
+                continue
+            clauses.append("json_extract(metadata, ?) IS ?")
+            path = '$."' + str(field).replace('"', '\\"') + '"'
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, separators=(",", ":"), default=str)
+            params.extend([path, value])
+        return clauses, params
+
+    def ids(
+        self,
+        namespaces: Optional[Iterable[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[int]:
+        """
+        Vector IDs matching all the given conditions, in order
+
+        Args:
+            namespaces: Only chunks of these document namespaces
+            metadata_filter: Only chunks whose metadata equals every {field: value}
+
+        Returns:
+            Sorted vector IDs (an allow-list for a FAISS selector)
+        """
+        if self._removed:
+            return []
+        clauses, params = self._compile_filter(metadata_filter) if metadata_filter else ([], [])
+        namespaces = None if namespaces is None else list(namespaces)
+        batches = [None] if namespaces is None else [
+            namespaces[i:i + _QUERY_BATCH] for i in range(0, len(namespaces), _QUERY_BATCH)
+        ]
+
+        vector_ids = []
+        with self._lock:
+            conn = self._connection()
+            for batch in batches:
+                batch_clauses, batch_params = list(clauses), list(params)
+                if batch is not None:
+                    batch_clauses.append(f"namespace IN ({','.join('?' * len(batch))})")
+                    batch_params.extend(batch)
+                where = f" WHERE {' AND '.join(batch_clauses)}" if batch_clauses else ""
+                vector_ids.extend(row[0] for row in conn.execute(f"SELECT vector_id FROM chunks{where}", batch_params))
+        return sorted(vector_ids)
+
+    def lexical_search(
+        self,
+        terms: List[str],
+        limit: int,
+        namespaces: Optional[Iterable[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        BM25-ranked chunks containing any of the query terms
+
+        Args:
+            terms: Query tokens (from app.services.lexical.query_terms)
+            limit: Maximum number of hits
+            namespaces: Only chunks of these document namespaces
+            metadata_filter: Only chunks whose metadata equals every {field: value}
+
+        Returns:
+            (vector ID, BM25 score) pairs, best first (higher is better)
+        """
+        if not terms or limit <= 0 or self._removed:
+            return []
+        clauses, params = self._compile_filter(metadata_filter) if metadata_filter else ([], [])
+        if namespaces is not None:
+            namespaces = list(namespaces)
+            if not namespaces:
+                return []
+            clauses.append(f"namespace IN ({','.join('?' * len(namespaces))})")
+            params.extend(namespaces)
+
+        sql = "SELECT rowid, bm25(chunks_lexical) FROM chunks_lexical WHERE chunks_lexical MATCH ?"
+        if clauses:
+            sql += f" AND rowid IN (SELECT vector_id FROM chunks WHERE {' AND '.join(clauses)})"
+        sql += " ORDER BY bm25(chunks_lexical) LIMIT ?"
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self._lock:
+            conn = self._connection()
+            if not self.lexical_enabled:
+                return []
+            rows = conn.execute(sql, [match] + params + [int(limit)]).fetchall()
+        # FTS5 reports BM25 negated (lower is better)
+        return [(vector_id, -score) for vector_id, score in rows]
+
+    def namespace_counts(self, vector_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        """Number of chunks per document namespace (optionally among some vector IDs only)"""
+        if self._removed:
+            return {}
+        with self._lock:
+            conn = self._connection()
+            if vector_ids is None:
+                return dict(conn.execute(
+                    "SELECT namespace, COUNT(*) FROM chunks WHERE namespace IS NOT NULL GROUP BY namespace"
+                ).fetchall())
+            vector_ids = [int(vector_id) for vector_id in vector_ids]
+            counts: Dict[str, int] = {}
+            for i in range(0, len(vector_ids), _QUERY_BATCH):
+                batch = vector_ids[i:i + _QUERY_BATCH]
+                for namespace, count in conn.execute(
+                    "SELECT namespace, COUNT(*) FROM chunks "
+                    f"WHERE namespace IS NOT NULL AND vector_id IN ({','.join('?' * len(batch))}) GROUP BY namespace",
+                    batch
+                ):
+                    counts[namespace] = counts.get(namespace, 0) + count
+            return counts
+
+    def namespace_ranges(self) -> Dict[str, Tuple[int, int]]:
+        """(lowest vector ID, chunk count) per document namespace"""
+        if self._removed:
+            return {}
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT namespace, MIN(vector_id), COUNT(*) FROM chunks WHERE namespace IS NOT NULL GROUP BY namespace"
+            ).fetchall()
+        return {namespace: (first, count) for namespace, first, count in rows}
+
+    def max_id(self) -> Optional[int]:
+        """Highest stored vector ID (None when empty)"""
+        if self._removed:
+            return None
+        with self._lock:
+            return self._connection().execute("SELECT MAX(vector_id) FROM chunks").fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Iterate over every (vector ID, entry) in vector ID order"""
+        if self._removed:
+            return
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT vector_id, namespace, chunk_index, content, metadata FROM chunks ORDER BY vector_id"
+            ).fetchall()
+        for vector_id, namespace, chunk_index, content, metadata in rows:
+            yield vector_id, self._from_row(namespace, chunk_index, content, metadata)
+
+    def delete(self, vector_ids: Iterable[int]) -> int:
+        """Delete chunk rows; returns how many existed"""
+        vector_ids = [int(vector_id) for vector_id in vector_ids]
+        if not vector_ids or self._removed:
+            return 0
+        deleted = 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for i in range(0, len(vector_ids), _QUERY_BATCH):
+                    batch = vector_ids[i:i + _QUERY_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    conn.execute(f"DELETE FROM chunk_fields WHERE vector_id IN ({placeholders})", batch)
+                    if self.lexical_enabled:
+                        conn.execute(f"DELETE FROM chunks_lexical WHERE rowid IN ({placeholders})", batch)
+                    deleted += conn.execute(f"DELETE FROM chunks WHERE vector_id IN ({placeholders})", batch).rowcount
+        return deleted
+
+    def __len__(self) -> int:
+        if self._removed:
+            return 0
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        """Close the connection; the store reopens on next use"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def remove(self):
+        """Close the store and delete its files"""
+        with self._lock:
+            self.close()
+            self._removed = True
+            self.remove_files(self.path)
+
+    @staticmethod
+    def remove_files(path: str):
+        """Delete a chunk store file with its SQLite journal files"""
+        for file_path in (path, f"{path}-wal", f"{path}-shm", f"{path}-journal"):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    @classmethod
+    def remove_for_index(cls, index_path: str):
+        """Delete the chunk store (and any legacy pickled document map) next to a base index file"""
+        cls.remove_files(cls.path_for_index(index_path))
+        legacy_path = f"{os.path.splitext(index_path)[0]}{LEGACY_DOCMAP_SUFFIX}"
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,149 @@
+"""
+In-process cache of loaded email indices.
+
+A user's email index (base plus segments), tombstones, the IDs of the vectors
+that have a chunk row and the per-email metadata arrays are loaded once and
+kept resident, so repeat searches by the same user only read the chunk rows of
+the hits they return. Chunk text stays on disk. Writes invalidate the user's
+entry (store_email_chunks, delete_email, ...); least recently used entries are
+evicted once the cache exceeds its memory budget.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Set, Callable
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.chunk_store import ChunkStore
+from app.services.email.email_metadata_index import EmailMetadataSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Rough per-ID overhead of a Python set entry
+_SET_ENTRY_BYTES = 64
+
+
+@dataclass
+class CachedEmailIndex:
+    """What a search of one user's emails needs, held in memory (chunk text is read from the chunk store)."""
+    index: faiss.Index
+    tombstone_ids: Set[int]
+    chunk_ids: np.ndarray
+    metadata: EmailMetadataSnapshot
+    chunk_store: ChunkStore
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint"""
+        vector_bytes = self.index.ntotal * (self.index.d * 4 + 8)
+        id_bytes = self.chunk_ids.nbytes + len(self.tombstone_ids) * _SET_ENTRY_BYTES
+        return vector_bytes + id_bytes + self.metadata.nbytes
+
+
+class EmailIndexCache:
+    """LRU of loaded email indices keyed by index path, bounded by bytes."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, CachedEmailIndex]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # Bumped on invalidation so a load that raced with a write is not cached
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, loader: Callable[[], Optional[CachedEmailIndex]]) -> Optional[CachedEmailIndex]:
+        """
+        Get a cached index, loading it on a miss.
+
+        Args:
+            key: Index path of the user's email index
+            loader: Loads the index from disk (None if the user has no emails)
+
+        Returns:
+            The cached (or freshly loaded) index, or None
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+
+        cached = loader()
+        if cached is None:
+            return None
+
+        size = cached.nbytes
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return cached
+            if self.budget_bytes and size > self.budget_bytes:
+                logger.debug(f"Email index {key} ({size} bytes) exceeds the cache budget; not cached")
+                return cached
+            self._entries[key] = cached
+            self._sizes[key] = size
+            self._evict()
+        return cached
+
+    def invalidate(self, key: str):
+        """Drop a user's entry after a write."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._entries.pop(key, None) is not None:
+                self._sizes.pop(key, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+            self._sizes.clear()
+
+    def _evict(self):
+        """Evict least recently used entries beyond the budget (caller holds the lock)"""
+        if not self.budget_bytes:
+            return
+        while sum(self._sizes.values()) > self.budget_bytes and len(self._entries) > 1:
+            key, _ = self._entries.popitem(last=False)
+            self._sizes.pop(key, None)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "budget_bytes": self.budget_bytes,
+                "cached_bytes": sum(self._sizes.values()),
+                "cached_indices": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+_email_index_cache: Optional[EmailIndexCache] = None
+_email_index_cache_lock = threading.Lock()
+
+
+def get_email_index_cache() -> EmailIndexCache:
+    """Get the process-wide email index cache"""
+    global _email_index_cache
+    with _email_index_cache_lock:
+        if _email_index_cache is None:
+            _email_index_cache = EmailIndexCache(settings.EMAIL_INDEX_CACHE_BUDGET_BYTES)
+        return _email_index_cache
@@ -0,0 +1,479 @@
+"""
+Per-user index of email-level metadata for pre-filtering email searches.
+
+Tag, date-range and sender filters are answered from one small SQLite table per
+user instead of being checked against every search hit, so only the emails that
+can match are searched and filtered queries return their full k results.
+
+The index also maps each email to its range of vector IDs in the user's email
+vector index, and keeps the user's email statistics (email and chunk totals,
+tag and type histograms) as counters updated in the same transaction as the
+email rows, so /emails/stats is answered without reading the mailbox.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Iterable, Set
+
+import numpy as np
+
+from app.core.constants import EMAIL_CLASSIFICATION_TAGS, EMAIL_TAG_PRIORITY_BOOST, EMAIL_RECENCY_BOOSTS
+
+logger = logging.getLogger(__name__)
+
+_TAG_BITS = {tag: 1 << bit for bit, tag in enumerate(EMAIL_CLASSIFICATION_TAGS)}
+
+# Largest boost any email can get (recency plus tag priority)
+MAX_EMAIL_BOOST = max(boost for _, boost in EMAIL_RECENCY_BOOSTS) + max(EMAIL_TAG_PRIORITY_BOOST.values())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    namespace TEXT PRIMARY KEY,
+    email_date REAL,
+    sender TEXT NOT NULL DEFAULT '',
+    sender_domain TEXT NOT NULL DEFAULT '',
+    first_vector_id INTEGER,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    email_type TEXT NOT NULL DEFAULT '',
+    date_text TEXT,
+    priority REAL NOT NULL DEFAULT 0,
+    tag_mask INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_emails_date ON emails(email_date);
+CREATE TABLE IF NOT EXISTS email_tags (
+    namespace TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_email_tags_tag ON email_tags(tag);
+CREATE INDEX IF NOT EXISTS idx_email_tags_namespace ON email_tags(namespace);
+CREATE TABLE IF NOT EXISTS email_counters (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, name)
+);
+"""
+
+# Columns added after the first release of the index: (name, definition)
+_ADDED_COLUMNS = [
+    ("first_vector_id", "INTEGER"),
+    ("vector_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("email_type", "TEXT NOT NULL DEFAULT ''"),
+    ("date_text", "TEXT"),
+    ("priority", "REAL NOT NULL DEFAULT 0"),
+    ("tag_mask", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Indices written by an older schema miss columns or counters and are rebuilt from the chunks
+SCHEMA_VERSION = 3
+
+# email_counters kinds
+COUNTER_TOTAL = "total"
+COUNTER_TAG = "tag"
+COUNTER_TYPE = "type"
+
+
+def normalize_email_date(date_value) -> Optional[str]:
+    """ISO form of an email date as reported in statistics (None if unparseable)."""
+    if isinstance(date_value, datetime):
+        return date_value.isoformat()
+    if not date_value:
+        return None
+    try:
+        return datetime.fromisoformat(str(date_value).replace('Z', '+00:00')).isoformat()
+    except (ValueError, TypeError):
+        return None
+
+
+def email_priority(tags: Iterable[str]) -> float:
+    """Score boost of an email's first priority tag (in the email's tag order)."""
+    for tag in tags or []:
+        if tag in EMAIL_TAG_PRIORITY_BOOST:
+            return EMAIL_TAG_PRIORITY_BOOST[tag]
+    return 0.0
+
+
+def email_tag_mask(tags: Iterable[str]) -> int:
+    """Bitmask of an email's known classification tags."""
+    mask = 0
+    for tag in tags or []:
+        mask |= _TAG_BITS.get(tag, 0)
+    return mask
+
+
+def parse_email_timestamp(date_value) -> Optional[float]:
+    """POSIX timestamp of an email date (ISO string or datetime); naive values are local time."""
+    if isinstance(date_value, datetime):
+        return date_value.timestamp()
+    if not date_value:
+        return None
+    try:
+        return datetime.fromisoformat(str(date_value).replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError, OverflowError, OSError):
+        return None
+
+
+@dataclass
+class EmailMetadataSnapshot:
+    """
+    In-memory copy of a user's email metadata, for filtering and re-scoring without touching disk.
+
+    Per-email numeric columns are NumPy arrays in row order; rows with a vector
+    range are also kept sorted by first vector ID so search hits map to their
+    email with one searchsorted.
+    """
+    namespaces: List[str]
+    dates: np.ndarray
+    senders: List[str]
+    sender_domains: List[str]
+    tags: List[frozenset]
+    tag_masks: np.ndarray
+    priorities: np.ndarray
+    first_ids: np.ndarray
+    counts: np.ndarray
+
+    def __post_init__(self):
+        has_range = np.flatnonzero(self.first_ids >= 0)
+        self._by_first_id = has_range[np.argsort(self.first_ids[has_range], kind="stable")]
+        self._sorted_first_ids = self.first_ids[self._by_first_id]
+        self.ranges = {
+            self.namespaces[i]: (int(self.first_ids[i]), int(self.counts[i])) for i in has_range
+        }
+
+    def rows_for(self, vector_ids: np.ndarray) -> np.ndarray:
+        """Row of the email owning each vector ID (-1 when none does)."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        if len(self._by_first_id) == 0:
+            return np.full(len(vector_ids), -1, dtype=np.int64)
+        position = np.searchsorted(self._sorted_first_ids, vector_ids, side="right") - 1
+        rows = self._by_first_id[np.maximum(position, 0)]
+        inside = (position >= 0) & (vector_ids < self.first_ids[rows] + self.counts[rows])
+        return np.where(inside, rows, -1)
+
+    def boosts(self, vector_ids: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+        """
+        Recency plus tag-priority boost of each vector's email, as one array expression.
+
+        Args:
+            vector_ids: Vector IDs of the candidates
+            now: POSIX time to measure email age from (defaults to the current time)
+
+        Returns:
+            Boost per candidate (0 for vectors without an email row)
+        """
+        rows = self.rows_for(vector_ids)
+        known = rows >= 0
+        if not known.any():
+            return np.zeros(len(rows))
+        rows = np.where(known, rows, 0)
+        with np.errstate(invalid="ignore"):
+            days_ago = np.floor(((time.time() if now is None else now) - self.dates[rows]) / 86400.0)
+        recency = np.zeros(len(rows))
+        for max_days, boost in reversed(EMAIL_RECENCY_BOOSTS):
+            recency = np.where(days_ago < max_days, boost, recency)
+        return np.where(known, recency + self.priorities[rows], 0.0)
+
+    def matching_ranges(
+        self,
+        tags: Optional[List[str]] = None,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        sender_filter: Optional[str] = None
+    ) -> Dict[str, Tuple[int, int]]:
+        """Vector ranges of the emails that pass every given filter (same rules as EmailMetadataIndex.matching)."""
+        keep = self.first_ids >= 0
+        if tags:
+            wanted = {str(tag) for tag in tags}
+            if wanted.issubset(_TAG_BITS):
+                keep &= (self.tag_masks & email_tag_mask(wanted)) != 0
+            else:
+                keep &= np.array([bool(wanted & email_tags) for email_tags in self.tags], dtype=bool)
+        if date_range:
+            start, end = parse_email_timestamp(date_range[0]), parse_email_timestamp(date_range[1])
+            if start is None or end is None:
+                return {}
+            with np.errstate(invalid="ignore"):
+                keep &= (self.dates >= start) & (self.dates <= end)
+        if sender_filter:
+            sender_filter = sender_filter.lower()
+            keep &= np.array([
+                sender_filter in sender or sender_filter in domain
+                for sender, domain in zip(self.senders, self.sender_domains)
+            ], dtype=bool)
+        return {self.namespaces[i]: (int(self.first_ids[i]), int(self.counts[i])) for i in np.flatnonzero(keep)}
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint"""
+        return sum(len(namespace) + len(sender) + len(domain) + 32 * len(tags) + 160
+                   for namespace, sender, domain, tags
+                   in zip(self.namespaces, self.senders, self.sender_domains, self.tags))
+
+
+class EmailMetadataIndex:
+    """Date, sender and classification tags of every stored email of one user."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(emails)")}
+        with self._conn:
+            for column, definition in _ADDED_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE emails ADD COLUMN {column} {definition}")
+
+    @property
+    def stale(self) -> bool:
+        """Whether the index predates the current schema (or is new) and must be rebuilt."""
+        return self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION
+
+    def mark_current(self):
+        """Record that the index was (re)built with the current schema."""
+        with self._conn:
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def clear(self):
+        """Forget every email and reset the statistics."""
+        with self._conn:
+            self._conn.execute("DELETE FROM email_tags")
+            self._conn.execute("DELETE FROM emails")
+            self._conn.execute("DELETE FROM email_counters")
+
+    def upsert(self, namespace: str, metadata: Dict, vector_range: Optional[Tuple[int, int]] = None):
+        """
+        Record (or replace) an email's filterable metadata.
+
+        Args:
+            namespace: Email namespace ('user_{id}_email_{email_id}')
+            metadata: Email-level metadata (date, sender, classification tags, email type)
+            vector_range: (first vector ID, vector count) of the email's chunks
+        """
+        self.upsert_many([(namespace, metadata, vector_range)])
+
+    def upsert_many(self, emails: Iterable[Tuple[str, Dict, Optional[Tuple[int, int]]]]):
+        """Record (or replace) several emails in one transaction, updating the statistics."""
+        with self._conn:
+            for namespace, metadata, vector_range in emails:
+                self._retract(namespace)
+                tag_list = [str(tag) for tag in (metadata.get('classification_tags', []) or [])]
+                tags = sorted(set(tag_list))
+                first_vector_id, vector_count = vector_range if vector_range else (None, 0)
+                email_type = str(metadata.get('email_type') or '')
+                self._conn.execute(
+                    "INSERT INTO emails "
+                    "(namespace, email_date, sender, sender_domain, first_vector_id, vector_count, email_type, date_text, "
+                    "priority, tag_mask) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        namespace,
+                        parse_email_timestamp(metadata.get('date')),
+                        (metadata.get('sender') or '').lower(),
+                        (metadata.get('sender_domain') or '').lower(),
+                        first_vector_id,
+                        vector_count,
+                        email_type,
+                        normalize_email_date(metadata.get('date')),
+                        email_priority(tag_list),
+                        email_tag_mask(tag_list)
+                    )
+                )
+                self._conn.executemany(
+                    "INSERT INTO email_tags (namespace, tag) VALUES (?, ?)",
+                    ((namespace, tag) for tag in tags)
+                )
+                self._count(COUNTER_TOTAL, "emails", 1)
+                self._count(COUNTER_TOTAL, "chunks", vector_count)
+                if email_type:
+                    self._count(COUNTER_TYPE, email_type, 1)
+                for tag in tags:
+                    self._count(COUNTER_TAG, tag, 1)
+
+    def remove(self, namespaces: Iterable[str]):
+        """Forget deleted emails."""
+        with self._conn:
+            for namespace in namespaces:
+                self._retract(namespace)
+
+    def _retract(self, namespace: str):
+        """Delete an email's rows and take it out of the statistics (caller holds a transaction)"""
+        row = self._conn.execute(
+            "SELECT vector_count, email_type FROM emails WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        if row is None:
+            return
+        vector_count, email_type = row
+        tags = [tag for tag, in self._conn.execute("SELECT tag FROM email_tags WHERE namespace = ?", (namespace,))]
+        self._conn.execute("DELETE FROM email_tags WHERE namespace = ?", (namespace,))
+        self._conn.execute("DELETE FROM emails WHERE namespace = ?", (namespace,))
+        self._count(COUNTER_TOTAL, "emails", -1)
+        self._count(COUNTER_TOTAL, "chunks", -vector_count)
+        if email_type:
+            self._count(COUNTER_TYPE, email_type, -1)
+        for tag in tags:
+            self._count(COUNTER_TAG, tag, -1)
+
+    def _count(self, kind: str, name: str, delta: int):
+        if not delta:
+            return
+        self._conn.execute(
+            "INSERT INTO email_counters (kind, name, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (kind, name) DO UPDATE SET count = count + excluded.count",
+            (kind, name, delta)
+        )
+        if kind != COUNTER_TOTAL:
+            self._conn.execute(
+                "DELETE FROM email_counters WHERE kind = ? AND name = ? AND count <= 0", (kind, name)
+            )
+
+    def stats(self) -> Dict:
+        """
+        The user's email statistics, from the counters (constant time).
+
+        Returns:
+            total_emails, total_chunks, categories (tag histogram), email_types and
+            date_range {'earliest', 'latest'}
+        """
+        totals: Dict[str, int] = {}
+        histograms: Dict[str, Dict[str, int]] = {COUNTER_TAG: {}, COUNTER_TYPE: {}}
+        for kind, name, count in self._conn.execute("SELECT kind, name, count FROM email_counters"):
+            if kind == COUNTER_TOTAL:
+                totals[name] = count
+            elif kind in histograms:
+                histograms[kind][name] = count
+
+        # Both ends come straight off the date index
+        earliest = self._conn.execute(
+            "SELECT date_text FROM emails WHERE email_date IS NOT NULL ORDER BY email_date ASC LIMIT 1"
+        ).fetchone()
+        latest = self._conn.execute(
+            "SELECT date_text FROM emails WHERE email_date IS NOT NULL ORDER BY email_date DESC LIMIT 1"
+        ).fetchone()
+        return {
+            'total_emails': totals.get("emails", 0),
+            'total_chunks': totals.get("chunks", 0),
+            'categories': histograms[COUNTER_TAG],
+            'email_types': histograms[COUNTER_TYPE],
+            'date_range': {
+                'earliest': earliest[0] if earliest else None,
+                'latest': latest[0] if latest else None
+            }
+        }
+
+    def rebuild_stats(self):
+        """Recompute the counters from the email rows."""
+        with self._conn:
+            self._conn.execute("DELETE FROM email_counters")
+            self._conn.execute(
+                "INSERT INTO email_counters (kind, name, count) "
+                "SELECT ?, 'emails', COUNT(*) FROM emails UNION ALL "
+                "SELECT ?, 'chunks', COALESCE(SUM(vector_count), 0) FROM emails",
+                (COUNTER_TOTAL, COUNTER_TOTAL)
+            )
+            self._conn.execute(
+                "INSERT INTO email_counters (kind, name, count) "
+                "SELECT ?, email_type, COUNT(*) FROM emails WHERE email_type != '' GROUP BY email_type",
+                (COUNTER_TYPE,)
+            )
+            self._conn.execute(
+                "INSERT INTO email_counters (kind, name, count) "
+                "SELECT ?, tag, COUNT(*) FROM email_tags GROUP BY tag",
+                (COUNTER_TAG,)
+            )
+
+    def namespaces(self) -> Set[str]:
+        """Namespaces of all indexed emails."""
+        return {row[0] for row in self._conn.execute("SELECT namespace FROM emails")}
+
+    def vector_ranges(self, namespaces: Optional[Iterable[str]] = None) -> Dict[str, Tuple[int, int]]:
+        """(first vector ID, vector count) per email (optionally of some namespaces only)."""
+        query = "SELECT namespace, first_vector_id, vector_count FROM emails WHERE first_vector_id IS NOT NULL"
+        if namespaces is None:
+            rows = self._conn.execute(query).fetchall()
+        else:
+            namespaces = list(namespaces)
+            rows = []
+            for i in range(0, len(namespaces), 500):
+                batch = namespaces[i:i + 500]
+                rows.extend(self._conn.execute(
+                    f"{query} AND namespace IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+        return {namespace: (first, count) for namespace, first, count in rows}
+
+    def snapshot(self) -> EmailMetadataSnapshot:
+        """Read every email's metadata into memory."""
+        rows = self._conn.execute(
+            "SELECT namespace, email_date, sender, sender_domain, first_vector_id, vector_count, priority, tag_mask "
+            "FROM emails"
+        ).fetchall()
+        tags: Dict[str, Set[str]] = {}
+        for namespace, tag in self._conn.execute("SELECT namespace, tag FROM email_tags"):
+            tags.setdefault(namespace, set()).add(tag)
+        return EmailMetadataSnapshot(
+            namespaces=[row[0] for row in rows],
+            dates=np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=np.float64),
+            senders=[row[2] for row in rows],
+            sender_domains=[row[3] for row in rows],
+            tags=[frozenset(tags.get(row[0], ())) for row in rows],
+            tag_masks=np.array([row[7] for row in rows], dtype=np.int64),
+            priorities=np.array([row[6] for row in rows], dtype=np.float64),
+            first_ids=np.array([-1 if row[4] is None else row[4] for row in rows], dtype=np.int64),
+            counts=np.array([row[5] for row in rows], dtype=np.int64)
+        )
+
+    def matching(
+        self,
+        tags: Optional[List[str]] = None,
+        date_range: Optional[Tuple[datetime, datetime]] = None,
+        sender_filter: Optional[str] = None
+    ) -> Set[str]:
+        """
+        Namespaces of the emails that pass every given filter.
+
+        Args:
+            tags: At least one of these classification tags
+            date_range: (start, end) the email date falls within
+            sender_filter: Substring of the sender address or domain (case-insensitive)
+
+        Returns:
+            Matching email namespaces
+        """
+        clauses, params = [], []
+        if tags:
+            clauses.append(
+                f"namespace IN (SELECT namespace FROM email_tags WHERE tag IN ({','.join('?' * len(tags))}))"
+            )
+            params.extend(str(tag) for tag in tags)
+        if date_range:
+            clauses.append("email_date BETWEEN ? AND ?")
+            params.extend([parse_email_timestamp(date_range[0]), parse_email_timestamp(date_range[1])])
+        if sender_filter:
+            clauses.append("(instr(sender, ?) > 0 OR instr(sender_domain, ?) > 0)")
+            params.extend([sender_filter.lower()] * 2)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return {row[0] for row in self._conn.execute(f"SELECT namespace FROM emails{where}", params)}
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> "EmailMetadataIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def remove_files(path: str):
+        """Delete an index file with its SQLite journal files."""
+        for file_path in (path, f"{path}-wal", f"{path}-shm", f"{path}-journal"):
+            if os.path.exists(file_path):
+                os.remove(file_path)
@@ -10,7 +10,7 @@ from datetime import datetime
 import logging
 import html2text
 
-from app.services.embedding_service import SentenceTransformerEmbeddingService
+from app.services.embedding_service import get_embedding_service
 from app.exceptions import (
     EmailProcessingError,
     EmailClassificationError,
@@ -24,7 +24,7 @@ class EmailProcessor:
     """Unified processor for email content chunking and embedding with advanced classification and chunking strategies."""
     
     def __init__(self):
-        self.embedding_service = SentenceTransformerEmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.html_converter = html2text.HTML2Text()
         self.html_converter.ignore_links = True
         self.html_converter.ignore_images = True
@@ -129,78 +129,110 @@ class EmailProcessor:
         Returns:
             List of processed chunks with embeddings and metadata
         """
-        try:
-            # Convert HTML to text if needed
-            processed_text = await self._prepare_text_content(email_data)
-            
-            # Detect email type based on content patterns
-            email_type = self.detect_email_type(email_data)
-            
-            # Get user-specific chunking configuration
-            chunk_config = self.get_user_chunking_config(user_id)
+        processed, = await self.process_emails([(email_data, user_id, classification_tags)])
+        return processed
+    
+    async def process_emails(self, emails: List[Tuple[Dict, int, Optional[List[str]]]]) -> List[List[Dict]]:
+        """
+        Process several emails, embedding all of their chunks in one batched call.
+        
+        Args:
+            emails: (email data, user ID, classification tags) per email
             
-            # Override config based on detected email type
-            if email_type in self.base_chunk_configs:
-                type_config = self.base_chunk_configs[email_type].copy()
-                # Merge user preferences with type-specific config
-                if user_id in self.user_preferences:
-                    type_config.update(self.user_preferences[user_id])
-                chunk_config = type_config
+        Returns:
+            Processed chunks with embeddings and metadata, per email in order
+            (empty for an email that could not be chunked)
             
-            # Generate email-specific metadata
-            metadata = await self._create_email_metadata(email_data, user_id, email_type)
+        Raises:
+            EmailProcessingError: If embedding generation fails
+        """
+        prepared = []
+        for email_data, user_id, classification_tags in emails:
+            try:
+                prepared.append(await self._prepare_chunks(email_data, user_id, classification_tags))
+            except VectorStoreError:
+                # Re-raise vector store specific errors
+                raise
+            except Exception as e:
+                logger.error(f"Error processing email: {e}")
+                if len(emails) == 1:
+                    raise EmailProcessingError(f"Failed to process email: {str(e)}")
+                prepared.append([])
+        
+        texts = [chunk['text'] for chunks in prepared for chunk in chunks]
+        if not texts:
+            return prepared
+        
+        try:
+            embeddings = await self.embedding_service.generate_embeddings(texts)
+        except Exception as e:
+            logger.error(f"Error generating embeddings for {len(texts)} email chunks: {e}")
+            raise EmailProcessingError(f"Failed to process email: {str(e)}")
+        
+        position = 0
+        for chunks in prepared:
+            for chunk in chunks:
+                chunk['embedding'] = embeddings[position].tolist()
+                position += 1
+        
+        logger.info(f"Embedded {len(texts)} chunks from {len(emails)} emails in one batch")
+        return prepared
+    
+    async def _prepare_chunks(self, email_data: Dict, user_id: int, classification_tags: List[str] = None) -> List[Dict]:
+        """Chunk an email and build each chunk's metadata (embeddings are added by the caller)."""
+        # Convert HTML to text if needed
+        processed_text = await self._prepare_text_content(email_data)
+        
+        # Detect email type based on content patterns
+        email_type = self.detect_email_type(email_data)
+        
+        # Get user-specific chunking configuration
+        chunk_config = self.get_user_chunking_config(user_id)
+        
+        # Override config based on detected email type
+        if email_type in self.base_chunk_configs:
+            type_config = self.base_chunk_configs[email_type].copy()
+            # Merge user preferences with type-specific config
+            if user_id in self.user_preferences:
+                type_config.update(self.user_preferences[user_id])
+            chunk_config = type_config
+        
+        # Generate email-specific metadata
+        metadata = await self._create_email_metadata(email_data, user_id, classification_tags, email_type)
+        
+        # Chunk the email content using user-specific strategy
+        chunks = await self._chunk_email_content_user_aware(processed_text, email_data, chunk_config)
+        
+        prepared_chunks = []
+        for i, chunk_data in enumerate(chunks):
+            chunk_text = chunk_data if isinstance(chunk_data, str) else chunk_data.get('content', chunk_data.get('text', ''))
             
-            # Chunk the email content using user-specific strategy
-            chunks = await self._chunk_email_content_user_aware(processed_text, email_data, chunk_config)
+            if len(chunk_text.strip()) < 10:  # Skip very short chunks
+                continue
             
-            # Generate embeddings for each chunk
-            processed_chunks = []
-            for i, chunk_data in enumerate(chunks):
-                chunk_text = chunk_data if isinstance(chunk_data, str) else chunk_data.get('content', chunk_data.get('text', ''))
-                
-                if len(chunk_text.strip()) < 10:  # Skip very short chunks
-                    continue
-                
-                try:
-                    # Generate embedding
-                    embedding = await self.embedding_service.generate_embedding(chunk_text)
-                    
-                    # Create chunk metadata
-                    chunk_metadata = {
-                        **metadata,
-                        'chunk_index': i,
-                        'chunk_text': chunk_text,
-                        'chunk_length': len(chunk_text),
-                        'chunk_word_count': len(chunk_text.split()),
-                        'email_type': email_type,
-                        'chunking_strategy': chunk_config.get('strategy', 'adaptive'),
-                        'user_id': user_id
-                    }
-                    
-                    # Add additional metadata from advanced chunking
-                    if isinstance(chunk_data, dict) and 'metadata' in chunk_data:
-                        chunk_metadata.update(chunk_data['metadata'])
-                    
-                    processed_chunks.append({
-                        'text': chunk_text,
-                        'embedding': embedding,
-                        'metadata': chunk_metadata
-                    })
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to generate embedding for chunk {i}: {e}")
-                    # Continue processing other chunks even if one fails
-                    continue
+            # Create chunk metadata
+            chunk_metadata = {
+                **metadata,
+                'chunk_index': i,
+                'chunk_text': chunk_text,
+                'chunk_length': len(chunk_text),
+                'chunk_word_count': len(chunk_text.split()),
+                'email_type': email_type,
+                'chunking_strategy': chunk_config.get('strategy', 'adaptive'),
+                'user_id': user_id
+            }
             
-            logger.info(f"User {user_id}: Processed email '{metadata['subject'][:50]}...' ({email_type}) into {len(processed_chunks)} chunks using {chunk_config.get('strategy', 'adaptive')} strategy")
-            return processed_chunks
+            # Add additional metadata from advanced chunking
+            if isinstance(chunk_data, dict) and 'metadata' in chunk_data:
+                chunk_metadata.update(chunk_data['metadata'])
             
-        except VectorStoreError:
-            # Re-raise vector store specific errors
-            raise
-        except Exception as e:
-            logger.error(f"Error processing email: {e}")
-            raise EmailProcessingError(f"Failed to process email: {str(e)}")
+            prepared_chunks.append({
+                'text': chunk_text,
+                'metadata': chunk_metadata
+            })
+        
+        logger.info(f"User {user_id}: Processed email '{metadata['subject'][:50]}...' ({email_type}) into {len(prepared_chunks)} chunks using {chunk_config.get('strategy', 'adaptive')} strategy")
+        return prepared_chunks
     
     async def _prepare_text_content(self, email_data: Dict) -> str:
         """Prepare and clean email text content."""
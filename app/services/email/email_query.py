@@ -8,10 +8,12 @@ from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
-from app.services.embedding_service import SentenceTransformerEmbeddingService
+from app.services.embedding_service import get_embedding_service
 from app.services.email.email_store import EmailStore
 from app.utils.llm import generate_response
 from app.exceptions import EmailProcessingError, VectorStoreError
+from app.core.exceptions import InferenceQueueFullError
+from app.services.llm_scheduler import get_llm_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +22,7 @@ class EmailQueryService:
     """Service for processing email-specific queries and generating responses."""
     
     def __init__(self):
-        self.embedding_service = SentenceTransformerEmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.email_store = EmailStore()
         
         # Email query patterns for classification
@@ -89,7 +91,8 @@ class EmailQueryService:
             response = await self._generate_email_response(
                 query=query,
                 search_results=search_results,
-                query_analysis=query_analysis
+                query_analysis=query_analysis,
+                user_id=user_id
             )
             
             return {
@@ -99,8 +102,8 @@ class EmailQueryService:
                 'result_count': len(search_results)
             }
             
-        except VectorStoreError:
-            # Re-raise vector store specific errors
+        except (VectorStoreError, InferenceQueueFullError):
+            # Re-raise vector store specific errors, and a full inference queue
             raise
         except Exception as e:
             logger.error(f"Error processing email query: {e}")
@@ -309,7 +312,8 @@ class EmailQueryService:
         self,
         query: str,
         search_results: List[Dict],
-        query_analysis: Dict
+        query_analysis: Dict,
+        user_id: Optional[int] = None
     ) -> str:
         """Generate natural language response for email query."""
         
@@ -346,8 +350,10 @@ Please provide a helpful answer that:
 Answer:"""
         
         try:
-            response = generate_response(prompt, [])
+            response = await get_llm_scheduler().submit(user_id, generate_response, prompt, [])
             return response.strip()
+        except InferenceQueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Error generating email response: {e}")
             # For response generation errors, return a safe fallback message
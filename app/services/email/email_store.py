@@ -4,8 +4,8 @@ Extends existing vector store with email-specific organization and search.
 """
 
 import os
-import pickle
-from typing import List, Dict, Optional, Tuple
+import threading
+from typing import List, Dict, Optional, Tuple, Set
 from pathlib import Path
 import logging
 import faiss
@@ -14,10 +14,25 @@ from datetime import datetime, timedelta
 
 from app.core.config import settings
 from app.services.vector_store_service import FAISSVectorStoreService
+from app.services.chunk_store import ChunkStore
+from app.services.email.email_metadata_index import EmailMetadataIndex, MAX_EMAIL_BOOST
+from app.services.email.email_vector_index import EmailVectorIndex, search_index
+from app.services.email.email_index_cache import CachedEmailIndex, get_email_index_cache
+from app.utils.caching import invalidate_user_responses
 from app.exceptions import VectorStoreError, EmailProcessingError, handle_database_error
 
 logger = logging.getLogger(__name__)
 
+# Emails converted per segment when migrating legacy per-email indices
+LEGACY_MIGRATION_BATCH = 500
+
+# Raw-similarity candidates fetched per requested result before re-scoring
+SEARCH_OVERSAMPLE = 2
+
+# Users whose legacy per-email indices were already looked for in this process
+_legacy_checked_users: Set[int] = set()
+_legacy_checked_lock = threading.Lock()
+
 
 class EmailStore:
     """Vector storage service specifically for email content."""
@@ -62,37 +77,7 @@ class EmailStore:
                 logger.warning(f"No chunks to store for email {email_id}")
                 return False
             
-            # Create namespace for this email
-            namespace = f"user_{user_id}_email_{email_id}"
-            index_path = self.base_path / f"{namespace}.index"
-            metadata_path = self.base_path / f"{namespace}.pkl"
-            
-            # Prepare vectors and metadata
-            vectors = []
-            metadata_list = []
-            
-            for chunk in chunks:
-                vectors.append(chunk['embedding'])
-                metadata_list.append(chunk['metadata'])
-            
-            # Convert to numpy array
-            vectors_array = np.array(vectors).astype('float32')
-            
-            # Create FAISS index
-            dimension = vectors_array.shape[1]
-            index = faiss.IndexFlatIP(dimension)  # Inner product for similarity
-            
-            # Normalize vectors for cosine similarity
-            faiss.normalize_L2(vectors_array)
-            
-            # Add vectors to index
-            index.add(vectors_array)
-            
-            # Save index and metadata
-            faiss.write_index(index, str(index_path))
-            
-            with open(metadata_path, 'wb') as f:
-                pickle.dump(metadata_list, f)
+            self._store_emails(user_id, [(email_id, chunks)])
             
             logger.info(f"Stored {len(chunks)} chunks for email {email_id}")
             return True
@@ -112,6 +97,59 @@ class EmailStore:
             else:
                 raise VectorStoreError(f"Failed to store email chunks for {email_id}: {str(e)}", operation="store")
     
+    def store_email_batch(self, emails: List[Tuple[str, List[Dict]]], user_id: int) -> List[str]:
+        """
+        Store several of a user's emails in one index append and one metadata transaction.
+        
+        Args:
+            emails: (email ID, processed chunks) per email
+            user_id: User ID for namespace
+            
+        Returns:
+            IDs of the emails stored (emails without chunks are skipped)
+        """
+        # The last copy of an email listed twice wins
+        emails = [(email_id, chunks) for email_id, chunks in dict(emails).items() if chunks]
+        if not emails:
+            return []
+        try:
+            self._store_emails(user_id, emails)
+        except Exception as e:
+            logger.error(f"Error storing a batch of {len(emails)} emails: {e}")
+            raise VectorStoreError(f"Failed to store email batch for user {user_id}: {str(e)}", operation="store")
+        
+        logger.info(f"Stored {sum(len(chunks) for _, chunks in emails)} chunks for {len(emails)} emails")
+        return [email_id for email_id, _ in emails]
+    
+    def _store_emails(self, user_id: int, emails: List[Tuple[str, List[Dict]]]):
+        """Append emails to the user's email index, replacing any earlier copies."""
+        batch, metadata = [], []
+        for email_id, chunks in emails:
+            vectors_array = np.array([chunk['embedding'] for chunk in chunks]).astype('float32')
+            
+            # Normalize vectors for cosine similarity (inner product index)
+            faiss.normalize_L2(vectors_array)
+            
+            entries = [self._entry_from_metadata(chunk['metadata']) for chunk in chunks]
+            namespace = f"user_{user_id}_email_{email_id}"
+            batch.append((namespace, vectors_array, entries))
+            # Email-level metadata (same on every chunk) for search pre-filtering
+            metadata.append(chunks[0]['metadata'])
+        
+        email_index = self._get_email_index(user_id)
+        try:
+            with email_index.open_chunk_store() as chunk_store, self._open_metadata_index(user_id) as metadata_index:
+                previous = metadata_index.vector_ranges([namespace for namespace, _, _ in batch])
+                for first, count in previous.values():
+                    email_index.remove(range(first, first + count), chunk_store)
+                ranges = email_index.append(batch, chunk_store)
+                metadata_index.upsert_many(
+                    (namespace, email_metadata, vector_range)
+                    for (namespace, _, _), email_metadata, vector_range in zip(batch, metadata, ranges)
+                )
+        finally:
+            self._invalidate_cache(email_index, user_id)
+    
     def search_emails(
         self, 
         query_embedding: List[float], 
@@ -124,6 +162,14 @@ class EmailStore:
         """
         Search email content using various filters.
         
+        Filters are resolved against the user's email metadata index first, so
+        only matching emails are searched and up to k results are returned even
+        for selective filters.
+        
+        Recency and priority boosts are applied to an oversampled candidate set,
+        which is widened until no candidate left out could be boosted past the
+        k-th result.
+        
         Args:
             query_embedding: Query vector
             user_id: User ID for namespace filtering
@@ -138,54 +184,64 @@ class EmailStore:
         try:
             results = []
             
-            # Get all email indices for this user
-            email_indices = self._get_user_email_indices(user_id)
+            if k <= 0:
+                return []
             
-            if not email_indices:
-                logger.info(f"No email indices found for user {user_id}")
+            # Resident copy of the user's index, chunks and metadata (loaded on first use)
+            cached = self._get_cached_index(user_id)
+            if cached is None:
+                logger.info(f"No email index found for user {user_id}")
                 return []
             
-            # Search each email index
-            for index_path, metadata_path in email_indices:
-                try:
-                    # Load index and metadata
-                    index = faiss.read_index(str(index_path))
-                    with open(metadata_path, 'rb') as f:
-                        metadata_list = pickle.load(f)
-                    
-                    # Perform search
-                    query_vector = np.array([query_embedding]).astype('float32')
-                    faiss.normalize_L2(query_vector)
-                    
-                    scores, indices = index.search(query_vector, min(k * 2, index.ntotal))
-                    
-                    # Process results
-                    for score, idx in zip(scores[0], indices[0]):
-                        if idx == -1:  # Invalid index
-                            continue
-                        
-                        metadata = metadata_list[idx]
-                        
-                        # Apply filters
-                        if not self._apply_filters(metadata, tags, date_range, sender_filter):
-                            continue
-                        
-                        # Calculate final score with temporal boost
-                        final_score = self._calculate_final_score(score, metadata)
-                        
-                        results.append({
-                            'text': metadata['chunk_text'],
-                            'score': final_score,
-                            'metadata': metadata
-                        })
-                        
-                except FileNotFoundError:
-                    logger.warning(f"Index file not found: {index_path}, skipping")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Error searching index {index_path}: {e}")
-                    # Continue with other indices even if one fails
-                    continue
+            # Pre-filter: search only the vector ranges of emails whose metadata passes every filter
+            allowed_ids = None
+            if tags or date_range or sender_filter:
+                ranges = cached.metadata.matching_ranges(tags, date_range, sender_filter)
+                if not ranges:
+                    return []
+                allowed_ids = np.concatenate([
+                    np.arange(first, first + count, dtype=np.int64) for first, count in ranges.values()
+                ])
+            
+            # Perform search
+            query_vector = np.array([query_embedding]).astype('float32')
+            faiss.normalize_L2(query_vector)
+            candidates = max(1, k) * SEARCH_OVERSAMPLE
+            while True:
+                raw_hits = search_index(cached.index, query_vector, candidates, allowed_ids, cached.tombstone_ids)
+                scores = np.array([score for score, _ in raw_hits], dtype=np.float64)
+                vector_ids = np.array([vector_id for _, vector_id in raw_hits], dtype=np.int64)
+                # Skip vectors without a chunk row
+                has_row = np.isin(vector_ids, cached.chunk_ids, assume_unique=True)
+                scores, vector_ids = scores[has_row], vector_ids[has_row]
+                
+                # Temporal and priority boosts from the precomputed per-email arrays, in one pass
+                final_scores = scores + cached.metadata.boosts(vector_ids)
+                
+                if len(raw_hits) < candidates:
+                    break  # Every live candidate was scored
+                # A candidate not fetched scores at most the lowest raw score fetched plus the largest boost
+                ceiling = raw_hits[-1][0] + MAX_EMAIL_BOOST
+                if len(final_scores) >= k and np.partition(final_scores, -k)[-k] >= ceiling:
+                    break
+                candidates *= 2
+            if len(vector_ids) == 0:
+                return []
+            
+            # Best k first; only their chunk rows are read
+            top = np.argsort(-final_scores, kind="stable")[:k]
+            entries = cached.chunk_store.get_many(vector_ids[top].tolist())
+            
+            # Process results
+            for final_score, vector_id in zip(final_scores[top].tolist(), vector_ids[top].tolist()):
+                if vector_id not in entries:
+                    continue  # Deleted since the index was cached
+                metadata = self._metadata_from_entry(entries[vector_id])
+                results.append({
+                    'text': metadata['chunk_text'],
+                    'score': final_score,
+                    'metadata': metadata
+                })
             
             # Sort by score and return top k
             results.sort(key=lambda x: x['score'], reverse=True)
@@ -249,108 +305,204 @@ class EmailStore:
             k=k
         )
     
-    def _get_user_email_indices(self, user_id: int) -> List[Tuple[Path, Path]]:
-        """Get all email indices for a user."""
-        indices = []
-        pattern = f"user_{user_id}_email_*"
-        
-        for index_file in self.base_path.glob(f"{pattern}.index"):
-            metadata_file = index_file.with_suffix('.pkl')
-            if metadata_file.exists():
-                indices.append((index_file, metadata_file))
-        
-        return indices
+    def _get_email_index(self, user_id: int) -> EmailVectorIndex:
+        """Get a user's email vector index, migrating legacy per-email indices the first time."""
+        email_index = EmailVectorIndex.for_user(self.base_path, user_id)
+        with _legacy_checked_lock:
+            check_legacy = user_id not in _legacy_checked_users
+            _legacy_checked_users.add(user_id)
+        if check_legacy:
+            try:
+                self.migrate_legacy_email_indices(user_id)
+            except Exception as e:
+                logger.error(f"Failed to migrate legacy email indices for user {user_id}: {e}")
+                with _legacy_checked_lock:
+                    _legacy_checked_users.discard(user_id)
+        return email_index
     
-    def _apply_filters(
-        self,
-        metadata: Dict,
-        tags: Optional[List[str]],
-        date_range: Optional[Tuple[datetime, datetime]],
-        sender_filter: Optional[str]
-    ) -> bool:
-        """Apply filters to search results."""
-        
-        # Tag filter
-        if tags:
-            email_tags = metadata.get('classification_tags', [])
-            if not any(tag in email_tags for tag in tags):
-                return False
-        
-        # Date range filter
-        if date_range:
-            email_date_str = metadata.get('date')
-            if email_date_str:
-                try:
-                    email_date = datetime.fromisoformat(email_date_str.replace('Z', '+00:00'))
-                    if not (date_range[0] <= email_date <= date_range[1]):
-                        return False
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Invalid date format in metadata: {email_date_str}")
-                    return False
-            else:
-                return False
+    def _get_cached_index(self, user_id: int) -> Optional[CachedEmailIndex]:
+        """Get a user's email index from the resident cache, loading it on a miss."""
+        email_index = self._get_email_index(user_id)
+        return get_email_index_cache().get(
+            email_index.index_path, lambda: self._load_cached_index(user_id, email_index)
+        )
+    
+    def _load_cached_index(self, user_id: int, email_index: EmailVectorIndex) -> Optional[CachedEmailIndex]:
+        """Read everything a search needs from disk (None if the user has no email index)."""
+        with email_index.lock:
+            if not email_index.exists():
+                return None
+            index = email_index.load()
+            if index is None:
+                return None
+            # Kept open with the entry; the connection closes once the dropped entry is garbage collected
+            chunk_store = email_index.open_chunk_store()
+            chunk_ids = np.array(chunk_store.ids(), dtype=np.int64)
+            with self._open_metadata_index(user_id) as metadata_index:
+                metadata = metadata_index.snapshot()
+            return CachedEmailIndex(
+                index=index,
+                tombstone_ids=email_index.tombstone_ids(),
+                chunk_ids=chunk_ids,
+                metadata=metadata,
+                chunk_store=chunk_store
+            )
+    
+    @staticmethod
+    def _invalidate_cache(email_index: EmailVectorIndex, user_id: int):
+        """Write-through invalidation: the next search reloads the user's index, and answers cached over the old emails are dropped."""
+        get_email_index_cache().invalidate(email_index.index_path)
+        invalidate_user_responses(user_id)
+    
+    @staticmethod
+    def get_cache_stats() -> Dict:
+        """Hit/miss counters and memory use of the resident email index cache."""
+        return get_email_index_cache().get_stats()
+    
+    def _get_legacy_email_indices(self, user_id: int) -> List[Path]:
+        """Per-email index files ('user_{id}_email_{email_id}.index') from before the per-user index."""
+        return sorted(self.base_path.glob(f"user_{user_id}_email_*.index"))
+    
+    def migrate_legacy_email_indices(self, user_id: int) -> int:
+        """
+        Move a user's per-email indices into the user's email index and delete them.
         
-        # Sender filter
-        if sender_filter:
-            sender = metadata.get('sender', '').lower()
-            sender_domain = metadata.get('sender_domain', '').lower()
+        Args:
+            user_id: User ID
             
-            filter_lower = sender_filter.lower()
-            if not (filter_lower in sender or filter_lower in sender_domain):
-                return False
-        
-        return True
-    
-    def _calculate_final_score(self, similarity_score: float, metadata: Dict) -> float:
-        """Calculate final relevance score with temporal and priority boosts."""
-        final_score = float(similarity_score)
+        Returns:
+            Number of emails migrated
+        """
+        legacy_indices = self._get_legacy_email_indices(user_id)
+        if not legacy_indices:
+            return 0
         
-        # Temporal boost for recent emails
-        email_date_str = metadata.get('date')
-        if email_date_str:
-            try:
-                email_date = datetime.fromisoformat(email_date_str.replace('Z', '+00:00'))
-                days_ago = (datetime.now() - email_date.replace(tzinfo=None)).days
+        email_index = EmailVectorIndex.for_user(self.base_path, user_id)
+        migrated = 0
+        with email_index.open_chunk_store() as chunk_store, self._open_metadata_index(user_id) as metadata_index:
+            for i in range(0, len(legacy_indices), LEGACY_MIGRATION_BATCH):
+                batch, converted = [], []
+                for index_path in legacy_indices[i:i + LEGACY_MIGRATION_BATCH]:
+                    try:
+                        index = faiss.read_index(str(index_path))
+                        with self._open_chunk_store(index_path) as legacy_store:
+                            legacy_entries = dict(legacy_store.items())
+                    except Exception as e:
+                        logger.warning(f"Skipping unreadable email index {index_path}: {e}")
+                        continue
+                    
+                    # Keep only the positions that have both a vector and a chunk
+                    positions = [p for p in range(index.ntotal) if p in legacy_entries]
+                    if positions:
+                        vectors = np.vstack([index.reconstruct(p) for p in positions]).astype('float32')
+                        entries = [
+                            {'content': legacy_entries[p]['content'], 'metadata': legacy_entries[p]['metadata']}
+                            for p in positions
+                        ]
+                        batch.append((index_path.stem, vectors, entries))
+                    converted.append(index_path)
                 
-                # Boost recent emails
-                if days_ago < 7:
-                    final_score += 0.1
-                elif days_ago < 30:
-                    final_score += 0.05
+                if batch:
+                    namespaces = [namespace for namespace, _, _ in batch]
+                    previous = metadata_index.vector_ranges(namespaces)
+                    for first, count in previous.values():
+                        email_index.remove(range(first, first + count), chunk_store)
+                    ranges = email_index.append(batch, chunk_store)
+                    for (namespace, _, entries), vector_range in zip(batch, ranges):
+                        metadata_index.upsert(namespace, self._metadata_from_entry(entries[0]), vector_range)
                 
-            except (ValueError, TypeError):
-                logger.debug(f"Invalid date format for temporal boost: {email_date_str}")
-                pass
+                # Legacy files go only once their chunks are stored in the user index
+                for index_path in converted:
+                    index_path.unlink(missing_ok=True)
+                    ChunkStore.remove_for_index(str(index_path))
+                migrated += len(batch)
         
-        # Priority boost based on classification
-        tags = metadata.get('classification_tags', [])
-        priority_boost = {
-            'security': 0.15,
-            'job_offer': 0.12,
-            'financial': 0.10,
-            'work': 0.08,
-            'receipt': 0.05
-        }
+        email_index.merge()
+        self._invalidate_cache(email_index, user_id)
+        logger.info(f"Migrated {migrated} per-email indices into {email_index.index_path}")
+        return migrated
+    
+    def _open_chunk_store(self, index_path: Path) -> ChunkStore:
+        """Open a legacy per-email chunk store, converting a pickled metadata list on first use."""
+        return ChunkStore.for_index(str(index_path), convert=self._entry_from_metadata)
+    
+    @staticmethod
+    def _entry_from_metadata(metadata: Dict) -> Dict:
+        """Chunk store entry for a chunk's metadata; the chunk text is stored once, as the content."""
+        metadata = dict(metadata)
+        return {'content': metadata.pop('chunk_text', ''), 'metadata': metadata}
+    
+    @staticmethod
+    def _metadata_from_entry(entry: Dict) -> Dict:
+        """Chunk metadata as callers expect it (with 'chunk_text')."""
+        return {**entry['metadata'], 'chunk_text': entry['content']}
+    
+    def _open_metadata_index(self, user_id: int) -> EmailMetadataIndex:
+        """
+        Open a user's email metadata index, rebuilding it from the email index if it is missing or outdated.
         
-        for tag in tags:
-            if tag in priority_boost:
-                final_score += priority_boost[tag]
-                break
+        Args:
+            user_id: User ID
+        """
+        metadata_index = EmailMetadataIndex(str(self._get_metadata_index_path(user_id)))
+        if metadata_index.stale:
+            self._rebuild_metadata_index(user_id, metadata_index)
+        return metadata_index
+    
+    def _rebuild_metadata_index(self, user_id: int, metadata_index: EmailMetadataIndex) -> int:
+        """Recompute a user's email metadata, vector ranges and statistics from the stored chunks."""
+        metadata_index.clear()
+        ranges = {}
+        email_index = EmailVectorIndex.for_user(self.base_path, user_id)
+        if email_index.exists():
+            with email_index.open_chunk_store() as chunk_store:
+                ranges = chunk_store.namespace_ranges()
+                first_entries = chunk_store.get_many(first for first, _ in ranges.values())
+            metadata_index.upsert_many(
+                (namespace, self._metadata_from_entry(first_entries[first]), (first, count))
+                for namespace, (first, count) in ranges.items() if first in first_entries
+            )
+        metadata_index.mark_current()
+        logger.info(f"Rebuilt email metadata index for user {user_id} ({len(ranges)} emails)")
+        return len(ranges)
+    
+    def rebuild_email_stats(self, user_id: int) -> Dict:
+        """
+        Recompute a user's email statistics from scratch (from the stored chunks).
         
-        return final_score
+        Args:
+            user_id: User ID
+            
+        Returns:
+            The rebuilt statistics
+        """
+        email_index = self._get_email_index(user_id)
+        with self._open_metadata_index(user_id) as metadata_index:
+            self._rebuild_metadata_index(user_id, metadata_index)
+            stats = metadata_index.stats()
+        self._invalidate_cache(email_index, user_id)
+        return stats
+    
+    def _get_metadata_index_path(self, user_id: int) -> Path:
+        """Path of a user's email metadata index."""
+        return self.base_path / f"user_{user_id}.email_meta"
     
     def delete_email(self, user_id: int, email_id: str) -> bool:
         """Delete email from vector store."""
         try:
             namespace = f"user_{user_id}_email_{email_id}"
-            index_path = self.base_path / f"{namespace}.index"
-            metadata_path = self.base_path / f"{namespace}.pkl"
+            email_index = self._get_email_index(user_id)
             
-            # Remove files if they exist
-            if index_path.exists():
-                index_path.unlink()
-            if metadata_path.exists():
-                metadata_path.unlink()
+            # Tombstone the email's vector range and drop its chunks
+            if email_index.exists():
+                try:
+                    with email_index.open_chunk_store() as chunk_store, self._open_metadata_index(user_id) as metadata_index:
+                        vector_range = metadata_index.vector_ranges([namespace]).get(namespace)
+                        if vector_range:
+                            email_index.remove(range(vector_range[0], vector_range[0] + vector_range[1]), chunk_store)
+                        metadata_index.remove([namespace])
+                finally:
+                    self._invalidate_cache(email_index, user_id)
             
             logger.info(f"Deleted email {email_id} for user {user_id}")
             return True
@@ -365,55 +517,46 @@ class EmailStore:
             logger.error(f"Error deleting email: {e}")
             raise VectorStoreError(f"Failed to delete email {email_id}: {str(e)}", operation="delete")
     
-    def get_email_stats(self, user_id: int) -> Dict:
-        """Get statistics about stored emails for a user."""
+    @staticmethod
+    def get_storage_email_id(vector_namespace: str) -> Optional[str]:
+        """Recover the storage email ID from an Email.vector_namespace ('user_{id}_email_{email_id}')."""
+        if not vector_namespace or "_email_" not in vector_namespace:
+            return None
+        return vector_namespace.split("_email_", 1)[1]
+    
+    def delete_user_emails(self, user_id: int) -> int:
+        """Delete every stored email vector for a user (e.g. when the user is deleted)."""
         try:
-            indices = self._get_user_email_indices(user_id)
-            
-            stats = {
-                'total_emails': len(indices),
-                'total_chunks': 0,
-                'categories': {},
-                'date_range': {'earliest': None, 'latest': None}
-            }
+            deleted = 0
+            email_index = EmailVectorIndex.for_user(self.base_path, user_id)
+            if email_index.exists():
+                with email_index.open_chunk_store() as chunk_store:
+                    deleted = len(chunk_store.namespace_ranges())
+                email_index.remove_files()
+            self._invalidate_cache(email_index, user_id)
+            for index_path in self._get_legacy_email_indices(user_id):
+                index_path.unlink(missing_ok=True)
+                ChunkStore.remove_for_index(str(index_path))
+                deleted += 1
+            EmailMetadataIndex.remove_files(str(self._get_metadata_index_path(user_id)))
             
-            dates = []
-            
-            for index_path, metadata_path in indices:
-                try:
-                    with open(metadata_path, 'rb') as f:
-                        metadata_list = pickle.load(f)
-                    
-                    stats['total_chunks'] += len(metadata_list)
-                    
-                    # Analyze first chunk (email metadata is same across chunks)
-                    if metadata_list:
-                        metadata = metadata_list[0]
-                        
-                        # Count categories
-                        tags = metadata.get('classification_tags', [])
-                        for tag in tags:
-                            stats['categories'][tag] = stats['categories'].get(tag, 0) + 1
-                        
-                        # Collect dates
-                        date_str = metadata.get('date')
-                        if date_str:
-                            try:
-                                date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                                dates.append(date)
-                            except (ValueError, TypeError):
-                                logger.debug(f"Invalid date format in stats: {date_str}")
-                                pass
-                
-                except FileNotFoundError:
-                    logger.warning(f"Metadata file not found: {metadata_path}, skipping")
-                except Exception as e:
-                    logger.warning(f"Error reading metadata {metadata_path}: {e}")
+            logger.info(f"Deleted {deleted} emails for user {user_id}")
+            return deleted
             
-            # Calculate date range
-            if dates:
-                stats['date_range']['earliest'] = min(dates).isoformat()
-                stats['date_range']['latest'] = max(dates).isoformat()
+        except PermissionError as e:
+            logger.error(f"Permission denied deleting emails for user {user_id}: {e}")
+            raise VectorStoreError(f"Permission denied deleting emails for user {user_id}", operation="delete")
+        except Exception as e:
+            logger.error(f"Error deleting emails for user {user_id}: {e}")
+            raise VectorStoreError(f"Failed to delete emails for user {user_id}: {str(e)}", operation="delete")
+    
+    def get_email_stats(self, user_id: int) -> Dict:
+        """Get statistics about stored emails for a user."""
+        try:
+            # Counters maintained as emails are stored and deleted (no mailbox scan)
+            self._get_email_index(user_id)
+            with self._open_metadata_index(user_id) as metadata_index:
+                stats = metadata_index.stats()
             
             return stats
             
@@ -424,5 +567,6 @@ class EmailStore:
                 'total_emails': 0,
                 'total_chunks': 0,
                 'categories': {},
+                'email_types': {},
                 'date_range': {'earliest': None, 'latest': None}
             }
\ No newline at end of file
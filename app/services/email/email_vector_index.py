@@ -0,0 +1,236 @@
+"""
+Per-user email vector index.
+
+All of a user's email chunks live in one ID-mapped inner-product index
+(`user_{id}_emails.index`) with one chunk store next to it, instead of one FAISS
+file and one document map per email. Each stored email owns a contiguous range
+of vector IDs (recorded in the email metadata index), so deleting an email
+tombstones its range and a filtered search becomes an allow-list of ranges.
+
+New emails are appended as delta segments (the segment log the document vector
+store uses), so storing an email writes only its own vectors. Segments are
+folded into the base index - dropping tombstoned vectors - once they add up to
+half its size.
+"""
+
+import os
+import logging
+import threading
+from typing import List, Dict, Optional, Tuple, Iterable, Set
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.chunk_store import ChunkStore
+from app.services.vector_segments import SegmentLog, Tombstones
+
+logger = logging.getLogger(__name__)
+
+EMAIL_INDEX_SUFFIX = "_emails.index"
+
+# Fold segments into the base index once there are this many, whatever their size
+MAX_EMAIL_SEGMENTS = 64
+
+_locks: Dict[str, threading.RLock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(index_path: str) -> threading.RLock:
+    with _locks_guard:
+        return _locks.setdefault(index_path, threading.RLock())
+
+
+def search_index(
+    index: faiss.Index,
+    query_vector: np.ndarray,
+    k: int,
+    allowed_ids: Optional[np.ndarray] = None,
+    tombstone_ids: Optional[Set[int]] = None
+) -> List[Tuple[float, int]]:
+    """
+    Search a loaded email index, skipping tombstoned vectors.
+
+    Args:
+        index: Loaded email index (base plus segments)
+        query_vector: Normalized query, shape (1, dimension)
+        k: Number of results
+        allowed_ids: Only search these vector IDs
+        tombstone_ids: Deleted vector IDs
+
+    Returns:
+        (score, vector ID) pairs, best first
+    """
+    if index.ntotal == 0:
+        return []
+    tombstone_ids = tombstone_ids or set()
+    if allowed_ids is not None:
+        allowed_ids = np.array([i for i in allowed_ids if int(i) not in tombstone_ids], dtype=np.int64)
+        if len(allowed_ids) == 0:
+            return []
+        selector = faiss.IDSelectorBatch(allowed_ids)
+        live = len(allowed_ids)
+    elif tombstone_ids:
+        selector = faiss.IDSelectorNot(
+            faiss.IDSelectorBatch(np.array(sorted(tombstone_ids), dtype=np.int64))
+        )
+        live = index.ntotal - len(tombstone_ids)
+    else:
+        selector, live = None, index.ntotal
+    k = min(k, live)
+    if k <= 0:
+        return []
+    params = faiss.SearchParameters(sel=selector) if selector is not None else None
+    scores, ids = index.search(query_vector, k, params=params)
+    return [(float(score), int(vector_id)) for score, vector_id in zip(scores[0], ids[0]) if vector_id >= 0]
+
+
+class EmailVectorIndex:
+    """One user's email vectors: base index, delta segments, tombstones and chunk store."""
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.segments = SegmentLog.for_index(index_path)
+        self.lock = _lock_for(index_path)
+
+    @classmethod
+    def for_user(cls, base_path, user_id: int) -> "EmailVectorIndex":
+        return cls(os.path.join(str(base_path), f"user_{user_id}{EMAIL_INDEX_SUFFIX}"))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path) or bool(self.segments.list_segments())
+
+    def open_chunk_store(self) -> ChunkStore:
+        return ChunkStore.for_index(self.index_path)
+
+    def tombstone_ids(self) -> Set[int]:
+        """Currently tombstoned vector IDs."""
+        return set(self._tombstones().ids)
+
+    def _tombstones(self) -> Tombstones:
+        # Re-read on every use: other EmailStore instances may have tombstoned vectors since
+        return Tombstones.for_index(self.index_path)
+
+    def append(
+        self,
+        emails: List[Tuple[str, np.ndarray, List[Dict]]],
+        chunk_store: ChunkStore
+    ) -> List[Tuple[int, int]]:
+        """
+        Add the chunks of one or more emails as a single delta segment.
+
+        Args:
+            emails: (namespace, normalized vectors, chunk store entries) per email
+            chunk_store: The index's open chunk store
+
+        Returns:
+            (first vector ID, vector count) of each email, in order
+        """
+        with self.lock:
+            tombstones = self._tombstones()
+            # 0 is a real ID; only an empty chunk store starts from scratch
+            max_id = chunk_store.max_id()
+            next_id = max([-1 if max_id is None else max_id] + list(tombstones.ids)) + 1
+            ranges, ids, rows = [], [], []
+            for namespace, vectors, entries in emails:
+                ranges.append((next_id, len(vectors)))
+                for chunk_index, entry in enumerate(entries):
+                    ids.append(next_id + chunk_index)
+                    rows.append({**entry, "namespace": namespace, "chunk_index": chunk_index})
+                next_id += len(vectors)
+
+            vectors = np.vstack([vectors for _, vectors, _ in emails]).astype('float32')
+            # Vectors first: rows without a vector are never hit, vectors without a row are skipped
+            self.segments.append(vectors, [], ids[0], ids=np.array(ids, dtype=np.int64))
+            chunk_store.put_many(ids, rows)
+
+            if self._should_merge():
+                self._merge()
+            return ranges
+
+    def remove(self, vector_ids: Iterable[int], chunk_store: ChunkStore) -> int:
+        """Tombstone vectors and delete their chunk rows; returns how many were newly tombstoned."""
+        vector_ids = [int(vector_id) for vector_id in vector_ids]
+        with self.lock:
+            removed = self._tombstones().add(vector_ids)
+            chunk_store.delete(vector_ids)
+        return removed
+
+    def load(self) -> Optional[faiss.Index]:
+        """Base index with every delta segment applied (None if nothing was stored yet)."""
+        with self.lock:
+            index = faiss.read_index(self.index_path) if os.path.exists(self.index_path) else None
+            present = set(faiss.vector_to_array(index.id_map).tolist()) if index is not None else set()
+            for segment in self.segments.replay():
+                if index is None:
+                    index = faiss.IndexIDMap2(faiss.IndexFlatIP(segment.vectors.shape[1]))
+                # A merge that crashed before truncating leaves segments already in the base
+                new = [i for i, vector_id in enumerate(segment.ids) if int(vector_id) not in present]
+                if new:
+                    index.add_with_ids(segment.vectors[new], segment.ids[new])
+                    present.update(int(vector_id) for vector_id in segment.ids[new])
+            return index
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        allowed_ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[float, int]]:
+        """
+        Inner-product search over live vectors, loading the index from disk.
+
+        Args:
+            query_vector: Normalized query, shape (1, dimension)
+            k: Number of results
+            allowed_ids: Only search these vector IDs
+
+        Returns:
+            (score, vector ID) pairs, best first
+        """
+        index = self.load()
+        if index is None:
+            return []
+        return search_index(index, query_vector, k, allowed_ids, self._tombstones().ids)
+
+    def _should_merge(self) -> bool:
+        segments = self.segments.list_segments()
+        if len(segments) >= MAX_EMAIL_SEGMENTS:
+            return True
+        if not segments or len(segments) < max(1, settings.VECTOR_SEGMENT_MERGE_THRESHOLD):
+            return False
+        # Merge geometrically so a long sync does not rewrite the base index every few emails
+        segment_bytes = sum(os.path.getsize(path) for _, path in segments)
+        base_bytes = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        return 2 * segment_bytes >= base_bytes
+
+    def merge(self) -> int:
+        """Fold the delta segments into the base index and drop tombstoned vectors; returns segments merged."""
+        with self.lock:
+            return self._merge()
+
+    def _merge(self) -> int:
+        upto_seq = self.segments.last_seq()
+        index = self.load()
+        if index is None:
+            return 0
+        tombstones = self._tombstones()
+        if tombstones:
+            index.remove_ids(faiss.IDSelectorBatch(np.array(sorted(tombstones.ids), dtype=np.int64)))
+
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        merged = self.segments.truncate(upto_seq)
+        tombstones.clear()
+        logger.info(f"Merged {merged} email segments into {self.index_path} ({index.ntotal} vectors)")
+        return merged
+
+    def remove_files(self):
+        """Delete the base index, segments, tombstones and chunk store."""
+        with self.lock:
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            self.segments.clear()
+            self._tombstones().clear()
+            ChunkStore.remove_for_index(self.index_path)
@@ -0,0 +1,128 @@
+"""
+Micro-batching of concurrent single-text embedding requests.
+
+Each /ask or /emails/search request embeds one short query. Encoded one at a
+time, concurrent requests queue behind each other for a forward pass each;
+encoded together, a batch of queries costs little more than one. The batcher
+collects requests that arrive within a few milliseconds of each other (up to a
+maximum batch size), encodes them with one call and resolves every caller's
+future from the shared result.
+
+Queues and worker tasks belong to one event loop, so each loop that embeds
+(the server's, or the private loops of the synchronous wrappers) gets its own
+queue and worker.
+"""
+
+import time
+import asyncio
+import logging
+import weakref
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("personal_ai_agent")
+
+
+class EmbeddingBatcher:
+    """Merges concurrent single-text embedding requests into batched encode calls."""
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int,
+        max_wait_ms: float
+    ):
+        """
+        Args:
+            encode_batch: Encodes a list of texts, one embedding row per text
+            max_batch_size: Most texts encoded together
+            max_wait_ms: Longest a request waits for others to join its batch
+        """
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # Per event loop: (its queue, the worker task draining it)
+        self._workers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Queue, asyncio.Task]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes: Counter = Counter()
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embed one text as part of the next batch.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            The embedding as a list of floats
+        """
+        loop = asyncio.get_running_loop()
+        queue = self._queue_for(loop)
+        future = loop.create_future()
+        await queue.put((text, future, time.perf_counter()))
+        return await future
+
+    def _queue_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        """The running loop's queue, starting its worker on first use (or after it died)"""
+        queue, worker = self._workers.get(loop, (None, None))
+        if worker is None or worker.done():
+            queue = asyncio.Queue()
+            self._workers[loop] = (queue, loop.create_task(self._run(queue)))
+        return queue
+
+    async def _run(self, queue: asyncio.Queue):
+        # Drains only its own loop's queue
+        while True:
+            batch = [await queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(queue.get_nowait() if remaining <= 0 else
+                                 await asyncio.wait_for(queue.get(), remaining))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+            await self._encode(batch)
+
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            waited = started - enqueued
+            self.total_wait += waited
+            self.max_observed_wait = max(self.max_observed_wait, waited)
+        self.requests += len(batch)
+        self.batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+        try:
+            embeddings = await self.encode_batch([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for row, (_, future, _) in zip(embeddings, batch):
+            if not future.done():
+                future.set_result(row.tolist())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request and batch counters and the batch-size distribution"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "mean_wait_ms": self.total_wait / self.requests * 1000 if self.requests else 0.0,
+            "max_wait_observed_ms": self.max_observed_wait * 1000
+        }
@@ -0,0 +1,231 @@
+"""
+Persistent content-addressed cache of text embeddings.
+
+Re-processing flows (reprocessing synced emails, re-uploading a document,
+changing chunking preferences) embed mostly text that was embedded before. The
+cache keys each embedding by a SHA-256 of the model name and the normalized
+text (Unicode NFC, whitespace runs collapsed), so an unchanged chunk costs a
+SQLite lookup instead of a forward pass, across restarts.
+
+Vectors are stored as raw little-endian float32 bytes, one row per text in
+`{VECTOR_DB_PATH}/embedding_cache.sqlite`. Each lookup refreshes the rows it
+hits; once the cache grows past its byte budget, the least recently used rows
+are deleted.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger("personal_ai_agent")
+
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+
+# Approximate per-row cost on disk beyond the key and vector bytes
+_ROW_OVERHEAD_BYTES = 24
+
+# Evict down to this fraction of the budget, so eviction does not run on every write
+_EVICT_TO_FRACTION = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Text as it is keyed in the cache: NFC, whitespace runs collapsed to one space."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """SHA-256 of the model name and the normalized text"""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Disk-backed embeddings keyed by (model, normalized text), bounded by bytes."""
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        Args:
+            path: SQLite file of the cache
+            max_bytes: Approximate size beyond which least recently used rows are evicted (0 = no limit)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._total_bytes = self._measure()
+        return self._conn
+
+    def _measure(self) -> int:
+        row = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(key) + length(vector)), 0) FROM embeddings"
+        ).fetchone()
+        return row[1] + row[0] * _ROW_OVERHEAD_BYTES
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> Dict[int, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            model_name: Model the embeddings were computed with
+            texts: Texts to look up
+
+        Returns:
+            Embedding per position in `texts`, for the texts found
+        """
+        keys = [cache_key(model_name, text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            conn = self._connection()
+            unique_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(unique_keys), _QUERY_BATCH):
+                batch = unique_keys[i:i + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for key, vector in conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[bytes(key)] = np.frombuffer(vector, dtype="<f4")
+            if found:
+                now = int(time.time())
+                with conn:
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        ((now, key) for key in found)
+                    )
+            hits = {position: found[key] for position, key in enumerate(keys) if key in found}
+            self.hits += len(hits)
+            self.misses += len(keys) - len(hits)
+        return hits
+
+    def put_many(self, model_name: str, texts: Sequence[str], embeddings: np.ndarray):
+        """
+        Store embeddings, evicting least recently used rows beyond the budget.
+
+        Args:
+            model_name: Model the embeddings were computed with
+            texts: Texts that were embedded
+            embeddings: One row per text
+        """
+        if len(texts) == 0:
+            return
+        now = int(time.time())
+        rows = {
+            cache_key(model_name, text): np.asarray(embedding, dtype="<f4").tobytes()
+            for text, embedding in zip(texts, embeddings)
+        }
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    ((key, vector, now) for key, vector in rows.items())
+                )
+            self.writes += len(rows)
+            self._total_bytes += sum(len(key) + len(vector) + _ROW_OVERHEAD_BYTES for key, vector in rows.items())
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used rows down to a fraction of the budget (caller holds the lock)"""
+        conn = self._conn
+        # Re-measure: other processes share the file and replaced rows were counted twice
+        self._total_bytes = self._measure()
+        target = int(self.max_bytes * _EVICT_TO_FRACTION)
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        with conn:
+            while self._total_bytes > target:
+                rows = conn.execute(
+                    "SELECT key, length(key) + length(vector) FROM embeddings ORDER BY last_used LIMIT ?",
+                    (_QUERY_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    if self._total_bytes <= target:
+                        break
+                    conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    self._total_bytes -= size + _ROW_OVERHEAD_BYTES
+                    evicted += 1
+        self.evictions += evicted
+        logger.info(f"Evicted {evicted} embeddings from {self.path} ({self._total_bytes} bytes remain)")
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM embeddings")
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size"""
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "cached_bytes": self._total_bytes,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get the process-wide embedding cache (None when disabled)"""
+    global _embedding_cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            path = settings.EMBEDDING_CACHE_PATH or os.path.join(settings.VECTOR_DB_PATH, EMBEDDING_CACHE_FILENAME)
+            _embedding_cache = EmbeddingCache(path, settings.EMBEDDING_CACHE_MAX_BYTES)
+        return _embedding_cache
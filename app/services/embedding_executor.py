@@ -0,0 +1,126 @@
+"""
+Dedicated worker threads for embedding inference.
+
+SentenceTransformer.encode is synchronous; called from a coroutine it blocks the
+event loop - health checks, logins and every other request - for the length of
+the forward pass. Encode calls (and the first model load) run on these threads
+instead, and the coroutine awaits the result. Torch releases the GIL while it
+computes, so the loop keeps serving requests meanwhile.
+
+The number of calls waiting for a worker is bounded: once it is reached, new
+callers wait for a slot before their work is queued, rather than piling up an
+unbounded backlog of texts in memory.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger("personal_ai_agent")
+
+T = TypeVar("T")
+
+
+class EmbeddingExecutor:
+    """Runs blocking embedding calls on worker threads behind a bounded queue."""
+
+    def __init__(self, workers: int, max_pending: int):
+        """
+        Args:
+            workers: Worker threads (encode calls running at once)
+            max_pending: Calls queued or running before new callers wait
+        """
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+        # asyncio semaphores belong to one event loop
+        self._slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_observed_pending = 0
+
+    def _slots_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        with self._lock:
+            for stale in [other for other in self._slots if other.is_closed()]:
+                del self._slots[stale]
+            if loop not in self._slots:
+                self._slots[loop] = asyncio.Semaphore(self.max_pending)
+            return self._slots[loop]
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Run a blocking call on a worker thread and await its result.
+
+        Args:
+            function: Blocking callable (e.g. a model's encode)
+            *args: Its arguments
+
+        Returns:
+            What the call returned (its exception is raised here)
+        """
+        loop = asyncio.get_running_loop()
+        async with self._slots_for(loop):
+            with self._lock:
+                self.pending += 1
+                self.max_observed_pending = max(self.max_observed_pending, self.pending)
+            try:
+                return await loop.run_in_executor(self._executor, self._timed, function, args)
+            finally:
+                with self._lock:
+                    self.pending -= 1
+
+    def _timed(self, function: Callable[..., T], args) -> T:
+        started = time.perf_counter()
+        try:
+            result = function(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and completed-call counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "max_observed_pending": self.max_observed_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "busy_seconds": self.busy_seconds
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_embedding_executor: Optional[EmbeddingExecutor] = None
+_embedding_executor_lock = threading.Lock()
+
+
+def get_embedding_executor() -> EmbeddingExecutor:
+    """Get the process-wide embedding executor"""
+    global _embedding_executor
+    with _embedding_executor_lock:
+        if _embedding_executor is None:
+            _embedding_executor = EmbeddingExecutor(
+                settings.EMBEDDING_EXECUTOR_WORKERS,
+                settings.EMBEDDING_EXECUTOR_MAX_PENDING
+            )
+        return _embedding_executor
@@ -2,18 +2,82 @@
 Embedding service for generating text embeddings
 """
 
+import sqlite3
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings
-from app.core.constants import EMBEDDING_MODEL_FALLBACK, EMBEDDING_BATCH_SIZE_DEFAULT, EMBEDDING_NORMALIZE
+from app.core.constants import (
+    EMBEDDING_MODEL_FALLBACK, EMBEDDING_BATCH_SIZE_DEFAULT, EMBEDDING_NORMALIZE, EMBEDDING_MAX_SEQ_LENGTH_DEFAULT
+)
 from app.core.exceptions import EmbeddingGenerationError, ModelLoadError
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_executor import get_embedding_executor
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
 
 logger = logging.getLogger("personal_ai_agent")
 
+# Loaded models shared by every service instance, keyed by (requested model name, device),
+# with the name of the model actually loaded (the fallback if the requested one failed)
+_models: Dict[Tuple[str, str], Tuple[SentenceTransformer, str]] = {}
+_models_lock = threading.Lock()
+
+
+def load_embedding_model(model_name: str, device: Optional[str] = None) -> SentenceTransformer:
+    """
+    Get the process-wide instance of an embedding model, loading it on first use.
+    
+    Args:
+        model_name: Sentence transformer model name
+        device: Torch device ('cpu', 'cuda', ...); None picks one automatically
+        
+    Returns:
+        The loaded model (the fallback model if the requested one fails to load)
+        
+    Raises:
+        ModelLoadError: If neither the model nor the fallback model can be loaded
+    """
+    return resolve_embedding_model(model_name, device)[0]
+
+
+def resolve_embedding_model(model_name: str, device: Optional[str] = None) -> Tuple[SentenceTransformer, str]:
+    """Like load_embedding_model, also returning the name of the model that was loaded"""
+    key = (model_name, device or "auto")
+    with _models_lock:
+        if key in _models:
+            return _models[key]
+        
+        loaded_name = model_name
+        try:
+            logger.info(f"Loading embedding model: {model_name}")
+            model = SentenceTransformer(model_name, device=device)
+            logger.info(f"Embedding model loaded successfully, dimension: {model.get_sentence_embedding_dimension()}")
+        except Exception as e:
+            logger.error(f"Failed to load primary embedding model: {e}")
+            fallback_key = (EMBEDDING_MODEL_FALLBACK, key[1])
+            loaded_name = EMBEDDING_MODEL_FALLBACK
+            try:
+                # Fallback to a smaller model
+                model = _models.get(fallback_key, (None, None))[0]
+                if model is None:
+                    logger.info(f"Trying fallback model: {EMBEDDING_MODEL_FALLBACK}")
+                    model = SentenceTransformer(EMBEDDING_MODEL_FALLBACK, device=device)
+                    _models[fallback_key] = (model, loaded_name)
+                    logger.info(f"Fallback model loaded successfully, dimension: {model.get_sentence_embedding_dimension()}")
+            except Exception as fallback_error:
+                raise ModelLoadError(
+                    f"Failed to load both primary and fallback embedding models",
+                    details=f"Primary error: {e}, Fallback error: {fallback_error}"
+                )
+        
+        # Remembered under the requested name too, so a failed model is not retried per request
+        _models[key] = (model, loaded_name)
+        return _models[key]
+
 
 class EmbeddingService(ABC):
     """Abstract base class for embedding services"""
@@ -41,38 +105,46 @@ class SentenceTransformerEmbeddingService(EmbeddingService):
         self,
         model_name: str = None,
         batch_size: int = None,
-        normalize_embeddings: bool = None
+        normalize_embeddings: bool = None,
+        device: str = None
     ):
         self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.device = device or settings.EMBEDDING_DEVICE
         self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
         self.normalize_embeddings = normalize_embeddings if normalize_embeddings is not None else EMBEDDING_NORMALIZE
         self._model: Optional[SentenceTransformer] = None
+        self._loaded_model_name: Optional[str] = None
         self._dimension: Optional[int] = None
+        self._batcher: Optional[EmbeddingBatcher] = None
+        self._cache: Optional[EmbeddingCache] = None
+        self._cache_resolved = False
     
     def _load_model(self) -> SentenceTransformer:
-        """Load the embedding model lazily"""
+        """Get the shared embedding model, loading it on first use in this process"""
         if self._model is None:
-            try:
-                logger.info(f"Loading embedding model: {self.model_name}")
-                self._model = SentenceTransformer(self.model_name)
-                self._dimension = self._model.get_sentence_embedding_dimension()
-                logger.info(f"Embedding model loaded successfully, dimension: {self._dimension}")
-            except Exception as e:
-                logger.error(f"Failed to load primary embedding model: {e}")
-                try:
-                    # Fallback to a smaller model
-                    logger.info(f"Trying fallback model: {EMBEDDING_MODEL_FALLBACK}")
-                    self._model = SentenceTransformer(EMBEDDING_MODEL_FALLBACK)
-                    self._dimension = self._model.get_sentence_embedding_dimension()
-                    logger.info(f"Fallback model loaded successfully, dimension: {self._dimension}")
-                except Exception as fallback_error:
-                    raise ModelLoadError(
-                        f"Failed to load both primary and fallback embedding models",
-                        details=f"Primary error: {e}, Fallback error: {fallback_error}"
-                    )
+            self._model, self._loaded_model_name = resolve_embedding_model(self.model_name, self.device)
+            self._dimension = self._model.get_sentence_embedding_dimension()
         
         return self._model
     
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        """Persistent embedding cache consulted before encoding (None when disabled)"""
+        if not self._cache_resolved:
+            self._cache = get_embedding_cache()
+            self._cache_resolved = True
+        return self._cache
+    
+    @cache.setter
+    def cache(self, cache: Optional[EmbeddingCache]):
+        self._cache = cache
+        self._cache_resolved = True
+    
+    def _cache_model_key(self) -> str:
+        """Cache namespace: the model actually loaded and whether its output is normalized"""
+        self._load_model()
+        return f"{self._loaded_model_name}|{'normalized' if self.normalize_embeddings else 'raw'}"
+    
     def get_dimension(self) -> int:
         """Get the embedding dimension"""
         if self._dimension is None:
@@ -83,6 +155,10 @@ class SentenceTransformerEmbeddingService(EmbeddingService):
         """
         Generate embeddings for a list of texts in batches
         
+        Texts are sorted by token length and batched up to a budget of padded
+        tokens, so short transaction lines are not padded to the length of a
+        long page they happen to share a batch with. The output is in input order.
+        
         Args:
             texts: List of texts to generate embeddings for
             
@@ -97,32 +173,42 @@ class SentenceTransformerEmbeddingService(EmbeddingService):
             return np.array([])
         
         try:
-            model = self._load_model()
+            executor = get_embedding_executor()
             
+            # Texts embedded before (by this model) come from the cache
+            cached = await executor.run(self._cache_lookup, texts)
+            missing = [i for i in range(len(texts)) if i not in cached]
+            missing_texts = [texts[i] for i in missing]
             
-            # Process in batches for better memory management
-            all_embeddings = []
-            for i in range(0, len(texts), self.batch_size):
-                batch = texts[i:i + self.batch_size]
+            # Process in length-sorted batches for better memory management; each batch
+            # is one executor call, so other requests are served between batches
+            encoded = None
+            if missing_texts:
+                lengths = await executor.run(self._token_lengths, missing_texts)
+                batches = self._length_batches(lengths, self._token_budget(), settings.EMBEDDING_BATCH_MAX_TEXTS)
+            else:
+                batches = []
+            for batch_number, positions in enumerate(batches, start=1):
+                batch = [missing_texts[position] for position in positions]
                 
                 try:
-                    batch_embeddings = model.encode(
-                        batch,
-                        normalize_embeddings=self.normalize_embeddings,
-                        show_progress_bar=False
-                    )
-                    all_embeddings.append(batch_embeddings)
+                    batch_embeddings = await executor.run(self._encode, batch)
                 except Exception as batch_error:
-                    logger.error(f"Error processing batch {i // self.batch_size + 1}: {batch_error}")
+                    logger.error(f"Error processing batch {batch_number}: {batch_error}")
                     raise EmbeddingGenerationError(
-                        f"Failed to generate embeddings for batch {i // self.batch_size + 1}",
+                        f"Failed to generate embeddings for batch {batch_number}",
                         details=str(batch_error)
                     )
+                # Put each row back at its text's position
+                if encoded is None:
+                    encoded = np.empty((len(missing_texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+                encoded[positions] = batch_embeddings
             
-            # Combine all batch results
-            embeddings = np.vstack(all_embeddings) if len(all_embeddings) > 1 else all_embeddings[0]
-            
-            return embeddings
+            if encoded is not None:
+                await executor.run(self._cache_store, missing_texts, encoded)
+            if not cached:
+                return encoded
+            return self._merge_cached(len(texts), cached, missing, encoded)
             
         except EmbeddingGenerationError:
             raise
@@ -149,16 +235,15 @@ class SentenceTransformerEmbeddingService(EmbeddingService):
         if not text:
             logger.warning("Empty text provided for embedding generation")
             # Return zero vector of correct dimension
-            dimension = self.get_dimension()
+            dimension = await get_embedding_executor().run(self.get_dimension)
             return np.zeros(dimension).tolist()
         
         try:
-            model = self._load_model()
-            embedding = model.encode(
-                text,
-                normalize_embeddings=self.normalize_embeddings,
-                show_progress_bar=False
-            )
+            if settings.EMBEDDING_MICROBATCH_ENABLED:
+                # Shares one encode call with other requests arriving at the same time
+                return await self.batcher.embed(text)
+            
+            embedding, = await get_embedding_executor().run(self._encode_cached, [text])
             return embedding.tolist()
             
         except Exception as e:
@@ -167,6 +252,183 @@ class SentenceTransformerEmbeddingService(EmbeddingService):
                 "Failed to generate embedding for single text",
                 details=str(e)
             )
+    
+    @property
+    def batcher(self) -> EmbeddingBatcher:
+        """Micro-batcher merging this service's concurrent single-text requests"""
+        if self._batcher is None:
+            self._batcher = EmbeddingBatcher(
+                self._encode_batch,
+                max_batch_size=settings.EMBEDDING_MICROBATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_MICROBATCH_MAX_WAIT_MS
+            )
+        return self._batcher
+    
+    async def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode one micro-batch of query texts"""
+        return await get_embedding_executor().run(self._encode_cached, texts)
+    
+    def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """Blocking encode of the texts not in the cache, caching what was encoded"""
+        cached = self._cache_lookup(texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+        missing_texts = [texts[i] for i in missing]
+        encoded = None
+        if missing_texts:
+            encoded = self._encode(missing_texts)
+            self._cache_store(missing_texts, encoded)
+        if not cached:
+            return encoded
+        return self._merge_cached(len(texts), cached, missing, encoded)
+    
+    def _cache_lookup(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Cached embeddings by position in `texts` (empty if there is no cache or it fails)"""
+        cache = self.cache
+        if cache is None:
+            return {}
+        try:
+            return cache.get_many(self._cache_model_key(), texts)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache lookup failed, encoding everything: {e}")
+            return {}
+    
+    def _cache_store(self, texts: List[str], embeddings: np.ndarray):
+        cache = self.cache
+        if cache is None:
+            return
+        try:
+            cache.put_many(self._cache_model_key(), texts, embeddings)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write {len(texts)} embeddings to the cache: {e}")
+    
+    @staticmethod
+    def _merge_cached(
+        count: int,
+        cached: Dict[int, np.ndarray],
+        missing: List[int],
+        encoded: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """Embeddings in input order from cache hits and freshly encoded rows"""
+        dimension = len(next(iter(cached.values())))
+        embeddings = np.empty((count, dimension), dtype=np.float32)
+        for position, embedding in cached.items():
+            embeddings[position] = embedding
+        if missing:
+            embeddings[missing] = encoded
+        return embeddings
+    
+    def _encode(self, texts):
+        """Blocking encode (loading the model if needed); runs on an embedding executor thread"""
+        kwargs = {}
+        if isinstance(texts, list):
+            # Batches are already sized by token budget; encode each in one forward pass
+            kwargs["batch_size"] = max(1, len(texts))
+        return self._load_model().encode(
+            texts,
+            normalize_embeddings=self.normalize_embeddings,
+            show_progress_bar=False,
+            **kwargs
+        )
+    
+    def _max_seq_length(self) -> int:
+        return getattr(self._load_model(), "max_seq_length", None) or EMBEDDING_MAX_SEQ_LENGTH_DEFAULT
+    
+    def _token_budget(self) -> int:
+        """Padded tokens per batch (default: batch_size texts of the model's maximum length)"""
+        return settings.EMBEDDING_BATCH_TOKEN_BUDGET or self.batch_size * self._max_seq_length()
+    
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Tokens of each text after truncation, counted with the model's tokenizer when it has one"""
+        max_length = self._max_seq_length()
+        tokenizer = getattr(self._load_model(), "tokenizer", None)
+        if tokenizer is not None:
+            try:
+                input_ids = tokenizer(
+                    texts,
+                    truncation=True,
+                    max_length=max_length,
+                    return_attention_mask=False,
+                    return_token_type_ids=False
+                )["input_ids"]
+                return [len(ids) for ids in input_ids]
+            except Exception as e:
+                logger.debug(f"Tokenizer unavailable for length bucketing, estimating: {e}")
+        # Roughly four characters per token, plus the special tokens
+        return [min(max_length, len(text) // 4 + 2) for text in texts]
+    
+    @staticmethod
+    def _length_batches(lengths: List[int], token_budget: int, max_texts: int) -> List[List[int]]:
+        """
+        Group texts into batches of similar length within a padded-token budget.
+        
+        Args:
+            lengths: Token length of each text
+            token_budget: Most padded tokens (texts x longest text) per batch
+            max_texts: Most texts per batch
+            
+        Returns:
+            Positions of the texts in each batch, shortest texts first
+        """
+        batches, current = [], []
+        for position in np.argsort(lengths, kind="stable"):
+            position = int(position)
+            # Sorted ascending, so this text is the longest of the batch it joins
+            padded = (len(current) + 1) * max(1, lengths[position])
+            if current and (padded > token_budget or len(current) >= max_texts):
+                batches.append(current)
+                current = []
+            current.append(position)
+        if current:
+            batches.append(current)
+        return batches
+    
+    def get_stats(self) -> Dict:
+        """Micro-batching counters of this service, the executor's queue and the embedding cache"""
+        return {
+            "model_name": self.model_name,
+            "microbatching_enabled": settings.EMBEDDING_MICROBATCH_ENABLED,
+            **self.batcher.get_stats(),
+            "executor": get_embedding_executor().get_stats(),
+            "cache": self.cache.get_stats() if self.cache is not None else None
+        }
+
+
+class QueryContext:
+    """
+    Per-request query state shared by every retrieval step of a single question.
+
+    The query vector is computed on first use and reused afterwards, so searching
+    many document namespaces plus the email store costs one forward pass instead
+    of one per namespace. Derived queries (e.g. the skills re-search) are
+    memoized under their own text.
+    """
+    
+    def __init__(self, query: str, embedding_service: Optional[EmbeddingService] = None):
+        self.query = query
+        self._embedding_service = embedding_service
+        self._embeddings: Dict[str, List[float]] = {}
+    
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        """Embedding service used for this request (defaults to the shared instance)"""
+        if self._embedding_service is None:
+            self._embedding_service = get_embedding_service()
+        return self._embedding_service
+    
+    async def get_embedding(self, text: Optional[str] = None) -> List[float]:
+        """
+        Get the embedding for the request query, or for a derived query text
+        
+        Args:
+            text: Optional text to embed instead of the original query
+            
+        Returns:
+            The embedding as a list of floats
+        """
+        text = self.query if text is None else text
+        if text not in self._embeddings:
+            self._embeddings[text] = await self.embedding_service.generate_embedding(text)
+        return self._embeddings[text]
 
 
 # Global instance for backward compatibility (will be replaced with DI)
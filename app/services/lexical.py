@@ -0,0 +1,64 @@
+"""
+Tokenization and rank fusion for hybrid (lexical + vector) retrieval.
+
+Chunk text is tokenized once at ingest time into the BM25 index kept in each
+chunk store; queries are tokenized the same way. Amounts keep their decimal
+point ("$1,234.56" -> "1234.56") and digit runs inside identifiers are indexed on
+their own ("xxxx4242" -> "xxxx4242", "4242") so merchant names, card digits and
+exact amounts match as whole tokens.
+"""
+
+import re
+from typing import List, Dict, Hashable, Sequence
+
+# Reciprocal-rank fusion constant (Cormack et al.); dampens the weight of top ranks
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[^\W_]+")
+_DIGIT_RUN_PATTERN = re.compile(r"\d{4,}")
+
+STOPWORDS = frozenset("""
+a about all am an and any are as at be been but by can could did do does for from had has have
+how i if in into is it its me my of on or our so than that the their them then there these they
+this to too was we were what when where which who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word, number and amount tokens of a text, in order"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isdigit() and ',' in token:
+            token = token.replace(',', '')
+        tokens.append(token)
+        if not token.isdigit() and not token.isalpha():
+            # Card digits and reference numbers glued to letters ("xxxx4242")
+            tokens.extend(_DIGIT_RUN_PATTERN.findall(token))
+    return tokens
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct non-stopword tokens of a query"""
+    terms = []
+    for token in tokenize(text):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> Dict[Hashable, float]:
+    """
+    Fuse several rankings of the same items
+
+    Args:
+        rankings: Lists of item keys, best first
+        k: Rank damping constant
+
+    Returns:
+        Fused score per item (sum of 1 / (k + rank) over the rankings it appears in)
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -0,0 +1,219 @@
+"""
+Bounded, per-user fair scheduler for LLM inference.
+
+The llama.cpp model is neither thread-safe nor fast: one generation takes
+seconds to tens of seconds of CPU. Called from a coroutine it blocks the event
+loop for that long, and two concurrent /ask requests would race on the one
+model object. All generation therefore runs on a single worker thread that
+owns the model; coroutines submit work and await the result.
+
+Waiting work is kept in one queue per user and served round-robin, so one user
+firing many questions does not starve everyone else. The queue is bounded:
+when it is full, submit raises InferenceQueueFullError at once (with an
+estimate of when to retry) instead of letting requests pile up.
+"""
+
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import InferenceQueueFullError
+
+logger = logging.getLogger("personal_ai_agent")
+
+# Assumed generation time before any has been measured (for retry hints)
+_DEFAULT_SERVICE_SECONDS = 10.0
+_MAX_RETRY_AFTER_SECONDS = 300
+
+# Requests without a user share one queue
+ANONYMOUS_USER = "anonymous"
+
+
+@dataclass
+class _Job:
+    user: Hashable
+    function: Callable[..., Any]
+    args: Tuple
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class LLMScheduler:
+    """Single worker thread running LLM calls from per-user round-robin queues."""
+
+    def __init__(self, max_pending: int, max_pending_per_user: int):
+        """
+        Args:
+            max_pending: Most calls waiting (not yet running) across all users
+            max_pending_per_user: Most calls one user may have waiting
+        """
+        self.max_pending = max(1, max_pending)
+        self.max_pending_per_user = max(1, min(max_pending_per_user, self.max_pending))
+        self._queues: "OrderedDict[Hashable, Deque[_Job]]" = OrderedDict()
+        self._pending = 0
+        self._running: Optional[_Job] = None
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected_full = 0
+        self.rejected_user = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.total_service = 0.0
+        self.max_observed_pending = 0
+
+    async def submit(self, user_id: Optional[Hashable], function: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking LLM call on the worker thread and await its result.
+
+        Args:
+            user_id: User the call is made for (fairness is per user)
+            function: Blocking callable that uses the model (e.g. generate_response)
+            *args, **kwargs: Its arguments
+
+        Returns:
+            What the call returned (its exception is raised here)
+
+        Raises:
+            InferenceQueueFullError: The queue, or this user's share of it, is full
+        """
+        loop = asyncio.get_running_loop()
+        user = ANONYMOUS_USER if user_id is None else user_id
+        job = _Job(user, function, args, kwargs, loop.create_future(), loop)
+
+        with self._condition:
+            user_queue = self._queues.get(user)
+            if user_queue is not None and len(user_queue) >= self.max_pending_per_user:
+                self.rejected_user += 1
+                raise InferenceQueueFullError(
+                    "Too many questions in progress; wait for the current answers",
+                    retry_after=self._retry_after(len(user_queue)),
+                    per_user=True
+                )
+            if self._pending >= self.max_pending:
+                self.rejected_full += 1
+                raise InferenceQueueFullError(
+                    "The assistant is busy answering other questions",
+                    retry_after=self._retry_after(self._pending)
+                )
+            self._queues.setdefault(user, deque()).append(job)
+            self._pending += 1
+            self.max_observed_pending = max(self.max_observed_pending, self._pending)
+            self._ensure_worker()
+            self._condition.notify()
+
+        return await job.future
+
+    def _retry_after(self, ahead: int) -> int:
+        """Seconds until a slot is likely free (caller holds the lock)"""
+        finished = self.completed + self.failed
+        service = self.total_service / finished if finished else _DEFAULT_SERVICE_SECONDS
+        return max(1, min(_MAX_RETRY_AFTER_SECONDS, math.ceil(service * (ahead + 1))))
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="llm-inference", daemon=True)
+            self._worker.start()
+
+    def _next_job(self) -> _Job:
+        """Take the next user's oldest call, round-robin (caller holds the lock)"""
+        user, user_queue = next(iter(self._queues.items()))
+        job = user_queue.popleft()
+        del self._queues[user]
+        if user_queue:
+            # The user goes to the back of the line for their next call
+            self._queues[user] = user_queue
+        self._pending -= 1
+        return job
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queues:
+                    self._condition.wait()
+                job = self._next_job()
+                if job.future.cancelled():
+                    # The request went away while waiting
+                    self.cancelled += 1
+                    continue
+                self._running = job
+                waited = time.perf_counter() - job.enqueued
+                self.total_wait += waited
+                self.max_observed_wait = max(self.max_observed_wait, waited)
+
+            started = time.perf_counter()
+            try:
+                result, error = job.function(*job.args, **job.kwargs), None
+            except Exception as e:
+                result, error = None, e
+            elapsed = time.perf_counter() - started
+
+            with self._condition:
+                self._running = None
+                self.total_service += elapsed
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._resolve(job, result, error)
+
+    @staticmethod
+    def _resolve(job: _Job, result: Any, error: Optional[Exception]):
+        def settle():
+            if job.future.done():
+                return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        try:
+            job.loop.call_soon_threadsafe(settle)
+        except RuntimeError:
+            # The submitting event loop has closed
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, wait and service times, and rejection counters"""
+        with self._condition:
+            finished = self.completed + self.failed
+            started = finished + (1 if self._running is not None else 0)
+            return {
+                "max_pending": self.max_pending,
+                "max_pending_per_user": self.max_pending_per_user,
+                "pending": self._pending,
+                "waiting_users": len(self._queues),
+                "running": self._running is not None,
+                "max_observed_pending": self.max_observed_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected_full": self.rejected_full,
+                "rejected_user": self.rejected_user,
+                "mean_wait_ms": self.total_wait / started * 1000 if started else 0.0,
+                "max_wait_ms": self.max_observed_wait * 1000,
+                "mean_service_ms": self.total_service / finished * 1000 if finished else 0.0
+            }
+
+
+_llm_scheduler: Optional[LLMScheduler] = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get the process-wide LLM scheduler"""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler(settings.LLM_QUEUE_MAX_PENDING, settings.LLM_QUEUE_MAX_PENDING_PER_USER)
+        return _llm_scheduler
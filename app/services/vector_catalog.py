@@ -0,0 +1,226 @@
+"""
+Namespace catalog for the FAISS vector store.
+
+Keeps an in-memory map of user_id -> namespaces (with category, vector count and
+file paths) so searches resolve a user's indices without walking the storage
+directories. The catalog is built once by scanning the storage path, then kept
+up to date by writes and deletes and persisted as a small JSON manifest.
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Callable, Any, Iterable
+
+logger = logging.getLogger("personal_ai_agent")
+
+CATALOG_VERSION = 1
+
+# Journal lines always allowed before it is folded into the manifest
+JOURNAL_COMPACT_MIN_LINES = 256
+
+
+class VectorCatalog:
+    """In-memory namespace catalog persisted as a JSON manifest"""
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.journal_path = f"{manifest_path}.journal"
+        self._journal_lines = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[Optional[int], set] = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, namespace: str) -> bool:
+        return namespace in self._entries
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, scan: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        """
+        Load the manifest, or build it with the given scan function if missing or unreadable
+
+        Args:
+            scan: Callable returning catalog entries (dicts with a 'namespace' key)
+        """
+        with self._lock:
+            if self._loaded:
+                return
+
+            if os.path.exists(self.manifest_path):
+                try:
+                    with open(self.manifest_path, 'r') as f:
+                        manifest = json.load(f)
+                    if manifest.get("version") == CATALOG_VERSION:
+                        self._set_entries(manifest.get("namespaces", {}).values())
+                        self._replay_journal()
+                        self._loaded = True
+                        logger.info(f"Loaded vector catalog with {len(self._entries)} namespaces from {self.manifest_path}")
+                        return
+                    logger.warning(f"Vector catalog version mismatch in {self.manifest_path}, rebuilding")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not read vector catalog {self.manifest_path}, rebuilding: {e}")
+
+            self.rebuild(scan)
+
+    def rebuild(self, scan: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        """Rebuild the catalog from a storage scan and persist it"""
+        with self._lock:
+            self._set_entries(scan())
+            self._loaded = True
+            self.save()
+            logger.info(f"Built vector catalog with {len(self._entries)} namespaces")
+
+    def _set_entries(self, entries: Iterable[Dict[str, Any]]) -> None:
+        self._entries = {}
+        self._by_user = {}
+        for entry in entries:
+            self._index_entry(dict(entry))
+
+    def _index_entry(self, entry: Dict[str, Any]) -> None:
+        namespace = entry["namespace"]
+        self._entries[namespace] = entry
+        self._by_user.setdefault(entry.get("user_id"), set()).add(namespace)
+
+    def _unindex_entry(self, namespace: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(namespace, None)
+        if entry is not None:
+            user_namespaces = self._by_user.get(entry.get("user_id"))
+            if user_namespaces is not None:
+                user_namespaces.discard(namespace)
+                if not user_namespaces:
+                    del self._by_user[entry.get("user_id")]
+        return entry
+
+    def _replay_journal(self) -> None:
+        """Apply the writes journaled since the manifest was last saved"""
+        self._journal_lines = 0
+        if not os.path.exists(self.journal_path):
+            return
+        torn = False
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append
+                        logger.warning(f"Skipping unreadable line in vector catalog journal {self.journal_path}")
+                        torn = True
+                        continue
+                    self._unindex_entry(record["namespace"])
+                    if record.get("entry") is not None:
+                        self._index_entry(record["entry"])
+                    self._journal_lines += 1
+        except OSError as e:
+            logger.warning(f"Could not read vector catalog journal {self.journal_path}: {e}")
+        if torn:
+            # Appending after an unterminated line would tear the next record too
+            self.save()
+
+    def _journal(self, namespace: str, entry: Optional[Dict[str, Any]]) -> None:
+        """Append one write (entry None for a removal), folding the journal into the manifest when it grows"""
+        if self._journal_lines >= max(JOURNAL_COMPACT_MIN_LINES, len(self._entries)):
+            self.save()
+            return
+        try:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, 'a') as f:
+                f.write(json.dumps({"namespace": namespace, "entry": entry}) + "\n")
+            self._journal_lines += 1
+        except OSError as e:
+            logger.error(f"Failed to journal vector catalog write to {self.journal_path}: {e}")
+
+    def save(self) -> None:
+        """Persist the catalog atomically (write to a temp file, then rename) and empty the journal"""
+        with self._lock:
+            manifest = {
+                "version": CATALOG_VERSION,
+                "updated_at": datetime.now().isoformat(),
+                "namespaces": self._entries
+            }
+            tmp_path = f"{self.manifest_path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(manifest, f)
+                os.replace(tmp_path, self.manifest_path)
+                # Everything journaled is in the manifest now
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self._journal_lines = 0
+            except OSError as e:
+                # The catalog can always be rebuilt from disk, so never fail a write over it
+                logger.error(f"Failed to persist vector catalog {self.manifest_path}: {e}")
+
+    def register(
+        self,
+        namespace: str,
+        user_id: Optional[int],
+        category: str,
+        vector_count: int,
+        index_path: str,
+        docmap_path: str,
+        **extra: Any
+    ) -> None:
+        """Add or update a namespace entry and journal it"""
+        with self._lock:
+            self._unindex_entry(namespace)
+            entry = {
+                "namespace": namespace,
+                "user_id": user_id,
+                "category": category,
+                "vector_count": int(vector_count),
+                "index_path": index_path,
+                "docmap_path": docmap_path,
+                "updated_at": datetime.now().isoformat(),
+                **extra
+            }
+            self._index_entry(entry)
+            self._journal(namespace, entry)
+
+    def remove(self, namespace: str) -> bool:
+        """Remove a namespace entry and journal the removal"""
+        with self._lock:
+            removed = self._unindex_entry(namespace) is not None
+            if removed:
+                self._journal(namespace, None)
+            return removed
+
+    def get(self, namespace: str) -> Optional[Dict[str, Any]]:
+        """Get the entry for a namespace"""
+        return self._entries.get(namespace)
+
+    def get_user_namespaces(self, user_id: Optional[int]) -> List[str]:
+        """Get a user's namespaces (all namespaces when user_id is None)"""
+        with self._lock:
+            if user_id is None:
+                return list(self._entries)
+            return list(self._by_user.get(user_id, ()))
+
+    def get_user_entries(self, user_id: Optional[int]) -> List[Dict[str, Any]]:
+        """Get a user's catalog entries (all entries when user_id is None)"""
+        with self._lock:
+            return [self._entries[ns] for ns in self.get_user_namespaces(user_id)]
+
+
+# Shared catalogs so every service instance on the same storage sees one view
+_catalogs: Dict[str, VectorCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_vector_catalog(manifest_path: str) -> VectorCatalog:
+    """Get the shared catalog for a manifest path"""
+    manifest_path = os.path.abspath(manifest_path)
+    with _catalogs_lock:
+        if manifest_path not in _catalogs:
+            _catalogs[manifest_path] = VectorCatalog(manifest_path)
+        return _catalogs[manifest_path]
@@ -0,0 +1,184 @@
+"""
+Index mode selection for FAISS vector indices.
+
+Flat indices stay the source of truth on disk (segments, tombstones and
+compaction all operate on them). Above a configurable size an approximate
+nearest-neighbour (ANN) index - HNSW, IVF-Flat or IVF-PQ - is built from the
+flat vectors and used for searching. IVF indices are retrained in the
+background as the corpus grows past the size they were trained on.
+"""
+
+import math
+import logging
+from typing import Dict, Any, Optional
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.core.constants import (
+    VECTOR_INDEX_MODE_FLAT, VECTOR_INDEX_MODE_HNSW, VECTOR_INDEX_MODE_IVF_FLAT,
+    VECTOR_INDEX_MODE_IVF_PQ, VECTOR_INDEX_MODE_AUTO, VECTOR_INDEX_MODES, VECTOR_ANN_MODES
+)
+from app.core.exceptions import VectorStoreError
+
+logger = logging.getLogger("personal_ai_agent")
+
+# FAISS wants roughly 39 training points per centroid
+IVF_POINTS_PER_CENTROID = 39
+PQ_CODEBOOK_SIZE = 256
+
+# Filters that keep at most this share of the vectors are searched exactly on the flat index
+FILTERED_EXACT_SEARCH_RATIO = 0.1
+
+
+class IndexPolicy:
+    """Chooses, builds and queries the search index for a vector collection"""
+
+    def __init__(
+        self,
+        mode: str = None,
+        ann_mode: str = None,
+        min_vectors: int = None,
+        retrain_growth: float = None,
+        metric: int = faiss.METRIC_L2
+    ):
+        self.mode = (mode or settings.VECTOR_INDEX_MODE).lower()
+        self.ann_mode = (ann_mode or settings.VECTOR_ANN_MODE).lower()
+        if self.mode not in VECTOR_INDEX_MODES:
+            raise VectorStoreError(
+                f"Unknown vector index mode: {self.mode}",
+                details=f"Expected one of: {', '.join(VECTOR_INDEX_MODES)}"
+            )
+        if self.ann_mode not in VECTOR_ANN_MODES:
+            raise VectorStoreError(
+                f"Unknown ANN index mode: {self.ann_mode}",
+                details=f"Expected one of: {', '.join(VECTOR_ANN_MODES)}"
+            )
+
+        self.min_vectors = settings.VECTOR_ANN_MIN_VECTORS if min_vectors is None else min_vectors
+        self.retrain_growth = settings.VECTOR_ANN_RETRAIN_GROWTH if retrain_growth is None else retrain_growth
+        self.metric = metric
+        self.hnsw_m = settings.VECTOR_HNSW_M
+        self.hnsw_ef_construction = settings.VECTOR_HNSW_EF_CONSTRUCTION
+        self.hnsw_ef_search = settings.VECTOR_HNSW_EF_SEARCH
+        self.ivf_nprobe = settings.VECTOR_IVF_NPROBE
+
+    @staticmethod
+    def min_training_vectors(mode: str) -> int:
+        """Smallest collection a mode can be trained on"""
+        if mode == VECTOR_INDEX_MODE_IVF_FLAT:
+            return IVF_POINTS_PER_CENTROID * 16
+        if mode == VECTOR_INDEX_MODE_IVF_PQ:
+            return IVF_POINTS_PER_CENTROID * PQ_CODEBOOK_SIZE
+        return 0
+
+    def target_mode(self, vector_count: int) -> str:
+        """Index mode a collection of this size should be searched with"""
+        if self.mode == VECTOR_INDEX_MODE_AUTO:
+            mode = self.ann_mode if vector_count >= self.min_vectors else VECTOR_INDEX_MODE_FLAT
+        else:
+            mode = self.mode
+        # Too small to train: stay exact until there is enough data
+        if vector_count < max(1, self.min_training_vectors(mode)):
+            return VECTOR_INDEX_MODE_FLAT
+        return mode
+
+    def needs_build(self, ann_info: Optional[Dict[str, Any]], vector_count: int) -> bool:
+        """
+        Whether an ANN index should be (re)built
+
+        Args:
+            ann_info: Info of the current ANN index ({"mode", "trained_on"}), or None
+            vector_count: Live vectors in the collection
+        """
+        target = self.target_mode(vector_count)
+        if target == VECTOR_INDEX_MODE_FLAT:
+            return False
+        if ann_info is None or ann_info.get("mode") != target:
+            return True
+        # HNSW needs no training; IVF centroids go stale as the collection grows
+        if target in (VECTOR_INDEX_MODE_IVF_FLAT, VECTOR_INDEX_MODE_IVF_PQ):
+            return vector_count >= ann_info.get("trained_on", 0) * self.retrain_growth
+        return False
+
+    def ivf_nlist(self, vector_count: int) -> int:
+        """Number of IVF lists for a collection size"""
+        nlist = int(4 * math.sqrt(vector_count))
+        return max(1, min(nlist, vector_count // IVF_POINTS_PER_CENTROID))
+
+    @staticmethod
+    def pq_subquantizers(dimension: int) -> int:
+        """PQ sub-quantizer count that divides the dimension (about 8 dimensions each)"""
+        for m in (64, 48, 32, 24, 16, 12, 8, 4, 2):
+            if dimension % m == 0 and dimension // m >= 4:
+                return m
+        return 1
+
+    def create(self, mode: str, dimension: int, vector_count: int) -> faiss.Index:
+        """Create an empty (untrained) index for a mode"""
+        if mode == VECTOR_INDEX_MODE_FLAT:
+            return faiss.IndexFlat(dimension, self.metric)
+        if mode == VECTOR_INDEX_MODE_HNSW:
+            index = faiss.IndexHNSWFlat(dimension, self.hnsw_m, self.metric)
+            index.hnsw.efConstruction = self.hnsw_ef_construction
+            index.hnsw.efSearch = self.hnsw_ef_search
+            return index
+
+        quantizer = faiss.IndexFlat(dimension, self.metric)
+        nlist = self.ivf_nlist(vector_count)
+        if mode == VECTOR_INDEX_MODE_IVF_FLAT:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, self.metric)
+        elif mode == VECTOR_INDEX_MODE_IVF_PQ:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, self.pq_subquantizers(dimension), 8, self.metric)
+        else:
+            raise VectorStoreError(f"Unknown vector index mode: {mode}")
+        index.nprobe = min(self.ivf_nprobe, nlist)
+        return index
+
+    def build(self, mode: str, vectors: np.ndarray, ids: Optional[np.ndarray] = None) -> faiss.Index:
+        """
+        Build and fill an index for a mode
+
+        Args:
+            mode: Index mode
+            vectors: Array of shape (n, dimension)
+            ids: Vector IDs; when given the index is wrapped in an ID map
+
+        Returns:
+            The populated index
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = self.create(mode, vectors.shape[1], len(vectors))
+        if not index.is_trained:
+            index.train(vectors)
+        if ids is None:
+            index.add(vectors)
+        else:
+            index = faiss.IndexIDMap2(index)
+            index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        return index
+
+    def prefers_exact_search(self, allowed_count: int, live_count: int) -> bool:
+        """
+        Whether a filtered search should skip the ANN index
+
+        With a selective allow-list, flat search only scores the allowed vectors,
+        while HNSW and IVF still walk the graph or lists and lose recall as most
+        candidates are filtered out.
+        """
+        return allowed_count < live_count and allowed_count <= live_count * FILTERED_EXACT_SEARCH_RATIO
+
+    def search_params(self, mode: str, selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+        """Search parameters for a mode (with an optional ID selector)"""
+        if mode == VECTOR_INDEX_MODE_HNSW:
+            params = faiss.SearchParametersHNSW(efSearch=self.hnsw_ef_search)
+        elif mode in (VECTOR_INDEX_MODE_IVF_FLAT, VECTOR_INDEX_MODE_IVF_PQ):
+            params = faiss.SearchParametersIVF(nprobe=self.ivf_nprobe)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if selector is not None:
+            params.sel = selector
+        return params
@@ -0,0 +1,267 @@
+"""
+Append-only segment log for FAISS vector indices.
+
+Each add writes only its own batch (vectors, vector IDs and document-map entries)
+to a small numbered segment file next to the base index, so the write cost is
+proportional to the batch instead of the whole index. Loading an index replays
+the segments on top of the base files, and a background merge folds them back
+into the base index.
+
+Deleted vectors are recorded in a tombstone file next to the base index so
+searches can skip them immediately; compaction later removes them for good.
+
+Segment file layout: an 8-byte magic, the payload length (8 bytes, big endian),
+the SHA-256 of the payload, then the pickled payload. A segment is written to a
+temporary file, fsynced and renamed into place; segments that are truncated or
+fail the checksum (torn writes) are skipped during replay. Where vectors are
+keyed by position, replay stops at the first segment that does not start where
+the index ends, and that segment and every later one are set aside as corrupt.
+"""
+
+import os
+import json
+import struct
+import pickle
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, Set
+
+import numpy as np
+
+logger = logging.getLogger("personal_ai_agent")
+
+SEGMENT_MAGIC = b"FVSEG\x00\x01\n"
+SEGMENT_HEADER = struct.Struct(">8sQ32s")
+SEGMENT_SUFFIX = ".seg"
+CORRUPT_SUFFIX = ".corrupt"
+
+
+@dataclass
+class Segment:
+    """One appended batch"""
+    seq: int
+    start: int
+    vectors: np.ndarray
+    entries: List[Dict[str, Any]]
+    ids: Optional[np.ndarray] = None
+
+
+class SegmentLog:
+    """Numbered segment files stored in one directory per index"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @classmethod
+    def for_index(cls, index_path: str) -> "SegmentLog":
+        """Get the segment log that sits next to a base index file"""
+        return cls(f"{os.path.splitext(index_path)[0]}.segments")
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:08d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self) -> List[Tuple[int, str]]:
+        """List (seq, path) for every complete-looking segment file, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                seq = int(filename[:-len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            segments.append((seq, os.path.join(self.directory, filename)))
+        return sorted(segments)
+
+    def __len__(self) -> int:
+        return len(self.list_segments())
+
+    def append(
+        self,
+        vectors: np.ndarray,
+        entries: List[Dict[str, Any]],
+        start: int,
+        ids: Optional[np.ndarray] = None
+    ) -> int:
+        """
+        Durably write one batch as a new segment
+
+        Args:
+            vectors: Array of shape (n, dimension)
+            entries: One document-map entry per vector
+            start: Position of the first vector in the index (document-map length before the add)
+            ids: Vector IDs for ID-mapped indices
+
+        Returns:
+            Sequence number of the new segment
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.list_segments()
+        seq = existing[-1][0] + 1 if existing else 1
+
+        payload = pickle.dumps({
+            "start": int(start),
+            "vectors": np.ascontiguousarray(vectors, dtype=np.float32),
+            "ids": None if ids is None else np.asarray(ids, dtype=np.int64),
+            "entries": entries
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        header = SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(payload), hashlib.sha256(payload).digest())
+
+        path = self._segment_path(seq)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return seq
+
+    @staticmethod
+    def _read_segment(seq: int, path: str) -> Optional[Segment]:
+        """Read a segment, returning None if it is torn or corrupt"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(SEGMENT_HEADER.size)
+                if len(header) < SEGMENT_HEADER.size:
+                    return None
+                magic, length, digest = SEGMENT_HEADER.unpack(header)
+                if magic != SEGMENT_MAGIC:
+                    return None
+                payload = f.read(length)
+            if len(payload) != length or hashlib.sha256(payload).digest() != digest:
+                return None
+            data = pickle.loads(payload)
+            return Segment(
+                seq=seq,
+                start=data["start"],
+                vectors=data["vectors"],
+                entries=data["entries"],
+                ids=data.get("ids")
+            )
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, struct.error) as e:
+            logger.warning(f"Could not read vector segment {path}: {e}")
+            return None
+
+    def replay(self) -> Iterator[Segment]:
+        """Yield complete segments in order, skipping torn ones"""
+        for seq, path in self.list_segments():
+            segment = self._read_segment(seq, path)
+            if segment is None:
+                logger.warning(f"Skipping torn vector segment {path}")
+                continue
+            yield segment
+
+    def last_seq(self) -> int:
+        """Sequence number of the newest segment (0 if there are none)"""
+        segments = self.list_segments()
+        return segments[-1][0] if segments else 0
+
+    def quarantine(self, after_seq: int) -> int:
+        """Set aside every segment after a sequence number (renamed with a .corrupt suffix); returns how many"""
+        moved = 0
+        for seq, path in self.list_segments():
+            if seq <= after_seq:
+                continue
+            try:
+                os.replace(path, f"{path}{CORRUPT_SUFFIX}")
+                moved += 1
+            except OSError as e:
+                logger.warning(f"Could not set aside vector segment {path}: {e}")
+        return moved
+
+    def truncate(self, upto_seq: int) -> int:
+        """Remove segments up to and including a sequence number (after they were merged)"""
+        removed = 0
+        for seq, path in self.list_segments():
+            if seq > upto_seq:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove merged vector segment {path}: {e}")
+        self._remove_stale_temp_files(upto_seq)
+        return removed
+
+    def _remove_stale_temp_files(self, upto_seq: int):
+        """Drop leftovers of segment writes that never completed (newer ones may still be in progress)"""
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(f"{SEGMENT_SUFFIX}.tmp"):
+                continue
+            try:
+                seq = int(filename[:-len(f"{SEGMENT_SUFFIX}.tmp")])
+            except ValueError:
+                continue
+            if seq <= upto_seq:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Remove every segment and the segment directory"""
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError as e:
+                logger.warning(f"Could not remove {filename} from {self.directory}: {e}")
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+
+class Tombstones:
+    """Persisted set of deleted vector IDs for one index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ids: Set[int] = set()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.ids = set(int(vector_id) for vector_id in json.load(f).get("ids", []))
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not read tombstones {path}: {e}")
+
+    @classmethod
+    def for_index(cls, index_path: str) -> "Tombstones":
+        """Get the tombstones that sit next to a base index file"""
+        return cls(f"{os.path.splitext(index_path)[0]}.tombstones")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, vector_id: int) -> bool:
+        return int(vector_id) in self.ids
+
+    def add(self, vector_ids: Iterable[int]) -> int:
+        """Tombstone vector IDs and persist the set; returns how many were new"""
+        before = len(self.ids)
+        self.ids.update(int(vector_id) for vector_id in vector_ids)
+        added = len(self.ids) - before
+        if added:
+            self._save()
+        return added
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"ids": sorted(self.ids)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forget every tombstone (after compaction removed the vectors)"""
+        self.ids = set()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -3,10 +3,12 @@ Vector store service for managing document embeddings and similarity search
 """
 
 import os
-import pickle
 import logging
 import re
+import json
+import threading
 from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
 from abc import ABC, abstractmethod
 from datetime import datetime
 import faiss
@@ -16,9 +18,27 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.constants import (
+    VECTOR_STORE_LAYOUTS, VECTOR_STORE_LAYOUT_NAMESPACE, VECTOR_STORE_LAYOUT_USER,
+    VECTOR_STORE_USERS_DIR, VECTOR_INDEX_MODE_FLAT
+)
 from app.core.exceptions import VectorStoreError
-from app.services.embedding_service import EmbeddingService
+from app.services.embedding_service import EmbeddingService, QueryContext
+from app.services.vector_catalog import VectorCatalog, get_vector_catalog
+from app.services.vector_segments import SegmentLog, Tombstones
+from app.services.chunk_store import ChunkStore
+from app.services.lexical import RRF_K, tokenize, query_terms, reciprocal_rank_fusion
+from app.services.vector_index_policy import IndexPolicy
 from app.db.models import Document as DBDocument
+from app.utils.caching import invalidate_user_responses
+# Places whose mention in a financial chunk conflicts with a location-specific query
+COMMON_LOCATIONS = [
+    'rome', 'istanbul', 'paris', 'london', 'berlin', 'madrid', 'barcelona', 'amsterdam', 'vienna',
+    'prague', 'budapest', 'warsaw', 'stockholm', 'oslo', 'copenhagen', 'helsinki', 'dublin', 'lisbon',
+    'athens', 'moscow', 'tokyo', 'bangkok', 'singapore', 'hong kong', 'sydney', 'melbourne',
+    'new york', 'los angeles', 'chicago', 'miami', 'toronto', 'vancouver'
+]
+
 # Document type keywords - moved from deleted ai_config.py
 DOCUMENT_TYPE_KEYWORDS = {
     'vacation': [
@@ -74,24 +94,68 @@ class VectorStoreService(ABC):
         user_id: int = None,
         document_id: Optional[int] = None,
         top_k: int = 20,
-        metadata_filter: dict = None
+        metadata_filter: dict = None,
+        query_context: Optional[QueryContext] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar chunks"""
         pass
 
 
 class FAISSVectorStoreService(VectorStoreService):
-    """FAISS-based vector store service"""
+    """
+    FAISS-based vector store service
+    
+    Supports three storage layouts (see VECTOR_STORE_LAYOUT):
+    - namespace: one flat index per document namespace (legacy default)
+    - user: one ID-mapped index per user holding every document's chunks
+    - user_category: one ID-mapped index per user and document category
+    
+    In the consolidated layouts the document map is keyed by vector ID and each
+    entry records the document namespace and chunk index it came from.
+    """
     
-    def __init__(self, storage_path: str = None):
+    def __init__(self, storage_path: str = None, layout: str = None):
         self.storage_path = storage_path or settings.VECTOR_DB_PATH
+        self.layout = (layout or settings.VECTOR_STORE_LAYOUT).lower()
+        if self.layout not in VECTOR_STORE_LAYOUTS:
+            raise VectorStoreError(
+                f"Unknown vector store layout: {self.layout}",
+                details=f"Expected one of: {', '.join(VECTOR_STORE_LAYOUTS)}"
+            )
+        
+        # Keyed by storage key: the namespace itself, or the user index in consolidated layouts
         self._indices: Dict[str, faiss.Index] = {}
-        self._document_maps: Dict[str, List[Dict[str, Any]]] = {}
+        self._chunk_stores: Dict[str, ChunkStore] = {}
+        self._catalog: Optional[VectorCatalog] = None
+        
+        # Per-index locks serialize appends with merges; merges run in background threads
+        self._next_ids: Dict[str, int] = {}
+        self._key_locks: Dict[Tuple[str, bool], threading.RLock] = {}
+        self._key_locks_guard = threading.Lock()
+        self._pending_jobs: set = set()
+        self._tombstones: Dict[str, Tombstones] = {}
+        self.segment_merge_threshold = settings.VECTOR_SEGMENT_MERGE_THRESHOLD
+        self.compaction_tombstone_ratio = settings.VECTOR_COMPACTION_TOMBSTONE_RATIO
+        
+        # ANN indices are built from the flat vectors and used for search above the policy's size threshold
+        self.index_policy = IndexPolicy()
+        self._ann: Dict[str, Optional[Tuple[faiss.Index, Dict[str, Any]]]] = {}
+        self._generations: Dict[str, int] = {}
+        
+        # Loaded indices in LRU order with their resident / memory-mapped bytes
+        self.mmap_indices = settings.VECTOR_INDEX_MMAP
+        self.memory_budget_bytes = settings.VECTOR_MEMORY_BUDGET_BYTES
+        self._mapped: set = set()
+        self._memory: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._evictions = 0
         
         # Constants for more focused responses
         self.MAX_CHUNKS_PER_TYPE = 2  # Reduced from 3
         self.MAX_TOTAL_CHUNKS = 3     # Reduced from 5  
         self.HIGH_QUALITY_SCORE_THRESHOLD = 0.85
+        # Lexical hits below the vector score threshold need this share of the best BM25 score
+        self.LEXICAL_KEEP_RATIO = 0.5
         
         # Category-specific constants
         self.CATEGORY_DIRECTORIES = {
@@ -106,6 +170,157 @@ class FAISSVectorStoreService(VectorStoreService):
             category_path = os.path.join(self.storage_path, category)
             os.makedirs(category_path, exist_ok=True)
             logger.info(f"Ensured category directory exists: {category_path}")
+        
+        if self.is_consolidated:
+            os.makedirs(os.path.join(self.storage_path, VECTOR_STORE_USERS_DIR), exist_ok=True)
+    
+    @property
+    def catalog(self) -> VectorCatalog:
+        """Namespace catalog for this storage path and layout, built on first use"""
+        if self._catalog is None:
+            manifest_path = os.path.join(self.storage_path, f"catalog_{self.layout}.json")
+            self._catalog = get_vector_catalog(manifest_path)
+        if not self._catalog.is_loaded:
+            self._catalog.load(self._scan_catalog_entries)
+        return self._catalog
+    
+    def rebuild_catalog(self) -> int:
+        """Rebuild the namespace catalog from the files on disk"""
+        self.catalog.rebuild(self._scan_catalog_entries)
+        return len(self.catalog)
+    
+    @staticmethod
+    def _read_vector_count(index_path: str) -> int:
+        """Read an index's vector count, memory-mapping it when the index type allows"""
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC).ntotal
+        except Exception:
+            try:
+                return faiss.read_index(index_path).ntotal
+            except Exception as e:
+                logger.warning(f"Could not read vector count from {index_path}: {e}")
+                return 0
+    
+    def _scan_catalog_entries(self) -> List[Dict[str, Any]]:
+        """Walk the storage directories once to build catalog entries"""
+        entries = []
+        
+        if self.is_consolidated:
+            for key in self._get_user_storage_keys(None):
+                index_path, docmap_path = self._get_consolidated_paths(key)
+                if not ChunkStore.exists_for_index(index_path):
+                    continue
+                try:
+                    with ChunkStore.for_index(index_path) as chunk_store:
+                        # Batches still sitting in delta segments count too
+                        for segment in SegmentLog.for_index(index_path).replay():
+                            chunk_store.put_many(segment.ids.tolist(), segment.entries, replace=False)
+                        documents = chunk_store.namespace_counts()
+                        deleted = Tombstones.for_index(index_path).ids
+                        for namespace, count in chunk_store.namespace_counts(deleted).items():
+                            documents[namespace] -= count
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable chunk store for {key}: {e}")
+                    continue
+                entries.append({
+                    "namespace": key,
+                    "user_id": self._get_user_id_from_namespace(key),
+                    "category": self._get_category_from_namespace(key),
+                    "vector_count": sum(count for count in documents.values() if count > 0),
+                    "index_path": index_path,
+                    "docmap_path": docmap_path,
+                    "documents": {namespace: count for namespace, count in documents.items() if count > 0}
+                })
+            return entries
+        
+        # Category directories take precedence over the legacy root directory
+        seen = set()
+        locations = [(os.path.join(self.storage_path, d), c) for c, d in self.CATEGORY_DIRECTORIES.items()]
+        locations.append((self.storage_path, None))
+        for directory, category in locations:
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                if not filename.endswith(".index"):
+                    continue
+                namespace = filename[:-6]
+                index_path = os.path.join(directory, filename)
+                docmap_path = ChunkStore.path_for_index(index_path)
+                if namespace in seen or not ChunkStore.exists_for_index(index_path):
+                    continue
+                seen.add(namespace)
+                entries.append({
+                    "namespace": namespace,
+                    "user_id": self._get_user_id_from_namespace(namespace),
+                    "category": category or self._get_category_from_namespace(namespace),
+                    "vector_count": self._read_vector_count(index_path),
+                    "index_path": index_path,
+                    "docmap_path": docmap_path
+                })
+        return entries
+    
+    @property
+    def is_consolidated(self) -> bool:
+        """Whether vectors are stored in per-user ID-mapped indices"""
+        return self.layout != VECTOR_STORE_LAYOUT_NAMESPACE
+    
+    @staticmethod
+    def _get_user_id_from_namespace(namespace: str) -> Optional[int]:
+        """Extract the owning user ID from a namespace like 'financial_user_3_doc_x'"""
+        match = re.search(r'user_(\d+)(?:_|$)', namespace)
+        return int(match.group(1)) if match else None
+    
+    def _get_storage_key(self, namespace: str, document_type: str = None) -> str:
+        """Map a document namespace to the index it is stored in for the active layout"""
+        if not self.is_consolidated:
+            return namespace
+        
+        user_id = self._get_user_id_from_namespace(namespace)
+        if user_id is None:
+            return namespace
+        
+        if self.layout == VECTOR_STORE_LAYOUT_USER:
+            return f"user_{user_id}"
+        
+        category = document_type or self._get_category_from_namespace(namespace)
+        if category not in self.CATEGORY_DIRECTORIES:
+            category = 'generic'
+        return f"user_{user_id}_{category}"
+    
+    def _get_user_storage_keys(self, user_id: Optional[int]) -> List[str]:
+        """List the consolidated index keys that exist on disk for a user (or all users)"""
+        users_path = os.path.join(self.storage_path, VECTOR_STORE_USERS_DIR)
+        keys = []
+        if os.path.exists(users_path):
+            for filename in os.listdir(users_path):
+                if not filename.endswith(".index"):
+                    continue
+                key = filename[:-6]
+                match = re.fullmatch(r'user_(\d+)(?:_(\w+))?', key)
+                if not match:
+                    continue
+                # Only pick up indices written for the active layout
+                key_category = match.group(2)
+                if (self.layout == VECTOR_STORE_LAYOUT_USER) != (key_category is None):
+                    continue
+                if key_category is not None and key_category not in self.CATEGORY_DIRECTORIES:
+                    continue
+                if user_id is not None and int(match.group(1)) != user_id:
+                    continue
+                keys.append(key)
+        return keys
+    
+    def _get_consolidated_paths(self, key: str) -> Tuple[str, str]:
+        """Get the index and document map paths for a consolidated user index"""
+        users_path = os.path.join(self.storage_path, VECTOR_STORE_USERS_DIR)
+        index_path = os.path.join(users_path, f"{key}.index")
+        return index_path, ChunkStore.path_for_index(index_path)
+    
+    def _create_index(self, dimension: int) -> faiss.Index:
+        """Create an empty index for the active layout"""
+        if self.is_consolidated:
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        return faiss.IndexFlatL2(dimension)
     
     def _get_category_from_namespace(self, namespace: str) -> str:
         """Extract document category from namespace or metadata"""
@@ -125,16 +340,33 @@ class FAISSVectorStoreService(VectorStoreService):
         return os.path.join(category_path, f"{namespace}.index")
     
     def _get_docmap_path(self, namespace: str, category: str = None) -> str:
-        """Get the file path for the document map with category organization"""
-        if category is None:
-            category = self._get_category_from_namespace(namespace)
-            
-        category_dir = self.CATEGORY_DIRECTORIES.get(category, 'generic')
-        category_path = os.path.join(self.storage_path, category_dir)
-        return os.path.join(category_path, f"{namespace}.pkl")
+        """Get the file path for the chunk store with category organization"""
+        return ChunkStore.path_for_index(self._get_index_path(namespace, category))
+    
+    @staticmethod
+    def _read_index_file(index_path: str, mmap: bool = False) -> Tuple[faiss.Index, bool]:
+        """Read an index, memory-mapping its vectors when requested and the index type allows"""
+        if mmap:
+            try:
+                return faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC), True
+            except Exception as e:
+                logger.debug(f"Index {index_path} cannot be memory-mapped, reading it fully: {e}")
+        return faiss.read_index(index_path), False
     
-    def _load_index(self, namespace: str) -> Tuple[Optional[faiss.Index], Optional[List[Dict[str, Any]]]]:
-        """Load index and document map from disk"""
+    def _load_index(self, namespace: str, mmap: bool = False) -> Tuple[Optional[faiss.Index], Optional[ChunkStore], bool]:
+        """Load index and chunk store from disk (returns whether the index is memory-mapped)"""
+        if self.is_consolidated:
+            return self._load_consolidated_index(namespace, mmap)
+        
+        # Use the paths recorded in the catalog when available
+        entry = self.catalog.get(namespace)
+        if entry and os.path.exists(entry["index_path"]) and ChunkStore.exists_for_index(entry["index_path"]):
+            try:
+                index, mapped = self._read_index_file(entry["index_path"], mmap)
+                return index, ChunkStore.for_index(entry["index_path"]), mapped
+            except Exception as e:
+                logger.error(f"Error loading cataloged index for namespace {namespace}: {e}")
+        
         # Try to find the index in category directories first
         for category, category_dir in self.CATEGORY_DIRECTORIES.items():
             category_path = os.path.join(self.storage_path, category_dir)
@@ -144,30 +376,24 @@ class FAISSVectorStoreService(VectorStoreService):
             
             for ns in namespaces_to_try:
                 index_path = os.path.join(category_path, f"{ns}.index")
-                docmap_path = os.path.join(category_path, f"{ns}.pkl")
                 
-                if os.path.exists(index_path) and os.path.exists(docmap_path):
+                if os.path.exists(index_path) and ChunkStore.exists_for_index(index_path):
                     try:
-                        index = faiss.read_index(index_path)
-                        with open(docmap_path, 'rb') as f:
-                            document_map = pickle.load(f)
-                        return index, document_map
+                        index, mapped = self._read_index_file(index_path, mmap)
+                        return index, ChunkStore.for_index(index_path), mapped
                     except Exception as e:
                         logger.error(f"Error loading index for namespace {ns} from {category}: {e}")
                         continue
         
         # Fallback to root directory (for backward compatibility)
         index_path = os.path.join(self.storage_path, f"{namespace}.index")
-        docmap_path = os.path.join(self.storage_path, f"{namespace}.pkl")
         
-        if not os.path.exists(index_path) or not os.path.exists(docmap_path):
-            return None, None
+        if not os.path.exists(index_path) or not ChunkStore.exists_for_index(index_path):
+            return None, None, False
         
         try:
-            index = faiss.read_index(index_path)
-            with open(docmap_path, 'rb') as f:
-                document_map = pickle.load(f)
-            return index, document_map
+            index, mapped = self._read_index_file(index_path, mmap)
+            return index, ChunkStore.for_index(index_path), mapped
         except Exception as e:
             logger.error(f"Error loading index for namespace {namespace}: {e}")
             raise VectorStoreError(
@@ -175,21 +401,541 @@ class FAISSVectorStoreService(VectorStoreService):
                 details=str(e)
             )
     
-    def _save_index(self, namespace: str, index: faiss.Index, document_map: List[Dict[str, Any]], document_type: str = None):
-        """Save index and document map to disk"""
-        # Use document_type if provided, otherwise fall back to namespace detection
-        category = document_type if document_type else self._get_category_from_namespace(namespace)
-        index_path = self._get_index_path(namespace, category)
-        docmap_path = self._get_docmap_path(namespace, category)
+    def _load_consolidated_index(self, key: str, mmap: bool = False) -> Tuple[Optional[faiss.Index], Optional[ChunkStore], bool]:
+        """Load a consolidated user index and its vector-ID keyed chunk store"""
+        index_path, _ = self._get_consolidated_paths(key)
+        if not os.path.exists(index_path) or not ChunkStore.exists_for_index(index_path):
+            return None, None, False
         
+        try:
+            index, mapped = self._read_index_file(index_path, mmap)
+            return index, ChunkStore.for_index(index_path), mapped
+        except Exception as e:
+            logger.error(f"Error loading consolidated index {key}: {e}")
+            raise VectorStoreError(
+                f"Failed to load vector store for {key}",
+                details=str(e)
+            )
+    
+    def _get_loaded_index(
+        self,
+        key: str,
+        dimension: int = None,
+        document_type: str = None
+    ) -> Tuple[Optional[faiss.Index], Optional[ChunkStore]]:
+        """Get an index and its chunk store, loading them from disk or creating them (when dimension is given)"""
+        # Lock-free fast path; an eviction in between leaves a missing half, which falls through to a reload
+        index, chunk_store = self._indices.get(key), self._chunk_stores.get(key)
+        if index is not None and chunk_store is not None:
+            self._touch(key)
+            return index, chunk_store
+        
+        with self._get_key_lock(key):
+            index, chunk_store = self._indices.get(key), self._chunk_stores.get(key)
+            if index is not None and chunk_store is not None:
+                return index, chunk_store
+            
+            # Map the base file read-only unless segments have to be replayed on top of it
+            mmap = self.mmap_indices and not self._get_segment_log(key, document_type).list_segments()
+            index, chunk_store, mapped = self._load_index(key, mmap)
+            if index is None:
+                if dimension is None:
+                    return None, None
+                index = self._create_index(dimension)
+                chunk_store = ChunkStore.for_index(self._get_index_files(key, document_type)[0])
+            else:
+                self._replay_segments(key, index, chunk_store)
+            
+            if self.is_consolidated:
+                # Never reuse a tombstoned ID, even one already compacted out of the chunk store
+                max_id = chunk_store.max_id()
+                used_ids = [-1 if max_id is None else max_id] + list(self._get_tombstones(key).ids)
+                self._next_ids[key] = max(used_ids) + 1
+            if mapped:
+                self._mapped.add(key)
+            self._indices[key] = index
+            self._chunk_stores[key] = chunk_store
+            self._update_memory(key)
+        
+        self._enforce_memory_budget(keep=key)
+        return index, chunk_store
+    
+    def _get_writable_index(
+        self,
+        key: str,
+        dimension: int = None,
+        document_type: str = None
+    ) -> Tuple[Optional[faiss.Index], Optional[ChunkStore]]:
+        """
+        Get an index that can be modified, reading a memory-mapped index fully into memory first
+        
+        Memory-mapped FAISS indices are read-only; adding to or removing from one aborts the process.
+        """
+        index, chunk_store = self._get_loaded_index(key, dimension, document_type)
+        if key not in self._mapped:
+            return index, chunk_store
+        
+        with self._get_key_lock(key):
+            if key in self._mapped:
+                index = faiss.deserialize_index(faiss.serialize_index(self._indices[key]))
+                self._indices[key] = index
+                self._mapped.discard(key)
+                self._update_memory(key)
+            index = self._indices.get(key, index)
+        
+        self._enforce_memory_budget(keep=key)
+        return index, chunk_store
+    
+    def _touch(self, key: str):
+        """Mark a loaded index as most recently used"""
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+    
+    def _update_memory(self, key: str):
+        """Recompute the resident and memory-mapped bytes of a loaded index"""
+        index = self._indices.get(key)
+        if index is None:
+            return
+        vector_bytes = index.ntotal * index.d * 4
+        id_bytes = index.ntotal * 16 if self.is_consolidated else 0
+        ann_entry = self._ann.get(key)
+        ann_bytes = 0
+        if ann_entry is not None:
+            ann, info = ann_entry
+            ann_bytes = int(ann.ntotal * info.get("bytes_per_vector", index.d * 4))
+        mapped = key in self._mapped
+        
+        with self._memory_lock:
+            self._memory[key] = {
+                "resident_bytes": (0 if mapped else vector_bytes) + id_bytes + ann_bytes,
+                "mapped_bytes": vector_bytes if mapped else 0
+            }
+            self._memory.move_to_end(key)
+    
+    def _unload(self, key: str) -> Optional[ChunkStore]:
+        """
+        Drop a key's in-memory state (index, chunk store, ANN index and accounting)
+        
+        The chunk store is not closed: a search that fetched it before the eviction
+        may still be reading from it, and its connection is closed once the last
+        reference goes. Returns it so deletions can mark it removed.
+        """
+        self._indices.pop(key, None)
+        chunk_store = self._chunk_stores.pop(key, None)
+        self._ann.pop(key, None)
+        self._next_ids.pop(key, None)
+        self._mapped.discard(key)
+        with self._memory_lock:
+            self._memory.pop(key, None)
+        return chunk_store
+    
+    def _enforce_memory_budget(self, keep: Optional[str] = None):
+        """Evict least recently used indices until the loaded bytes fit the budget"""
+        if self.memory_budget_bytes <= 0:
+            return
+        
+        with self._memory_lock:
+            usage = list(self._memory.items())
+        total = sum(u["resident_bytes"] + u["mapped_bytes"] for _, u in usage)
+        
+        for key, key_usage in usage:
+            if total <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            # Skip indices that are busy (being written or merged) rather than wait on them
+            lock = self._get_key_lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                self._unload(key)
+            finally:
+                lock.release()
+            total -= key_usage["resident_bytes"] + key_usage["mapped_bytes"]
+            self._evictions += 1
+            logger.info(f"Evicted vector index {key} from memory (LRU, budget {self.memory_budget_bytes} bytes)")
+    
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """
+        Resident and memory-mapped bytes of loaded indices, per user
+        
+        Returns:
+            Totals, the budget, eviction count and a per-user breakdown
+        """
+        with self._memory_lock:
+            usage = list(self._memory.items())
+        
+        users: Dict[Any, Dict[str, Any]] = {}
+        for key, key_usage in usage:
+            user_id = self._get_user_id_from_namespace(key)
+            user = users.setdefault(user_id, {
+                "user_id": user_id,
+                "loaded_indices": 0,
+                "resident_bytes": 0,
+                "mapped_bytes": 0
+            })
+            user["loaded_indices"] += 1
+            user["resident_bytes"] += key_usage["resident_bytes"]
+            user["mapped_bytes"] += key_usage["mapped_bytes"]
+        
+        return {
+            "budget_bytes": self.memory_budget_bytes,
+            "resident_bytes": sum(u["resident_bytes"] for _, u in usage),
+            "mapped_bytes": sum(u["mapped_bytes"] for _, u in usage),
+            "loaded_indices": len(usage),
+            "mapped_indices": len(self._mapped),
+            "evictions": self._evictions,
+            "users": sorted(users.values(), key=lambda u: u["resident_bytes"] + u["mapped_bytes"], reverse=True)
+        }
+    
+    def _get_key_lock(self, key: str, base_writes: bool = False) -> threading.RLock:
+        """
+        Get the lock guarding one index's in-memory state and segment appends, or
+        (with base_writes) the lock serializing rewrites of its base files
+        """
+        lock_key = (key, base_writes)
+        with self._key_locks_guard:
+            if lock_key not in self._key_locks:
+                self._key_locks[lock_key] = threading.RLock()
+            return self._key_locks[lock_key]
+    
+    def _get_index_files(self, key: str, document_type: str = None) -> Tuple[str, str]:
+        """Get the base index and document map paths for a storage key"""
+        if self.is_consolidated:
+            return self._get_consolidated_paths(key)
+        entry = self.catalog.get(key)
+        if entry:
+            return entry["index_path"], entry["docmap_path"]
+        category = document_type if document_type else self._get_category_from_namespace(key)
+        return self._get_index_path(key, category), self._get_docmap_path(key, category)
+    
+    def _get_segment_log(self, key: str, document_type: str = None) -> SegmentLog:
+        """Get the delta segment log stored next to a key's base index"""
+        return SegmentLog.for_index(self._get_index_files(key, document_type)[0])
+    
+    def _replay_segments(self, key: str, index: faiss.Index, chunk_store: ChunkStore) -> int:
+        """
+        Apply delta segments on top of a freshly loaded base index
+        
+        Segments already folded into the base (a merge that crashed before removing
+        them) are recognized by their vector IDs or start position and skipped, as
+        are torn segments. Chunk rows the store already holds are kept.
+        
+        Per-namespace indices are keyed by position, so replay stops at the first
+        segment that would leave a gap (an earlier segment was lost or corrupt);
+        later segments are set aside and their chunk rows dropped, keeping
+        positions and chunk rows aligned.
+        """
+        log = self._get_segment_log(key)
+        if not log.list_segments():
+            return 0
+        
+        present_ids = set(faiss.vector_to_array(index.id_map).tolist()) if self.is_consolidated else None
+        replayed = 0
+        last_seq = 0
+        for segment in log.replay():
+            if not self.is_consolidated and segment.start > index.ntotal:
+                moved = log.quarantine(last_seq)
+                chunk_store.delete(range(index.ntotal, (chunk_store.max_id() or 0) + 1))
+                logger.error(
+                    f"Vector segment {segment.seq} of {key} starts at {segment.start} but the index ends at "
+                    f"{index.ntotal}; an earlier segment is missing or corrupt. Set aside {moved} segments"
+                )
+                break
+            if self.is_consolidated:
+                new = [i for i, vector_id in enumerate(segment.ids) if int(vector_id) not in present_ids]
+                if new:
+                    index.add_with_ids(segment.vectors[new], segment.ids[new])
+                    present_ids.update(int(vector_id) for vector_id in segment.ids[new])
+                chunk_store.put_many(segment.ids.tolist(), segment.entries, replace=False)
+            else:
+                end = segment.start + len(segment.entries)
+                if index.ntotal < end:
+                    index.add(segment.vectors[index.ntotal - segment.start:])
+                chunk_store.put_many(range(segment.start, end), segment.entries, replace=False)
+            replayed += 1
+            last_seq = segment.seq
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} vector segments for {key}")
+        return replayed
+    
+    def merge_segments(self, key: str) -> int:
+        """
+        Fold a key's delta segments into its base index
+        
+        The in-memory index already contains every segment, so it is snapshotted
+        under the key lock and written out without blocking further appends.
+        Chunk rows are written to the chunk store as they are added, so only the
+        index file is rewritten.
+        
+        Args:
+            key: Storage key (namespace or consolidated user index)
+            
+        Returns:
+            Number of segments merged
+        """
+        with self._get_key_lock(key, base_writes=True):
+            with self._get_key_lock(key):
+                index, _ = self._get_loaded_index(key)
+                if index is None:
+                    return 0
+                log = self._get_segment_log(key)
+                upto_seq = log.last_seq()
+                if upto_seq == 0:
+                    return 0
+                index_bytes = faiss.serialize_index(index)
+                index_path, _ = self._get_index_files(key)
+            
+            self._write_index_file(key, faiss.deserialize_index(index_bytes), index_path)
+            merged = log.truncate(upto_seq)
+        
+        logger.info(f"Merged {merged} vector segments into {key}")
+        return merged
+    
+    def _get_tombstones(self, key: str) -> Tombstones:
+        """Get the deleted vector IDs of a storage key"""
+        if key not in self._tombstones:
+            self._tombstones[key] = Tombstones.for_index(self._get_index_files(key)[0])
+        return self._tombstones[key]
+    
+    def compact(self, key: str) -> int:
+        """
+        Remove tombstoned vectors from a key's index and rewrite its base files
+        
+        Segments are folded in at the same time. Searches run on the cached index
+        without a lock, so the vectors are removed from a copy, which is persisted
+        and then swapped into the cache. Tombstones are cleared last, so a crash
+        part-way leaves deleted vectors hidden rather than resurrected.
+        
+        Args:
+            key: Consolidated storage key
+            
+        Returns:
+            Number of vectors removed
+        """
+        with self._get_key_lock(key, base_writes=True), self._get_key_lock(key):
+            tombstones = self._get_tombstones(key)
+            if not tombstones:
+                return 0
+            index, chunk_store = self._get_loaded_index(key)
+            if index is None:
+                tombstones.clear()
+                return 0
+            
+            # Appends wait on the key lock, so the copy misses nothing
+            index = faiss.deserialize_index(faiss.serialize_index(index))
+            removed = index.remove_ids(faiss.IDSelectorBatch(np.array(sorted(tombstones.ids), dtype=np.int64)))
+            
+            log = self._get_segment_log(key)
+            upto_seq = log.last_seq()
+            index_path, docmap_path = self._save_index(key, index)
+            log.truncate(upto_seq)
+            
+            # Searches still on the old index skip rows that are gone
+            chunk_store.delete(tombstones.ids)
+            self._indices[key] = index
+            self._mapped.discard(key)
+            tombstones.clear()
+            
+            # Vector positions changed, so the ANN index no longer matches; rebuild it
+            self._drop_ann(key)
+            self._update_memory(key)
+            self._maybe_schedule_ann_build(key, index)
+            
+            entry = self.catalog.get(key) or {}
+            self.catalog.register(
+                key,
+                user_id=entry.get("user_id", self._get_user_id_from_namespace(key)),
+                category=entry.get("category", self._get_category_from_namespace(key)),
+                vector_count=index.ntotal,
+                index_path=index_path,
+                docmap_path=docmap_path,
+                documents=entry.get("documents", {})
+            )
+        
+        logger.info(f"Compacted {key}: removed {removed} deleted vectors")
+        return removed
+    
+    def _get_ann_paths(self, key: str) -> Tuple[str, str]:
+        """Get the ANN index and info paths for a storage key"""
+        base = os.path.splitext(self._get_index_files(key)[0])[0]
+        return f"{base}.ann", f"{base}.ann.json"
+    
+    def _get_flat_vectors(self, index: faiss.Index, start: int = 0) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Read vectors (and their IDs in consolidated layouts) from a flat index, from a position on"""
+        flat = faiss.downcast_index(index.index) if self.is_consolidated else index
+        count = flat.ntotal - start
+        if count <= 0:
+            return np.empty((0, flat.d), dtype=np.float32), None
+        vectors = flat.reconstruct_n(start, count)
+        ids = faiss.vector_to_array(index.id_map)[start:] if self.is_consolidated else None
+        return vectors, ids
+    
+    def _catch_up_ann(self, index: faiss.Index, ann: faiss.Index, info: Dict[str, Any]):
+        """Add flat vectors appended after the ANN index was built"""
+        if info["covered"] >= index.ntotal:
+            return
+        vectors, ids = self._get_flat_vectors(index, info["covered"])
+        if ids is None:
+            ann.add(vectors)
+        else:
+            ann.add_with_ids(vectors, ids)
+        info["covered"] = index.ntotal
+    
+    def _get_ann(self, key: str, index: faiss.Index) -> Optional[Tuple[faiss.Index, Dict[str, Any]]]:
+        """Get a key's ANN index from memory or disk (None if it has none)"""
+        if key in self._ann:
+            return self._ann[key]
+        
+        with self._get_key_lock(key):
+            if key in self._ann:
+                return self._ann[key]
+            
+            ann_entry = None
+            ann_path, info_path = self._get_ann_paths(key)
+            if os.path.exists(ann_path) and os.path.exists(info_path):
+                try:
+                    with open(info_path, 'r') as f:
+                        info = json.load(f)
+                    if info.get("covered", 0) <= index.ntotal:
+                        ann = faiss.read_index(ann_path)
+                        self._catch_up_ann(index, ann, info)
+                        ann_entry = (ann, info)
+                    else:
+                        # Left over from before a compaction
+                        logger.warning(f"Discarding stale ANN index for {key}")
+                except Exception as e:
+                    logger.error(f"Error loading ANN index for {key}: {e}")
+            
+            self._ann[key] = ann_entry
+            self._update_memory(key)
+        
+        self._maybe_schedule_ann_build(key, index)
+        return ann_entry
+    
+    def _get_search_index(self, key: str, index: faiss.Index) -> Tuple[faiss.Index, str]:
+        """Pick the index to search: the ANN index when the policy calls for one and it exists"""
+        live_count = index.ntotal - len(self._get_tombstones(key))
+        if self.index_policy.target_mode(live_count) == VECTOR_INDEX_MODE_FLAT:
+            return index, VECTOR_INDEX_MODE_FLAT
+        ann_entry = self._get_ann(key, index)
+        if ann_entry is None:
+            return index, VECTOR_INDEX_MODE_FLAT
+        ann, info = ann_entry
+        return ann, info["mode"]
+    
+    def _maybe_schedule_ann_build(self, key: str, index: faiss.Index):
+        """Build or retrain a key's ANN index in the background when the policy asks for it"""
+        live_count = index.ntotal - len(self._get_tombstones(key))
+        ann_entry = self._ann.get(key)
+        if self.index_policy.needs_build(ann_entry[1] if ann_entry else None, live_count):
+            self._schedule_background(key, "build_ann_index")
+    
+    def _drop_ann(self, key: str):
+        """Forget a key's ANN index in memory and on disk"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._ann.pop(key, None)
+        for path in self._get_ann_paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def build_ann_index(self, key: str) -> int:
+        """
+        Build (or retrain) the ANN index for a storage key using the policy's target mode
+        
+        Training runs without holding the key lock, so appends continue; vectors
+        added meanwhile are caught up before the new index is installed.
+        
+        Args:
+            key: Storage key (namespace or consolidated user index)
+            
+        Returns:
+            Number of vectors in the new ANN index (0 if none was built)
+        """
+        with self._get_key_lock(key, base_writes=True):
+            with self._get_key_lock(key):
+                index, _ = self._get_loaded_index(key)
+                if index is None:
+                    return 0
+                live_count = index.ntotal - len(self._get_tombstones(key))
+                mode = self.index_policy.target_mode(live_count)
+                if mode == VECTOR_INDEX_MODE_FLAT:
+                    return 0
+                generation = self._generations.get(key, 0)
+                vectors, ids = self._get_flat_vectors(index)
+            
+            start = datetime.now()
+            ann = self.index_policy.build(mode, vectors, ids)
+            info = {
+                "mode": mode,
+                "trained_on": len(vectors),
+                "covered": len(vectors),
+                "built_at": datetime.now().isoformat()
+            }
+            
+            with self._get_key_lock(key):
+                if self._generations.get(key, 0) != generation or key not in self._indices:
+                    logger.info(f"Discarding ANN build for {key}: index changed during build")
+                    return 0
+                self._catch_up_ann(self._indices[key], ann, info)
+                self._ann[key] = (ann, info)
+                ann_bytes = faiss.serialize_index(ann)
+                info["bytes_per_vector"] = len(ann_bytes) / max(1, ann.ntotal)
+                saved_info = dict(info)
+                self._update_memory(key)
+            
+            ann_path, info_path = self._get_ann_paths(key)
+            faiss.write_index(faiss.deserialize_index(ann_bytes), f"{ann_path}.tmp")
+            with open(f"{info_path}.tmp", 'w') as f:
+                json.dump(saved_info, f)
+            os.replace(f"{ann_path}.tmp", ann_path)
+            os.replace(f"{info_path}.tmp", info_path)
+        
+        elapsed = (datetime.now() - start).total_seconds()
+        logger.info(f"Built {mode} index for {key} over {len(vectors)} vectors in {elapsed:.1f}s")
+        return saved_info["covered"]
+    
+    def _schedule_background(self, key: str, job: str):
+        """Run merge_segments, compact or build_ann_index for a key in a background thread (one pending run per job and key)"""
+        with self._key_locks_guard:
+            if (key, job) in self._pending_jobs:
+                return
+            self._pending_jobs.add((key, job))
+        
+        def _run():
+            try:
+                getattr(self, job)(key)
+            except Exception as e:
+                logger.error(f"Background {job} failed for {key}: {e}")
+            finally:
+                with self._key_locks_guard:
+                    self._pending_jobs.discard((key, job))
+        
+        threading.Thread(target=_run, name=f"vector-{job}-{key}", daemon=True).start()
+    
+    def _save_index(self, namespace: str, index: faiss.Index, document_type: str = None) -> Tuple[str, str]:
+        """Save an index to disk (its chunks live in the chunk store); returns the index and chunk store paths"""
+        if self.is_consolidated:
+            index_path, docmap_path = self._get_consolidated_paths(namespace)
+        else:
+            # Use document_type if provided, otherwise fall back to namespace detection
+            category = document_type if document_type else self._get_category_from_namespace(namespace)
+            index_path = self._get_index_path(namespace, category)
+            docmap_path = self._get_docmap_path(namespace, category)
+        
+        self._write_index_file(namespace, index, index_path)
+        return index_path, docmap_path
+    
+    def _write_index_file(self, namespace: str, index: faiss.Index, index_path: str):
+        """Write an index file, replacing it atomically"""
         try:
             # Ensure directory exists before saving
             os.makedirs(os.path.dirname(index_path), exist_ok=True)
-            os.makedirs(os.path.dirname(docmap_path), exist_ok=True)
             
-            faiss.write_index(index, index_path)
-            with open(docmap_path, 'wb') as f:
-                pickle.dump(document_map, f)
+            faiss.write_index(index, f"{index_path}.tmp")
+            os.replace(f"{index_path}.tmp", index_path)
         except Exception as e:
             logger.error(f"Error saving index for namespace {namespace}: {e}")
             raise VectorStoreError(
@@ -228,37 +974,18 @@ class FAISSVectorStoreService(VectorStoreService):
             texts = [doc.page_content for doc in documents]
             embeddings = await embedding_service.generate_embeddings(texts)
             
-            # Load existing or create new index
-            if namespace in self._indices:
-                index = self._indices[namespace]
-                doc_map = self._document_maps[namespace]
-            else:
-                index, doc_map = self._load_index(namespace)
-                if index is None:
-                    # Create new index
-                    dimension = embedding_service.get_dimension()
-                    index = faiss.IndexFlatL2(dimension)
-                    doc_map = []
-                
-                self._indices[namespace] = index
-                self._document_maps[namespace] = doc_map
-            
-            # Add embeddings to index
-            index.add(embeddings)
-            
-            # Add documents to document map
-            for doc in documents:
-                doc_entry = {
+            entries = [
+                {
                     "content": doc.page_content,
                     "metadata": doc.metadata
                 }
-                doc_map.append(doc_entry)
+                for doc in documents
+            ]
             
-            # Save to disk with document type for correct categorization
-            self._save_index(namespace, index, doc_map, document_type)
+            added = self.add_vectors(namespace, embeddings, entries, document_type)
             
-            logger.info(f"Added {len(documents)} documents to namespace: {namespace}")
-            return len(documents)
+            logger.info(f"Added {added} documents to namespace: {namespace}")
+            return added
             
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}")
@@ -267,6 +994,259 @@ class FAISSVectorStoreService(VectorStoreService):
                 details=str(e)
             )
     
+    def add_vectors(
+        self,
+        namespace: str,
+        vectors: np.ndarray,
+        entries: List[Dict[str, Any]],
+        document_type: str = None
+    ) -> int:
+        """
+        Add precomputed vectors and their chunk entries for a document namespace
+        
+        The first batch for an index is written as its base files; later batches
+        are appended as delta segments and merged into the base in the background.
+        
+        Args:
+            namespace: Document namespace the chunks belong to
+            vectors: Array of shape (n, dimension)
+            entries: One {"content", "metadata"} entry per vector
+            document_type: Optional document type (financial, long_form, generic)
+            
+        Returns:
+            Number of vectors added
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        key = self._get_storage_key(namespace, document_type)
+        
+        with self._get_key_lock(key):
+            index, chunk_store = self._get_writable_index(key, vectors.shape[1], document_type)
+            index_path, docmap_path = self._get_index_files(key, document_type)
+            has_base = os.path.exists(index_path)
+            
+            if self.is_consolidated:
+                # Key each vector to its document namespace and chunk position
+                next_id = self._next_ids.get(key, 0)
+                vector_ids = np.arange(next_id, next_id + len(entries), dtype=np.int64)
+                catalog_entry = self.catalog.get(key) or {}
+                first_chunk = catalog_entry.get("documents", {}).get(namespace, 0)
+                entries = [
+                    {**entry, "namespace": namespace, "chunk_index": first_chunk + offset}
+                    for offset, entry in enumerate(entries)
+                ]
+            else:
+                # Per-namespace indices are keyed by position
+                vector_ids = np.arange(index.ntotal, index.ntotal + len(entries), dtype=np.int64)
+            
+            # Persist the batch before touching memory so a failed write leaves the index unchanged
+            segment_log = SegmentLog.for_index(index_path)
+            if has_base:
+                segment_log.append(
+                    vectors, entries, start=index.ntotal,
+                    ids=vector_ids if self.is_consolidated else None
+                )
+            chunk_store.put_many(vector_ids.tolist(), entries)
+            
+            if self.is_consolidated:
+                index.add_with_ids(vectors, vector_ids)
+                self._next_ids[key] = next_id + len(entries)
+            else:
+                index.add(vectors)
+            
+            if not has_base:
+                # First batch: the base index is only as large as the batch
+                index_path, docmap_path = self._save_index(key, index, document_type)
+            
+            self._register_in_catalog(key, namespace, index, document_type, index_path, docmap_path, len(entries))
+            
+            ann_entry = self._ann.get(key)
+            if ann_entry is not None:
+                self._catch_up_ann(index, *ann_entry)
+            self._update_memory(key)
+        
+        self._enforce_memory_budget(keep=key)
+        self._maybe_schedule_ann_build(key, index)
+        if has_base and self.segment_merge_threshold > 0 and len(segment_log) >= self.segment_merge_threshold:
+            self._schedule_background(key, "merge_segments")
+        # Cached answers may now miss the new document
+        invalidate_user_responses(self._get_user_id_from_namespace(namespace))
+        return len(entries)
+    
+    def _register_in_catalog(
+        self,
+        key: str,
+        namespace: str,
+        index: faiss.Index,
+        document_type: Optional[str],
+        index_path: str,
+        docmap_path: str,
+        added: int
+    ):
+        """Record a write in the namespace catalog"""
+        category = document_type or self._get_category_from_namespace(key)
+        if category not in self.CATEGORY_DIRECTORIES:
+            category = 'generic'
+        
+        extra = {}
+        if self.is_consolidated:
+            existing = self.catalog.get(key)
+            documents = dict(existing.get("documents", {})) if existing else {}
+            documents[namespace] = documents.get(namespace, 0) + added
+            extra["documents"] = documents
+        
+        self.catalog.register(
+            key,
+            user_id=self._get_user_id_from_namespace(key),
+            category=category,
+            vector_count=index.ntotal,
+            index_path=index_path,
+            docmap_path=docmap_path,
+            **extra
+        )
+    
+    def _get_storage_keys_for_namespace(self, namespace: str) -> List[str]:
+        """Find which indices hold a document namespace's vectors"""
+        if not self.is_consolidated:
+            return [namespace] if namespace in self.catalog else []
+        user_id = self._get_user_id_from_namespace(namespace)
+        return [
+            entry["namespace"] for entry in self.catalog.get_user_entries(user_id)
+            if namespace in entry.get("documents", {})
+        ]
+    
+    def delete_namespace(self, namespace: str) -> int:
+        """
+        Remove a document namespace's vectors from the store
+        
+        Per-namespace files (legacy layout) are removed outright. In consolidated
+        indices the vectors are tombstoned, which hides them from searches
+        immediately; the index is compacted in the background once the share of
+        tombstoned vectors passes VECTOR_COMPACTION_TOMBSTONE_RATIO.
+        
+        Args:
+            namespace: Document namespace to delete
+            
+        Returns:
+            Number of vectors removed
+            
+        Raises:
+            VectorStoreError: If deletion fails
+        """
+        removed = 0
+        try:
+            for key in self._get_storage_keys_for_namespace(namespace):
+                if not self.is_consolidated:
+                    entry = self.catalog.get(key)
+                    removed += entry.get("vector_count", 0)
+                    with self._get_key_lock(key, base_writes=True), self._get_key_lock(key):
+                        self._remove_index_files(key, entry["index_path"], self._unload(key))
+                        self.catalog.remove(key)
+                    continue
+                
+                with self._get_key_lock(key):
+                    index, chunk_store = self._get_loaded_index(key)
+                    if index is None:
+                        self.catalog.remove(key)
+                        continue
+                    
+                    tombstones = self._get_tombstones(key)
+                    removed += tombstones.add(chunk_store.ids(namespaces=[namespace]))
+                    live_count = index.ntotal - len(tombstones)
+                    
+                    entry = self.catalog.get(key) or {}
+                    documents = {ns: n for ns, n in entry.get("documents", {}).items() if ns != namespace}
+                    index_path, docmap_path = self._get_index_files(key)
+                    self.catalog.register(
+                        key,
+                        user_id=entry.get("user_id"),
+                        category=entry.get("category", 'generic'),
+                        vector_count=live_count,
+                        index_path=index_path,
+                        docmap_path=docmap_path,
+                        documents=documents
+                    )
+                
+                if index.ntotal and len(tombstones) / index.ntotal >= self.compaction_tombstone_ratio:
+                    self._schedule_background(key, "compact")
+            
+            invalidate_user_responses(self._get_user_id_from_namespace(namespace))
+            logger.info(f"Deleted {removed} vectors for namespace: {namespace}")
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error deleting namespace {namespace}: {e}")
+            raise VectorStoreError(
+                f"Failed to delete vectors for namespace {namespace}",
+                details=str(e)
+            )
+    
+    def _remove_index_files(self, key: str, index_path: str, chunk_store: Optional[ChunkStore] = None):
+        """Delete a key's base index, chunk store, segments and ANN index (callers hold its locks and unloaded it)"""
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        if chunk_store is not None:
+            # Searches still holding the unloaded store read nothing instead of reopening the file
+            chunk_store.remove()
+        ChunkStore.remove_for_index(index_path)
+        SegmentLog.for_index(index_path).clear()
+        self._drop_ann(key)
+    
+    def delete_document_vectors(self, vector_namespace: str) -> int:
+        """
+        Remove a document's vectors, whichever category-prefixed namespace they were stored under
+        
+        Args:
+            vector_namespace: Document.vector_namespace of the deleted document
+            
+        Returns:
+            Number of vectors removed
+        """
+        return sum(self.delete_namespace(ns) for ns in self._get_namespace_variants(vector_namespace))
+    
+    def delete_user_vectors(self, user_id: int) -> int:
+        """
+        Remove every index belonging to a user (files, segments, tombstones and memory)
+        
+        Args:
+            user_id: ID of the deleted user
+            
+        Returns:
+            Number of vectors removed
+            
+        Raises:
+            VectorStoreError: If deletion fails
+        """
+        removed = 0
+        try:
+            for entry in self.catalog.get_user_entries(user_id):
+                key = entry["namespace"]
+                with self._get_key_lock(key, base_writes=True), self._get_key_lock(key):
+                    self._remove_index_files(key, entry["index_path"], self._unload(key))
+                    self._get_tombstones(key).clear()
+                    self._tombstones.pop(key, None)
+                    self.catalog.remove(key)
+                removed += entry.get("vector_count", 0)
+            
+            invalidate_user_responses(user_id)
+            logger.info(f"Deleted {removed} vectors for user {user_id}")
+            return removed
+            
+        except Exception as e:
+            logger.error(f"Error deleting vectors for user {user_id}: {e}")
+            raise VectorStoreError(
+                f"Failed to delete vectors for user {user_id}",
+                details=str(e)
+            )
+    
+    def has_namespace(self, namespace: str, document_type: str = None) -> bool:
+        """Check whether a document namespace already has vectors in the active layout"""
+        if self.is_consolidated:
+            key = self._get_storage_key(namespace, document_type)
+            entry = self.catalog.get(key)
+            return bool(entry and entry.get("documents", {}).get(namespace))
+        entry = self.catalog.get(namespace)
+        return bool(entry and entry.get("vector_count"))
+    
     def _calculate_score(self, distance: float) -> float:
         """Convert L2 distance to similarity score (more permissive)"""
         # For L2 distance, smaller is better, so we use inverse relationship
@@ -275,43 +1255,100 @@ class FAISSVectorStoreService(VectorStoreService):
     
     async def _search_namespace(
         self,
-        query: str,
+        query_vector: np.ndarray,
         namespace: str,
-        embedding_service: EmbeddingService,
         top_k: int = 20,
-        metadata_filter: dict = None
+        metadata_filter: dict = None,
+        document_namespaces: Optional[set] = None,
+        lexical_terms: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
-        """Search a single namespace for similar chunks"""
+        """
+        Search a single index for similar chunks using a precomputed query vector
+        
+        For consolidated user indices, document_namespaces restricts the search to
+        the vectors of those documents. Document and metadata filters are resolved
+        to an allow-list of vector IDs in the chunk store and applied inside the
+        FAISS search, so filtered searches still return the nearest matching chunks.
+        
+        With lexical_terms, the chunk store's BM25 index is searched under the same
+        filters too, for at most top_k hits. Lexical hits are returned with a
+        "lexical_score" (and their vector score) even when the vector search missed
+        them; below the vector score threshold only the strong ones (at least
+        LEXICAL_KEEP_RATIO of the best BM25 score) are kept. The rankings are fused
+        across namespaces by search_similar_chunks.
+        """
         try:
+            index, chunk_store = self._get_loaded_index(namespace)
+            if index is None:
+                logger.warning(f"No index found for namespace: {namespace}")
+                # Files were removed behind the catalog's back; forget the namespace
+                self.catalog.remove(namespace)
+                return []
             
-            # Generate query embedding
-            query_embedding = await embedding_service.generate_embedding(query)
+            if index.ntotal == 0:
+                return []
             
-            # Load index if not in memory
-            if namespace not in self._indices:
-                index, doc_map = self._load_index(namespace)
-                if index is None:
-                    logger.warning(f"No index found for namespace: {namespace}")
+            # Search index (restricted to the requested documents and metadata, never tombstoned vectors)
+            tombstones = self._get_tombstones(namespace)
+            live_count = index.ntotal - len(tombstones)
+            k = min(top_k * 2, live_count)
+            if k <= 0:
+                return []
+            selector = None
+            allowed_count = live_count
+            restrict_documents = document_namespaces is not None and self.is_consolidated
+            allowed_namespaces = document_namespaces if restrict_documents else None
+            if restrict_documents or metadata_filter:
+                vector_ids = np.array(
+                    [vid for vid in chunk_store.ids(
+                        namespaces=allowed_namespaces,
+                        metadata_filter=metadata_filter
+                    ) if vid not in tombstones],
+                    dtype=np.int64
+                )
+                if len(vector_ids) == 0:
                     return []
-                self._indices[namespace] = index
-                self._document_maps[namespace] = doc_map
+                selector = faiss.IDSelectorBatch(vector_ids)
+                allowed_count = len(vector_ids)
+                k = min(k, allowed_count)
+            elif tombstones:
+                deleted = faiss.IDSelectorBatch(np.array(sorted(tombstones.ids), dtype=np.int64))
+                selector = faiss.IDSelectorNot(deleted)
             
-            index = self._indices[namespace]
-            doc_map = self._document_maps[namespace]
+            if self.index_policy.prefers_exact_search(allowed_count, live_count):
+                # Selective filter: scoring just the allowed vectors is cheaper and exact
+                search_index, mode = index, VECTOR_INDEX_MODE_FLAT
+            else:
+                search_index, mode = self._get_search_index(namespace, index)
+            search_params = self.index_policy.search_params(mode, selector)
+            D, I = search_index.search(query_vector, k, params=search_params)
+            distances = {int(idx): float(dist) for dist, idx in zip(D[0], I[0]) if idx >= 0}
             
-            # Search index
-            D, I = index.search(
-                np.array([query_embedding]), 
-                min(top_k * 2, index.ntotal)
-            )
+            # Exact-token hits from the BM25 index, under the same filters
+            lexical_scores = {}
+            if lexical_terms:
+                lexical_hits = [
+                    (vid, score) for vid, score in chunk_store.lexical_search(
+                        lexical_terms, top_k + len(tombstones),
+                        namespaces=allowed_namespaces, metadata_filter=metadata_filter
+                    ) if vid not in tombstones
+                ]
+                lexical_scores = dict(lexical_hits[:top_k])
+                for vid in lexical_scores:
+                    if vid not in distances:
+                        distances[vid] = self._vector_distance(index, query_vector, vid)
+            
+            # Read only the rows of the hits
+            hits = chunk_store.get_many(distances)
+            lexical_floor = max(lexical_scores.values()) * self.LEXICAL_KEEP_RATIO if lexical_scores else float("inf")
             
             # Get results
             results = []
-            for i, (dist, idx) in enumerate(zip(D[0], I[0])):
-                if idx < 0 or idx >= len(doc_map):
+            for idx, dist in distances.items():
+                entry = hits.get(idx)
+                if entry is None:
                     continue
                 
-                entry = doc_map[idx]
                 content = entry.get("content", "")
                 metadata = entry.get("metadata", {})
                 
@@ -319,32 +1356,34 @@ class FAISSVectorStoreService(VectorStoreService):
                 score = self._calculate_score(dist)
                 
                 # Skip low-quality results - use higher threshold for more relevant results
-                if score < 0.2:  # Increased from 0.05 for better relevance filtering
+                # (strong exact-token matches are kept whatever their vector score)
+                if score < 0.2 and lexical_scores.get(idx, 0.0) < lexical_floor:  # Increased from 0.05 for better relevance filtering
                     continue
                 
-                # Apply metadata filter if provided
-                if metadata_filter:
-                    if not all(metadata.get(k) == v for k, v in metadata_filter.items()):
-                        continue
-                
                 # Ensure we have content
                 if not content:
                     continue
                 
                 # Add result
-                results.append({
+                result = {
                     "content": content,
                     "metadata": metadata,
                     "score": score,
-                    "namespace": namespace
-                })
+                    "vector_score": score,
+                    "namespace": entry.get("namespace", namespace)
+                }
+                if idx in lexical_scores:
+                    result["lexical_score"] = lexical_scores[idx]
+                results.append(result)
                 
             
             # Sort by score
-            results.sort(key=lambda x: x["score"], reverse=True)
+            results.sort(key=lambda x: (x["score"], x.get("lexical_score", 0.0)), reverse=True)
             
-            # Take top_k results
-            return results[:top_k]
+            # Take top_k results (plus the capped lexical hits the vector search ranked lower)
+            top = results[:top_k]
+            top.extend(r for r in results[top_k:] if "lexical_score" in r)
+            return top
             
         except Exception as e:
             logger.error(f"Error searching namespace {namespace}: {e}")
@@ -353,6 +1392,36 @@ class FAISSVectorStoreService(VectorStoreService):
                 details=str(e)
             )
     
+    def _vector_distance(self, index: faiss.Index, query_vector: np.ndarray, vector_id: int) -> float:
+        """Squared L2 distance between the query and one stored vector (for hits found lexically)"""
+        try:
+            vector = index.reconstruct(int(vector_id))
+        except RuntimeError:
+            return float("inf")
+        return float(np.sum((query_vector[0] - vector) ** 2))
+    
+    def _fuse_rankings(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Reciprocal-rank fusion of the similarity and BM25 rankings of merged search results
+        
+        Each result gets a "fused_score" scaled to [0, 1] (1.0 = ranked first by
+        every ranking), which search results are ordered by. "score" stays the
+        similarity (with any financial entity boost) that downstream thresholds
+        expect; "vector_score" and "lexical_score" keep the raw inputs.
+        """
+        rankings = [sorted(range(len(results)), key=lambda i: results[i]["score"], reverse=True)]
+        lexical_ranking = sorted(
+            (i for i, result in enumerate(results) if "lexical_score" in result),
+            key=lambda i: results[i]["lexical_score"], reverse=True
+        )
+        if lexical_ranking:
+            rankings.append(lexical_ranking)
+        fused = reciprocal_rank_fusion(rankings)
+        best = len(rankings) / (RRF_K + 1)
+        for i, result in enumerate(results):
+            result["fused_score"] = fused[i] / best
+        return results
+    
     def _is_financial_query(self, query: str) -> bool:
         """Check if query is financial-related"""
         query_lower = query.lower()
@@ -415,53 +1484,39 @@ class FAISSVectorStoreService(VectorStoreService):
         """Filter and boost financial results based on extracted entities"""
         filtered_results = []
         
+        # Entity tokens are computed once per query; each result is tokenized once and
+        # matched by set lookups instead of per-word substring scans
+        merchant = financial_entities.get('merchant')
+        merchant_tokens = {t for t in tokenize(merchant) if len(t) >= 3} if merchant else set()
+        location = financial_entities.get('location')
+        if location:
+            location_phrase = f" {' '.join(tokenize(location))} "
+            # Other places whose mention suggests the chunk is about a different trip
+            other_locations = [
+                place for place in COMMON_LOCATIONS
+                if place != location and place not in location
+            ]
+        
         for result in results:
             content = result.get('content', '').lower()
             metadata = result.get('metadata', {})
             score = result.get('score', 0)
+            content_tokens = tokenize(content)
+            content_token_set = set(content_tokens)
+            content_phrase = f" {' '.join(content_tokens)} "
             
             # Check for entity matches
             entity_matches = 0
             
             # Check merchant/payee match
-            if 'merchant' in financial_entities:
-                merchant = financial_entities['merchant']
+            if merchant:
                 # Direct exact match
                 if merchant in content or (metadata.get('payee') and merchant in metadata.get('payee', '').lower()):
                     entity_matches += 3  # High weight for merchant matches
-                # More flexible matching for locations and airline codes
-                elif len(merchant) > 3:
-                    try:
-                        # Use word boundaries to avoid partial matches that cause confusion
-                        pattern = r'\b' + re.escape(merchant) + r'\b'
-                        if re.search(pattern, content, re.IGNORECASE):
-                            entity_matches += 3  # High weight for exact word matches
-                        else:
-                            # Special handling for airline codes and city combinations
-                            # e.g., "thy istanbul" should match "unifree ist" and "istanbul"
-                            merchant_words = merchant.split()
-                            content_lower = content.lower()
-                            
-                            # Check if any word in merchant appears in content
-                            word_matches = 0
-                            for word in merchant_words:
-                                if len(word) >= 3:  # Only check meaningful words
-                                    if word in content_lower:
-                                        word_matches += 1
-                                    # Also check for partial matches (e.g., "ist" in "unifree ist")
-                                    elif len(word) >= 4:
-                                        for content_word in content_lower.split():
-                                            if word in content_word or content_word in word:
-                                                word_matches += 1
-                                                break
-                            
-                            # If at least one significant word matches, consider it a match
-                            if word_matches > 0:
-                                entity_matches += 2  # Medium weight for partial matches
-                    except Exception:
-                        # Fallback to simple string matching if regex fails
-                        if merchant in content:
-                            entity_matches += 2
+                # Word-level matching for locations and airline codes,
+                # e.g. "thy istanbul" should match "unifree ist" and "istanbul"
+                elif len(merchant) > 3 and self._tokens_overlap(merchant_tokens, content_token_set):
+                    entity_matches += 2  # Medium weight for partial matches
             
             # Check payment method match  
             if 'payment_method' in financial_entities:
@@ -470,51 +1525,19 @@ class FAISSVectorStoreService(VectorStoreService):
                     entity_matches += 2  # Medium weight for payment method
             
             # Check location match - ensure location-specific queries are precise
-            if 'location' in financial_entities:
-                location = financial_entities['location']
-                try:
-                    # Use word boundaries for location matching to avoid confusion
-                    pattern = r'\b' + re.escape(location) + r'\b'
-                    if re.search(pattern, content, re.IGNORECASE):
-                        entity_matches += 3  # High weight for location matches
-                    elif location in content or (metadata.get('location') and location in metadata.get('location', '').lower()):
-                        entity_matches += 2  # Medium weight for partial location matches
-                except Exception:
-                    # Fallback to simple string matching if regex fails
-                    if location in content:
-                        entity_matches += 2
-            
-            # Apply negative filtering for location-specific queries (smarter location matching)
-            if 'location' in financial_entities:
-                query_location = financial_entities['location'].lower()
-                # List of common travel/location keywords to check for conflicts
-                common_locations = ['rome', 'istanbul', 'paris', 'london', 'berlin', 'madrid', 'barcelona', 'amsterdam', 'vienna', 'prague', 'budapest', 'warsaw', 'stockholm', 'oslo', 'copenhagen', 'helsinki', 'dublin', 'lisbon', 'athens', 'moscow', 'tokyo', 'bangkok', 'singapore', 'hong kong', 'sydney', 'melbourne', 'new york', 'los angeles', 'chicago', 'miami', 'toronto', 'vancouver']
+            if location:
+                # Whole-word match avoids confusion with partial matches
+                if location_phrase in content_phrase:
+                    entity_matches += 3  # High weight for location matches
+                elif location in content or (metadata.get('location') and location in metadata.get('location', '').lower()):
+                    entity_matches += 2  # Medium weight for partial location matches
                 
-                # Check if content mentions other locations
-                content_lower = content.lower()
-                
-                # Smart location matching: check if query location contains any of the common locations
-                query_location_words = query_location.split()
-                query_contains_location = any(word in common_locations for word in query_location_words)
-                
-                other_locations_found = 0
-                for location in common_locations:
-                    # Only penalize if:
-                    # 1. The location is not the same as query location
-                    # 2. The location is not part of the query location (e.g., "istanbul" in "thy istanbul")
-                    # 3. The location appears in the content
-                    if (location != query_location and 
-                        location not in query_location and 
-                        location in content_lower):
-                        # Check if it's a word boundary match to avoid false positives
-                        try:
-                            pattern = r'\b' + re.escape(location) + r'\b'
-                            if re.search(pattern, content_lower):
-                                other_locations_found += 1
-                                entity_matches -= 2  # Heavier penalty for each other location mentioned
-                        except Exception:
-                            # If regex fails, skip this location
-                            continue
+                # Apply negative filtering for location-specific queries: penalize
+                # each other location the content mentions as a whole word
+                other_locations_found = sum(
+                    1 for place in other_locations if f" {place} " in content_phrase
+                )
+                entity_matches -= 2 * other_locations_found
                 
                 # If content mentions multiple other locations, it's likely not relevant
                 if other_locations_found >= 2:
@@ -528,8 +1551,7 @@ class FAISSVectorStoreService(VectorStoreService):
             # Only include results with entity matches for financial queries
             if entity_matches > 0 or not financial_entities:
                 # For financial queries, extract and clean the specific transaction data
-                if 'merchant' in financial_entities:
-                    merchant = financial_entities['merchant']
+                if merchant:
                     cleaned_content = self._extract_specific_transaction(result.get('content', ''), merchant)
                     if cleaned_content != result.get('content', ''):
                         result['content'] = cleaned_content
@@ -538,26 +1560,30 @@ class FAISSVectorStoreService(VectorStoreService):
         
         return filtered_results
     
+    @staticmethod
+    def _tokens_overlap(query_tokens: set, content_tokens: set) -> bool:
+        """Whether any query token appears in the content, whole or as a prefix ("ist" / "istanbul")"""
+        if query_tokens & content_tokens:
+            return True
+        return any(
+            len(q) >= 4 and len(c) >= 3 and (q.startswith(c) or c.startswith(q))
+            for q in query_tokens for c in content_tokens
+        )
+    
     def _extract_specific_transaction(self, content: str, merchant: str) -> str:
         """Extract only the specific transaction line for the merchant"""
-        lines = content.split('\n')
+        merchant_lower = merchant.lower()
+        merchant_tokens = {t for t in tokenize(merchant_lower) if len(t) >= 3}
         specific_lines = []
         
-        for line in lines:
+        for line in content.split('\n'):
             line_lower = line.lower()
-            merchant_lower = merchant.lower()
             
-            # Direct match
-            if merchant_lower in line_lower:
+            # Direct match, or a word match for locations (e.g. "istanbul" matches "thy istanbul")
+            if merchant_lower in line_lower or (
+                len(merchant_lower) > 3 and self._tokens_overlap(merchant_tokens, set(tokenize(line_lower)))
+            ):
                 specific_lines.append(line.strip())
-            # Partial match for locations (e.g., "istanbul" matches "thy istanbul")
-            elif len(merchant_lower) > 3:
-                # Check if merchant is contained in any word or vice versa
-                line_words = line_lower.split()
-                for word in line_words:
-                    if merchant_lower in word or word in merchant_lower:
-                        specific_lines.append(line.strip())
-                        break
         
         # If we found specific lines, return them
         if specific_lines:
@@ -566,6 +1592,33 @@ class FAISSVectorStoreService(VectorStoreService):
         # Otherwise return original content
         return content
 
+    def _get_document_namespaces(self, document_id: int) -> Optional[set]:
+        """
+        Resolve the namespaces a document's chunks are stored under
+        
+        Processors store chunks under '{document_type}_{vector_namespace}', so both
+        the bare and the category-prefixed forms are accepted. Returns None if the
+        document does not exist (no filtering is applied).
+        """
+        engine = create_engine(settings.DATABASE_URL)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = SessionLocal()
+        try:
+            document = db.query(DBDocument).filter(DBDocument.id == document_id).first()
+            if not document:
+                return None
+            vector_namespace = document.vector_namespace
+        finally:
+            db.close()
+        
+        return self._get_namespace_variants(vector_namespace)
+    
+    def _get_namespace_variants(self, vector_namespace: str) -> set:
+        """The bare and every category-prefixed form of a document's vector namespace"""
+        return {vector_namespace} | {
+            f"{category}_{vector_namespace}" for category in self.CATEGORY_DIRECTORIES
+        }
+    
     async def search_similar_chunks(
         self,
         query: str,
@@ -573,7 +1626,8 @@ class FAISSVectorStoreService(VectorStoreService):
         user_id: int = None,
         document_id: Optional[int] = None,
         top_k: int = 20,
-        metadata_filter: dict = None
+        metadata_filter: dict = None,
+        query_context: Optional[QueryContext] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for similar chunks across namespaces with financial query optimization
@@ -585,6 +1639,7 @@ class FAISSVectorStoreService(VectorStoreService):
             document_id: Optional document ID to filter by
             top_k: Number of results to return
             metadata_filter: Optional metadata filter
+            query_context: Optional per-request context holding the query embedding
             
         Returns:
             List of similar chunks
@@ -597,32 +1652,11 @@ class FAISSVectorStoreService(VectorStoreService):
             is_financial = self._is_financial_query(query)
             financial_entities = self._extract_financial_entities(query) if is_financial else {}
             
-            # Get all namespaces from both root and category directories
-            namespaces = []
-            
-            # Search in root directory (for backward compatibility)
-            if os.path.exists(self.storage_path):
-                for filename in os.listdir(self.storage_path):
-                    if filename.endswith(".index"):
-                        namespace = filename[:-6]  # Remove .index extension
-                        
-                        # Filter by user_id if provided
-                        if user_id is not None and f"user_{user_id}_" not in namespace:
-                            continue
-                        namespaces.append(namespace)
-            
-            # Search in category subdirectories
-            for category in self.CATEGORY_DIRECTORIES.values():
-                category_path = os.path.join(self.storage_path, category)
-                if os.path.exists(category_path):
-                    for filename in os.listdir(category_path):
-                        if filename.endswith(".index"):
-                            namespace = filename[:-6]  # Remove .index extension
-                            
-                            # Filter by user_id if provided
-                            if user_id is not None and f"user_{user_id}_" not in namespace:
-                                continue
-                            namespaces.append(namespace)
+            # Restrict to a single document's namespace if requested
+            document_namespaces = self._get_document_namespaces(document_id) if document_id is not None else None
+            
+            # Resolve the user's indices from the catalog (no directory scan)
+            namespaces = self.catalog.get_user_namespaces(user_id)
             
             # Prioritize financial namespaces for financial queries
             if is_financial:
@@ -631,29 +1665,29 @@ class FAISSVectorStoreService(VectorStoreService):
                 namespaces = financial_namespaces + other_namespaces
             
             # Filter by document_id if provided (applies to all namespaces)
-            if document_id is not None:
-                engine = create_engine(settings.DATABASE_URL)
-                SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-                db = SessionLocal()
-                try:
-                    document = db.query(DBDocument).filter(DBDocument.id == document_id).first()
-                    if document:
-                        # Only keep the namespace that matches this document
-                        namespaces = [ns for ns in namespaces if ns == document.vector_namespace]
-                finally:
-                    db.close()
-            
+            if document_namespaces is not None and not self.is_consolidated:
+                # Only keep the namespace that matches this document
+                namespaces = [ns for ns in namespaces if ns in document_namespaces]
             
             if not namespaces:
                 logger.warning(f"No namespaces found for user_id: {user_id}, document_id: {document_id}")
                 return []
             
-            # Search each namespace
+            # Embed the query once and reuse the vector for every namespace
+            if query_context is None:
+                query_context = QueryContext(query, embedding_service)
+            query_embedding = await query_context.get_embedding(query)
+            query_vector = np.array([query_embedding], dtype=np.float32)
+            
+            # Search each namespace (vectors and BM25 index)
             all_results = []
+            terms = query_terms(query)
             
             for namespace in namespaces:
                 namespace_results = await self._search_namespace(
-                    query, namespace, embedding_service, top_k, metadata_filter
+                    query_vector, namespace, top_k, metadata_filter,
+                    document_namespaces if self.is_consolidated else None,
+                    lexical_terms=terms
                 )
                 all_results.extend(namespace_results)
             
@@ -661,8 +1695,9 @@ class FAISSVectorStoreService(VectorStoreService):
             if is_financial and financial_entities:
                 all_results = self._filter_financial_results(all_results, financial_entities)
             
-            # Sort all results by score
-            all_results.sort(key=lambda x: x["score"], reverse=True)
+            # Fuse the (boosted) similarity and lexical rankings, and order by the fused score
+            all_results = self._fuse_rankings(all_results)
+            all_results.sort(key=lambda x: x["fused_score"], reverse=True)
             
             # Take top results
             return all_results[:top_k]
@@ -691,12 +1726,13 @@ def get_vector_store_service() -> FAISSVectorStoreService:
 
 # Convenience functions for backward compatibility
 async def search_similar_chunks(query: str, user_id: int, document_id: Optional[int] = None, 
-                               top_k: int = 10, metadata_filter: dict = None) -> List[Dict[str, Any]]:
+                               top_k: int = 10, metadata_filter: dict = None,
+                               query_context: Optional[QueryContext] = None) -> List[Dict[str, Any]]:
     """Convenience function for searching similar chunks"""
     from app.services.embedding_service import get_embedding_service
     
     service = get_vector_store_service()
-    embedding_service = get_embedding_service()
+    embedding_service = query_context.embedding_service if query_context else get_embedding_service()
     
     return await service.search_similar_chunks(
         query=query,
@@ -704,7 +1740,8 @@ async def search_similar_chunks(query: str, user_id: int, document_id: Optional[
         user_id=user_id,
         document_id=document_id,
         top_k=top_k,
-        metadata_filter=metadata_filter
+        metadata_filter=metadata_filter,
+        query_context=query_context
     )
 
 
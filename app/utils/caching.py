@@ -5,13 +5,21 @@ Provides in-memory caching for frequently accessed data to improve performance.
 Uses TTL-based caching with automatic cleanup.
 """
 
+import re
+import sys
+import time
 import logging
 import json
 import hashlib
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List, Sequence, Set, Tuple
 from functools import wraps
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
 
 logger = logging.getLogger("personal_ai_agent")
 
@@ -144,11 +152,201 @@ class TTLCache:
         }
 
 
+class ResponseCache:
+    """
+    Bounded cache of generated answers.
+    
+    An answer is cached for the user who asked and the retrieved chunks it was
+    generated from. Within that scope a question hits on its normalized text or,
+    given its embedding, on an earlier question that is near-identical in meaning
+    (cosine similarity at least similarity_threshold, same numbers and amounts).
+    
+    Features:
+    - TTL-based expiration
+    - Least recently used entries evicted beyond max_entries
+    - Per-user invalidation when the user's documents or emails change
+    - Hit/miss statistics and memory use
+    """
+    
+    def __init__(self, max_entries: int = 512, ttl_seconds: int = 3600, similarity_threshold: float = 0.97):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        # (user, context key) -> entry keys, for near-duplicate lookup
+        self._scopes: Dict[Tuple, Set[Tuple]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._memory_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+    
+    @staticmethod
+    def context_key(chunk_texts: Sequence[str]) -> str:
+        """Key of the retrieved chunks an answer is generated from"""
+        digest = hashlib.sha256()
+        for text in chunk_texts:
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+    
+    @staticmethod
+    def _numeric_terms(query: str) -> frozenset:
+        """Numbers, amounts and years: questions differing in these never share an answer"""
+        return frozenset(re.findall(r"\$?\d[\d,.:/-]*", query))
+    
+    @staticmethod
+    def _unit_vector(embedding: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+    
+    def _remove(self, key: Tuple):
+        """Drop an entry (caller holds the lock)"""
+        entry = self._entries.pop(key)
+        self._memory_bytes -= entry["bytes"]
+        scope = self._scopes.get(key[:2])
+        if scope is not None:
+            scope.discard(key)
+            if not scope:
+                del self._scopes[key[:2]]
+    
+    def _live(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """The entry for key unless it has expired (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() > entry["expires_at"]:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return None
+        return entry
+    
+    def get(self, user_id: Any, query: str, context_key: str,
+            query_embedding: Optional[Sequence[float]] = None) -> Optional[str]:
+        """
+        Look up the answer to a question over the same retrieved chunks
+        
+        Args:
+            user_id: User asking
+            query: The question
+            context_key: context_key() of the retrieved chunks
+            query_embedding: Embedding of the question, for near-duplicate lookup
+            
+        Returns:
+            The cached answer, or None
+        """
+        key = (user_id, context_key, self._normalize(query))
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["exact_hits"] += 1
+                return entry["answer"]
+            
+            vector = self._unit_vector(query_embedding)
+            if vector is not None:
+                numeric_terms = self._numeric_terms(query)
+                best, best_similarity = None, self.similarity_threshold
+                for other in list(self._scopes.get(key[:2], ())):
+                    candidate = self._live(other)
+                    if candidate is None or candidate["embedding"] is None or candidate["numeric_terms"] != numeric_terms:
+                        continue
+                    similarity = float(np.dot(vector, candidate["embedding"]))
+                    if similarity >= best_similarity:
+                        best, best_similarity = other, similarity
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.stats["hits"] += 1
+                    self.stats["semantic_hits"] += 1
+                    return self._entries[best]["answer"]
+            
+            self.stats["misses"] += 1
+            return None
+    
+    def set(self, user_id: Any, query: str, context_key: str, answer: str,
+            query_embedding: Optional[Sequence[float]] = None):
+        """
+        Cache the answer to a question
+        
+        Args:
+            user_id: User who asked
+            query: The question
+            context_key: context_key() of the retrieved chunks
+            answer: The generated answer
+            query_embedding: Embedding of the question, for near-duplicate lookup
+        """
+        key = (user_id, context_key, self._normalize(query))
+        vector = self._unit_vector(query_embedding)
+        size = sys.getsizeof(answer) + sys.getsizeof(key[2]) + (vector.nbytes if vector is not None else 0)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": vector,
+                "numeric_terms": self._numeric_terms(query),
+                "expires_at": time.monotonic() + self.ttl_seconds,
+                "bytes": size
+            }
+            self._scopes[key[:2]].add(key)
+            self._memory_bytes += size
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+    
+    def invalidate_user(self, user_id: Any) -> int:
+        """Drop every answer cached for a user; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == user_id]
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+        return len(keys)
+    
+    def clear(self):
+        """Clear all cache entries"""
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self._memory_bytes = 0
+        logger.info("Response cache cleared")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups > 0 else 0,
+                "size": len(self._entries),
+                "max_size": self.max_entries,
+                "memory_bytes": self._memory_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold
+            }
+
+
 # Global cache instances for different data types
 user_cache = TTLCache(default_ttl_seconds=300, max_size=500)  # 5 minutes
 document_cache = TTLCache(default_ttl_seconds=600, max_size=200)  # 10 minutes
 query_cache = TTLCache(default_ttl_seconds=180, max_size=100)  # 3 minutes
 gmail_cache = TTLCache(default_ttl_seconds=120, max_size=50)  # 2 minutes
+response_cache = ResponseCache(
+    max_entries=settings.LLM_RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.LLM_RESPONSE_CACHE_SIMILARITY
+)
 
 
 def cache_key(*args, **kwargs) -> str:
@@ -227,13 +425,23 @@ def invalidate_user_cache(user_id: str):
         logger.info(f"Invalidated {len(keys_to_delete)} cache entries for user {user_id}")
 
 
+def invalidate_user_responses(user_id: Optional[int]):
+    """Drop cached answers for a user whose documents or emails changed"""
+    if user_id is None:
+        return
+    removed = response_cache.invalidate_user(user_id)
+    if removed:
+        logger.info(f"Invalidated {removed} cached answers for user {user_id}")
+
+
 def get_cache_stats() -> Dict[str, Any]:
     """Get statistics for all cache instances"""
     return {
         "user_cache": user_cache.get_stats(),
         "document_cache": document_cache.get_stats(),
         "query_cache": query_cache.get_stats(),
-        "gmail_cache": gmail_cache.get_stats()
+        "gmail_cache": gmail_cache.get_stats(),
+        "response_cache": response_cache.get_stats()
     }
 
 
@@ -243,6 +451,7 @@ def clear_all_caches():
     document_cache.clear()
     query_cache.clear()
     gmail_cache.clear()
+    response_cache.clear()
     logger.info("All caches cleared")
 
 
@@ -45,7 +45,8 @@ class DynamicQueryHandler:
             "expertise", "technology", "tools", "languages", "frameworks", "abilities"
         ]
     
-    async def handle_query(self, query: str, user_id: int, chunks: List[str], db: Session) -> Optional[str]:
+    async def handle_query(self, query: str, user_id: int, chunks: List[str], db: Session,
+                           query_context=None) -> Optional[str]:
         """
         Attempt to handle query dynamically by parsing document content
         Returns: answer string if handled, None if should fall back to LLM
@@ -57,7 +58,7 @@ class DynamicQueryHandler:
             
             # Check if it's a skills query
             if self._is_skills_query(query):
-                return await self._handle_skills_query(query, user_id, chunks, db)
+                return await self._handle_skills_query(query, user_id, chunks, db, query_context)
             
             # All other queries fall back to LLM processing
             return None  # Fall back to LLM processing
@@ -123,10 +124,16 @@ class DynamicQueryHandler:
             logger.error(f"Error handling expense query dynamically: {e}")
             return None
     
-    async def _handle_skills_query(self, query: str, user_id: int, chunks: List[Any], db: Session) -> Optional[str]:
+    async def _handle_skills_query(self, query: str, user_id: int, chunks: List[Any], db: Session,
+                                   query_context=None) -> Optional[str]:
         """Handle skills-related queries by creating a more targeted search"""
         try:
             from app.services.vector_store_service import search_similar_chunks
+            from app.services.embedding_service import QueryContext
+            
+            # Share the request context so the enhanced query is embedded only once
+            if query_context is None:
+                query_context = QueryContext(query)
             
             # Create a more targeted query for skills
             enhanced_query = f"programming languages Java Python testing tools Selenium automation experience technical skills competencies {query}"
@@ -135,7 +142,8 @@ class DynamicQueryHandler:
             skills_chunks = await search_similar_chunks(
                 enhanced_query, 
                 user_id=user_id, 
-                top_k=10
+                top_k=10,
+                query_context=query_context
             )
             
             # Filter chunks to get those with substantial content about skills
@@ -159,7 +167,7 @@ class DynamicQueryHandler:
                 # Create a skills-focused query
                 skills_query = "List and describe the technical skills, programming languages, tools, and technologies mentioned in the context"
                 
-                response, _ = await generate_answer(skills_query, substantial_chunks[:5])
+                response, _ = await generate_answer(skills_query, substantial_chunks[:5], user_id=user_id)
                 
                 if response and not response.startswith("I found some relevant information"):
                     logger.info(f"Dynamic skills handler providing specialized response")
@@ -4,12 +4,17 @@ import json
 import hashlib
 import time
 import re
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from enum import Enum
 
 from llama_cpp import Llama
 from app.core.config import settings
 from app.core.constants import LLM_CONTEXT_DEFAULT, LLM_MAX_TOKENS_DEFAULT
+from app.core.exceptions import InferenceQueueFullError
+from app.services.llm_scheduler import get_llm_scheduler
+from app.services.embedding_service import QueryContext
+from app.utils.caching import response_cache
 from app.services.ai_config_service import (
     get_ai_config_service, AIBehaviorMode,
     ResponseValidationLevel
@@ -23,8 +28,8 @@ logger = logging.getLogger("personal_ai_agent")
 _llm_model = None
 _current_model_path = None
 
-# Response cache for identical queries
-_response_cache = {}
+# Token counts of texts (context chunks, template prefixes) per model, least recently used first
+_token_counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
 
 # Available models
 AVAILABLE_MODELS = {
@@ -135,9 +140,8 @@ def clear_response_cache():
     """
     Clear the response cache
     """
-    global _response_cache
     logger.info("Clearing response cache")
-    _response_cache.clear()
+    response_cache.clear()
 
 def get_current_model_info():
     """
@@ -163,7 +167,7 @@ def get_current_model_info():
 
 def estimate_token_count(text: str) -> int:
     """
-    Estimate token count for text (optimized for speed and accuracy)
+    Estimate token count for text without a tokenizer (fallback when no model is loaded)
     
     Args:
         text: The text to estimate tokens for
@@ -174,101 +178,117 @@ def estimate_token_count(text: str) -> int:
     # More accurate estimation: ~1.3 tokens per word on average
     return max(1, int(len(text.split()) * 1.3))
 
-def truncate_context_to_fit(query: str, context_content: List[str], max_response_tokens: int = None) -> List[str]:
+def _tokenize(llm, text: str) -> List[int]:
+    """Tokens of text with the model's tokenizer, without BOS (as it appears inside a prompt)"""
+    return llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+
+def count_tokens(text: str, llm=None, cache: bool = True) -> int:
     """
-    Truncate context content to fit within the model's context window
+    Count the tokens of text with the loaded model's tokenizer
+    
+    Counts are cached per model and text, so a context chunk or template prefix is
+    tokenized once however many prompts it goes into.
+    
+    Args:
+        text: The text to count
+        llm: The model whose tokenizer to use (defaults to the loaded model; without one the count is estimated)
+        cache: Whether to cache the count (off for one-off text such as a whole prompt)
+        
+    Returns:
+        Token count
+    """
+    llm = llm or _llm_model
+    if llm is None:
+        return estimate_token_count(text)
+    if not cache:
+        return len(_tokenize(llm, text))
+    
+    key = (_current_model_path, hashlib.sha1(text.encode("utf-8")).digest())
+    count = _token_counts.get(key)
+    if count is None:
+        count = len(_tokenize(llm, text))
+        _token_counts[key] = count
+        while len(_token_counts) > settings.LLM_TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    else:
+        _token_counts.move_to_end(key)
+    return count
+
+def _cut_to_tokens(text: str, max_tokens: int, llm=None) -> str:
+    """Longest start of text that fits in max_tokens"""
+    llm = llm or _llm_model
+    if llm is None:
+        return " ".join(text.split()[:int(max_tokens / 1.3)])
+    tokens = _tokenize(llm, text)[:max_tokens]
+    return llm.detokenize(tokens).decode("utf-8", errors="ignore")
+
+def truncate_context_to_fit(query: str, context_content: List[str], max_response_tokens: int = None,
+                            first_person_mode: bool = False, model_name: str = None) -> List[str]:
+    """
+    Pack context content into the model's context window
+    
+    Chunks are kept in order while they fit in the tokens left after the prompt
+    template, the question and the response; the first chunk that doesn't fit is cut
+    at a token boundary to fill the rest. Counts use the loaded model's tokenizer.
     
     Args:
         query: The user's query
         context_content: List of context strings
         max_response_tokens: Maximum tokens to reserve for response
+        first_person_mode: Whether the prompt is built in first person mode
+        model_name: Model whose prompt template is used
         
     Returns:
         Truncated context content that fits within context window
     """
     if max_response_tokens is None:
         max_response_tokens = settings.LLM_MAX_TOKENS
+    prompt_budget = settings.LLM_CONTEXT_WINDOW - max_response_tokens
     
-    # Reserve tokens for system prompt, query, and response
-    base_prompt_template = """<s>[INST] You are a helpful AI assistant that answers questions based on provided context.
-
-CONTEXT INFORMATION:
-{context}
-
-USER QUESTION:
-{query}
-
-FINANCIAL TRANSACTION KNOWLEDGE:
-- THY = Turkish Airlines (Turkey/Istanbul)
-- Foreign Exchange Rate Adjustment Fees are charges for international transactions
-- Card purchases at international merchants may include location-specific spending
-- When asked about spending in a specific location, look for:
-  * Airlines from that country (e.g., THY for Turkey/Istanbul)
-  * Foreign exchange fees related to transactions
-  * Merchant names that might relate to the location
-
-EMAIL INVOICE EXTRACTION:
-- Emails marked with [EMAIL] contain invoice, receipt, or transaction information
-- Look for amounts in formats: $X.XX, USD X.XX, Total: $X, Amount: $X
-- Common invoice keywords: invoice, receipt, total, subtotal, amount due, balance
-- Company names may appear as: From: company@domain.com or in email signatures
-- Dates may be in various formats: MM/DD/YYYY, Month DD, YYYY, etc.
-- For questions like "How much was the [Company] invoice?":
-  * Find emails from or mentioning that company
-  * Extract the total amount, invoice number, and date
-  * Provide specific financial details
-
-INSTRUCTIONS FOR YOUR RESPONSE:
-- Answer the user's question based on the provided context information.
-- Be CONCISE and DIRECT - provide only the essential information needed to answer the question.
-- Focus ONLY on answering the specific question asked - do not provide extra context unless directly relevant.
-- If the question asks for a specific amount, date, or fact, provide just that information.
-- Do not include related information unless it directly answers the question.
-- If the context doesn't contain the information needed to answer the question, say so clearly.
-- Do not mention that your answer is based on the provided context.
-- Use simple, clear language and avoid unnecessary details.
-
-CRITICAL RULES:
-- Never make up information that isn't in the context.
-- Be as brief as possible while still being helpful.
-- For financial questions, provide the specific amount and date if available.
-- For invoice/receipt questions, extract: company name, amount, invoice number, and date.
-- For location-specific spending questions, identify relevant transactions by merchant codes, airline codes, or foreign exchange fees.
-- When finding invoice data in emails, present it clearly: "The [Company] invoice was $X.XX on [Date]"
-- For factual questions, provide the direct answer without elaboration.
-[/INST]"""
-    
-    # Estimate tokens for base prompt structure
-    base_tokens = estimate_token_count(base_prompt_template.format(context="", query=query))
-    
-    # Calculate available tokens for context
-    available_context_tokens = settings.LLM_CONTEXT_WINDOW - base_tokens - max_response_tokens
-    available_context_tokens = max(100, available_context_tokens)  # Ensure minimum context
+    # The prompt around the context: the template's static prefix (counted once per model), then
+    # the question and the rest of the template; +1 for BOS
+    prefix = get_prompt_prefix(model_name)
+    empty_prompt = generate_prompt(query, [], first_person_mode, model_name)
+    base_tokens = count_tokens(prefix) + count_tokens(empty_prompt[len(prefix):], cache=False) + 1
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    ellipsis_tokens = count_tokens("...")
     
+    available_context_tokens = prompt_budget - base_tokens
     logger.info(f"Context window: {settings.LLM_CONTEXT_WINDOW}, base tokens: {base_tokens}, "
                 f"response tokens: {max_response_tokens}, available for context: {available_context_tokens}")
     
-    # Truncate context to fit
+    # Pack whole chunks, then as much of the next one as fits
     truncated_content = []
     current_tokens = 0
-    
+    cut = False
     for content in context_content:
-        content_tokens = estimate_token_count(content)
+        content_tokens = count_tokens(content) + separator_tokens
         if current_tokens + content_tokens <= available_context_tokens:
             truncated_content.append(content)
             current_tokens += content_tokens
         else:
-            # Try to fit a partial chunk
-            remaining_tokens = available_context_tokens - current_tokens
+            remaining_tokens = available_context_tokens - current_tokens - separator_tokens - ellipsis_tokens
             if remaining_tokens > 50:  # Only include if we have reasonable space
-                chars_to_include = remaining_tokens * 4
-                partial_content = content[:chars_to_include] + "..."
-                truncated_content.append(partial_content)
+                truncated_content.append(_cut_to_tokens(content, remaining_tokens) + "...")
+                cut = True
             break
     
-    if len(truncated_content) < len(context_content):
+    # Chunks were counted on their own; tokens can merge differently where they join, so check the whole prompt
+    for _ in range(3):
+        if not truncated_content or _llm_model is None:
+            break
+        overflow = count_tokens(generate_prompt(query, truncated_content, first_person_mode, model_name), cache=False) + 1 - prompt_budget
+        if overflow <= 0:
+            break
+        last = truncated_content.pop()
+        keep = count_tokens(last, cache=False) - overflow - ellipsis_tokens
+        cut = keep > 0
+        if cut:
+            truncated_content.append(_cut_to_tokens(last, keep) + "...")
+    
+    if cut or len(truncated_content) < len(context_content):
         logger.warning(f"Context truncated from {len(context_content)} to {len(truncated_content)} chunks "
-                      f"to fit context window")
+                       f"(last one {'partial' if cut else 'whole'}) to fit context window")
     
     return truncated_content
 
@@ -434,6 +454,96 @@ def validate_and_clean_response(response: str, query: str, context_chunks: List[
     
     return answer
 
+# Static start of each prompt template. Only what follows it changes between requests, so the
+# model's state after evaluating it is kept and reused (see prepare_prompt_prefix).
+PHI2_PROMPT_PREFIX = """You are a helpful assistant. Answer the question using only the provided context.
+
+INSTRUCTIONS:
+- Use only information from the context below
+- Give a direct, complete answer
+- If the context doesn't contain the answer, say "I don't have that information"
+- Be specific with numbers, dates, and amounts when available
+- IMPORTANT: Look through ALL context chunks to find ALL relevant information
+- Answer ONLY what is specifically asked - do not provide additional details unless requested
+
+"""
+
+MISTRAL_PROMPT_PREFIX = """<s>[INST] Please provide a clear answer to the question below based on the context.
+
+IMPORTANT INSTRUCTIONS:
+- Look through ALL the context information provided
+- Be specific with numbers, dates, and amounts when available
+- Follow any additional instructions given after the question
+
+"""
+
+# Between context chunks in a prompt
+CONTEXT_SEPARATOR = "\n\n"
+
+# Model state after each evaluated prefix, keyed by (model path, prefix hash)
+_prefix_states: Dict[Tuple[str, str], Any] = {}
+_prefix_stats = {"reused": 0, "restored": 0, "evaluated": 0}
+
+def get_prompt_prefix(model_name: str = None) -> str:
+    """
+    Get the static prefix of the prompt template for a model
+    
+    Args:
+        model_name: Name of the model (phi-2, mistral-7b) or None for the default template
+        
+    Returns:
+        The prefix every prompt for this model starts with
+    """
+    return PHI2_PROMPT_PREFIX if model_name == "phi-2" else MISTRAL_PROMPT_PREFIX
+
+def prepare_prompt_prefix(llm, prefix: str) -> str:
+    """
+    Make sure the model's KV cache holds the evaluated prompt prefix
+    
+    llama-cpp re-evaluates only the part of a prompt after its longest common token
+    prefix with what the model evaluated last. If that already covers this prefix
+    nothing is done; otherwise the state saved after the prefix (per model and
+    template) is restored, or the prefix is evaluated once and its state saved.
+    
+    Args:
+        llm: The loaded model
+        prefix: Static prefix of the prompt about to be evaluated
+        
+    Returns:
+        How the prefix was provided: "reused", "restored", "evaluated" or "disabled"
+    """
+    if not settings.LLM_PREFIX_CACHE_ENABLED:
+        return "disabled"
+    
+    tokens = llm.tokenize(prefix.encode("utf-8"), special=True)
+    if llm.n_tokens >= len(tokens) and list(llm.input_ids[:len(tokens)]) == tokens:
+        outcome = "reused"
+    else:
+        key = (_current_model_path, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        state = _prefix_states.get(key)
+        if state is not None:
+            llm.load_state(state)
+            outcome = "restored"
+        else:
+            llm.reset()
+            llm.eval(tokens)
+            # Keep states for the loaded model only
+            for stale in [other for other in _prefix_states if other[0] != _current_model_path]:
+                del _prefix_states[stale]
+            _prefix_states[key] = llm.save_state()
+            outcome = "evaluated"
+    _prefix_stats[outcome] += 1
+    return outcome
+
+def get_prefix_cache_stats() -> Dict[str, Any]:
+    """
+    Get counters of how prompt prefixes were provided to the model
+    
+    Returns:
+        Dict with reused/restored/evaluated counts and the number of saved states
+    """
+    return {**_prefix_stats, "saved_states": len(_prefix_states)}
+
 def generate_prompt(query: str, context_chunks: List[str], first_person_mode: bool = False, model_name: str = None) -> str:
     """
     Generate a prompt for the LLM
@@ -446,18 +556,11 @@ def generate_prompt(query: str, context_chunks: List[str], first_person_mode: bo
     Returns:
         The generated prompt
     """
-    # Build the context string while keeping track of length to avoid exceeding the model context window
-    formatted_context = ""
-    max_context_chars = 2000  # Reduced from 6000 for more focused responses
-    for i, chunk in enumerate(context_chunks):
-        if len(formatted_context) >= max_context_chars:
-            logger.info("Reached maximum context size, stopping additional chunks")
-            break
-        # Truncate individual chunk if it is extremely long
-        safe_chunk = chunk[:600]  # Reduced from 2000 for more focused responses
-        formatted_context += f"{safe_chunk}\n\n"
+    # Build the context string (truncate_context_to_fit has already packed the chunks into the context window)
+    formatted_context = "".join(f"{chunk}{CONTEXT_SEPARATOR}" for chunk in context_chunks)
     
-    # Create model-specific prompts
+    # Create model-specific prompts: the template's static prefix first, so the model's
+    # state after it can be reused across requests, then the context and the question
     if model_name == "phi-2":
         # Detect if this is a vacation query and apply specific rules
         is_vacation_query = any(keyword in query.lower() for keyword in ['vacation', 'travel', 'trip', 'holiday', 'went', 'visit'])
@@ -478,22 +581,18 @@ def generate_prompt(query: str, context_chunks: List[str], first_person_mode: bo
 - If asked about payments to a specific person or merchant, only report amounts for that exact person/merchant
 - If multiple transactions to the same person/merchant exist, list each one separately with dates if available"""
 
-        # Phi-2 works better with structured but concise prompts
-        prompt = f"""You are a helpful assistant. Answer the question using only the provided context.
+        question_rules = ""
+        if vacation_rules or financial_rules:
+            question_rules = f"""
+RULES FOR THIS QUESTION:{vacation_rules}{financial_rules}
+"""
 
-CONTEXT:
+        # Phi-2 works better with structured but concise prompts
+        prompt = f"""{get_prompt_prefix(model_name)}CONTEXT:
 {formatted_context}
 
 QUESTION: {query}
-
-INSTRUCTIONS:
-- Use only information from the context above
-- Give a direct, complete answer
-- If the context doesn't contain the answer, say "I don't have that information"
-- Be specific with numbers, dates, and amounts when available
-- IMPORTANT: Look through ALL context chunks to find ALL relevant information
-- Answer ONLY what is specifically asked - do not provide additional details unless requested{vacation_rules}{financial_rules}
-
+{question_rules}
 ANSWER:"""
     else:
         # Detect if this is a financial query
@@ -521,21 +620,39 @@ ANSWER:"""
 - For financial questions asking "how much", add up all relevant amounts to give the total"""
 
         # Mistral-7B format (default) - Enhanced to handle aggregation
-        prompt = f"""<s>[INST] {query}
-
-Context:
+        prompt = f"""{get_prompt_prefix(model_name)}Context:
 {formatted_context}
 
-Please provide a clear explanation based on the context above. 
-
-IMPORTANT INSTRUCTIONS:
-- Look through ALL the context information provided
-- Be specific with numbers, dates, and amounts when available{financial_instructions}
+Question: {query}
+{financial_instructions}
 [/INST]"""
     
     return prompt
 
-def generate_response(query: str, context_chunks: List[Any], first_person_mode: bool = False, model_name: str = None) -> str:
+def _stream_completion(llm, prompt: str, on_token: Callable[[str], None], **kwargs) -> str:
+    """
+    Run a completion in llama-cpp's streaming mode, passing each piece of text on as it is produced
+    
+    Args:
+        llm: The loaded model
+        prompt: The prompt
+        on_token: Called with each new piece of text
+        **kwargs: Sampling parameters for the completion
+        
+    Returns:
+        The whole completion text
+    """
+    pieces = []
+    for chunk in llm(prompt, stream=True, **kwargs):
+        choices = chunk.get("choices", [])
+        text = choices[0].get("text", "") if choices else ""
+        if text:
+            pieces.append(text)
+            on_token(text)
+    return "".join(pieces)
+
+def generate_response(query: str, context_chunks: List[Any], first_person_mode: bool = False, model_name: str = None,
+                      on_token: Optional[Callable[[str], None]] = None) -> str:
     """
     Generate a response to a query using the local LLM
     
@@ -543,6 +660,7 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
         query: The user's query
         context_chunks: List of context chunks to use for answering
         first_person_mode: Whether to respond in first person (as if AI is the user)
+        on_token: If given, the completion is streamed and each piece of text is passed to it as it is produced
         
     Returns:
         The generated response
@@ -564,11 +682,9 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
         service = get_ai_config_service()
         ai_config = service.get_ai_config()
         
-        # Limit context for more focused responses - take only the most relevant chunks
-        limited_context = context_content[:3]  # Limit to 3 most relevant chunks maximum
-        
-        # Truncate context to fit within context window
-        truncated_context = truncate_context_to_fit(query, limited_context, ai_config.max_tokens)
+        # Load the model first: its tokenizer measures the prompt, and its file selects the template
+        requested_model = model_name
+        get_llm(requested_model)
         
         # Determine actual model name if not provided
         if model_name is None:
@@ -576,15 +692,21 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
             detected_model = model_info.get('model_name', 'unknown')
             model_name = detected_model if detected_model != 'unknown' else None
         
+        # Limit context for more focused responses - take only the most relevant chunks
+        limited_context = context_content[:3]  # Limit to 3 most relevant chunks maximum
+        
+        # Truncate context to fit within context window
+        truncated_context = truncate_context_to_fit(query, limited_context, ai_config.max_tokens, first_person_mode, model_name)
+        
         # Generate the prompt
         prompt = generate_prompt(query, truncated_context, first_person_mode, model_name)
         
-        # Log the prompt length and token estimate
-        estimated_tokens = estimate_token_count(prompt)
-        logger.info(f"Generated prompt with {len(prompt)} characters, estimated {estimated_tokens} tokens")
+        # Log the prompt length and token count (+1 for BOS)
+        prompt_tokens = count_tokens(prompt, cache=False) + 1
+        logger.info(f"Generated prompt with {len(prompt)} characters, {prompt_tokens} tokens")
         
         # Validate that prompt + response fits within context window
-        total_tokens_needed = estimated_tokens + ai_config.max_tokens
+        total_tokens_needed = prompt_tokens + ai_config.max_tokens
         if total_tokens_needed > settings.LLM_CONTEXT_WINDOW:
             logger.error(f"Total tokens needed ({total_tokens_needed}) exceeds context window ({settings.LLM_CONTEXT_WINDOW})")
             return "The question requires too much context to process. Please try a more specific question or upload fewer/shorter documents."
@@ -593,12 +715,20 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                llm = get_llm(model_name)
+                llm = get_llm(requested_model)
+                
+                # Only the context and question are evaluated when the template prefix is cached
+                try:
+                    prefix_outcome = prepare_prompt_prefix(llm, get_prompt_prefix(model_name))
+                    logger.info(f"Prompt prefix {prefix_outcome}")
+                except Exception as prefix_error:
+                    logger.warning(f"Prompt prefix cache failed, evaluating the whole prompt: {str(prefix_error)}")
+                    _prefix_states.clear()
+                    llm.reset()
                 
                 # Generate the response
                 logger.info(f"Generating response with LLM (attempt {attempt + 1}/{max_retries})")
-                raw_response = llm(
-                    prompt,
+                completion_params = dict(
                     max_tokens=ai_config.max_tokens,
                     temperature=ai_config.temperature,
                     top_p=ai_config.top_p,
@@ -607,6 +737,10 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
                     echo=False,  # Don't echo the prompt back
                     stop=["</s>"]  # Stop tokens
                 )
+                if on_token is not None:
+                    raw_response = _stream_completion(llm, prompt, on_token, **completion_params)
+                else:
+                    raw_response = llm(prompt, **completion_params)
                 break  # Success, exit retry loop
                 
             except (BrokenPipeError, OSError, IOError) as pipe_error:
@@ -770,16 +904,27 @@ def generate_response(query: str, context_chunks: List[Any], first_person_mode:
         return f"Error generating response: {str(e)}"
 
 # Remove the global cache as it can cause inconsistent responses
-async def generate_answer(query: str, context_chunks: List[Dict[Any, Any]]) -> tuple[str, bool]:
+async def generate_answer(query: str, context_chunks: List[Dict[Any, Any]], user_id: Optional[int] = None,
+                          on_token: Optional[Callable[[str], None]] = None,
+                          query_context: Optional[QueryContext] = None) -> tuple[str, bool]:
     """
     Generate an answer to a query using the LLM and context chunks
     
     Args:
         query: The user's query
         context_chunks: The context chunks to use for generating the answer
+        user_id: User asking (generation is scheduled fairly per user)
+        on_token: If given, called with each piece of generated text as it is produced (on the
+            LLM worker thread). The returned answer is the filtered one and may differ from the
+            streamed text.
+        query_context: The request's query context; its query embedding lets a rephrased
+            question reuse a cached answer
         
     Returns:
         Tuple of (generated answer, from_cache)
+        
+    Raises:
+        InferenceQueueFullError: The inference queue has no room for this request
     """
     try:
         logger.info(f"Generating answer for query: '{query}' with {len(context_chunks)} context chunks")
@@ -787,17 +932,24 @@ async def generate_answer(query: str, context_chunks: List[Dict[Any, Any]]) -> t
         # Check if caching is enabled
         service = get_ai_config_service()
         ai_config = service.get_ai_config()
-        cache_key = None  # Initialize cache_key to None
+        context_key = None  # Initialize context_key to None
+        query_embedding = None
         
         if getattr(ai_config, "enable_response_caching", False):
-            # Create cache key from query and context chunks
-            context_text = " ".join([chunk.get('content', '') for chunk in context_chunks])
-            cache_key = hashlib.md5(f"{query.lower().strip()}|{context_text}".encode()).hexdigest()
+            # Answers are cached per user and retrieved chunks
+            context_key = response_cache.context_key([chunk.get('content', '') for chunk in context_chunks])
+            if query_context is not None:
+                # Already computed for retrieval
+                try:
+                    query_embedding = await query_context.get_embedding()
+                except Exception as e:
+                    logger.warning(f"No query embedding for the response cache, exact lookup only: {e}")
             
-            # Check if we have a cached response
-            if cache_key in _response_cache:
+            # Check if we have a cached response (same or near-identical question)
+            cached_response = response_cache.get(user_id, query, context_key, query_embedding)
+            if cached_response is not None:
                 logger.info(f"Returning cached response for query: '{query}'")
-                return _response_cache[cache_key], True
+                return cached_response, True
         
         # Check if we have any context chunks
         if not context_chunks:
@@ -830,7 +982,8 @@ async def generate_answer(query: str, context_chunks: List[Dict[Any, Any]]) -> t
         # Generate response with error handling
         logger.info(f"Generating response with {len(context_content)} content chunks")
         try:
-            response = generate_response(query, context_content)
+            # Runs on the LLM worker thread, waiting its turn behind other users' questions
+            response = await get_llm_scheduler().submit(user_id, generate_response, query, context_content, on_token=on_token)
         except (BrokenPipeError, OSError, IOError) as pipe_error:
             logger.error(f"Broken pipe error during response generation: {str(pipe_error)}")
             return "I'm experiencing technical difficulties right now. Please try your question again in a moment.", False
@@ -897,12 +1050,14 @@ async def generate_answer(query: str, context_chunks: List[Dict[Any, Any]]) -> t
             logger.info("Added email prioritization failure note to response")
         
         # Cache the response if caching is enabled
-        if getattr(ai_config, "enable_response_caching", False) and cache_key is not None:
-            _response_cache[cache_key] = response
+        if getattr(ai_config, "enable_response_caching", False) and context_key is not None:
+            response_cache.set(user_id, query, context_key, response, query_embedding)
             logger.info(f"Cached response for query: '{query}'")
         
         logger.info(f"Generated response of length {len(response)} chars")
         return response, False
+    except InferenceQueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Error generating answer: {str(e)}")
         logger.exception("Full exception details:")
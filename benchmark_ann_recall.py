@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency report for the ANN index modes against the exact flat baseline.
+
+Builds every index mode (flat, hnsw, ivf_flat, ivf_pq) with the same parameters
+the vector store uses, runs the same queries through each, and reports
+recall@k against flat search plus median / p95 query latency and build time.
+Use it to pick VECTOR_ANN_MODE, VECTOR_ANN_MIN_VECTORS and the search knobs
+(VECTOR_HNSW_EF_SEARCH, VECTOR_IVF_NPROBE) before enabling them.
+
+By default the vectors are synthetic (clustered, like real embeddings); pass
+--index to benchmark an existing FAISS index from the vector store instead.
+
+Usage:
+    python benchmark_ann_recall.py [--vectors 50000] [--dim 384] [--queries 200] [--k 10]
+    python benchmark_ann_recall.py --index data/vector_db/users/user_1.index
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from typing import List
+
+import faiss
+import numpy as np
+
+sys.path.append('.')
+from app.core.constants import VECTOR_INDEX_MODE_FLAT, VECTOR_ANN_MODES
+from app.services.vector_index_policy import IndexPolicy
+
+
+def synthetic_vectors(count: int, dimension: int, clusters: int = 200, seed: int = 42) -> np.ndarray:
+    """Clustered unit vectors, closer to sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    assignments = rng.integers(0, clusters, count)
+    vectors = centers[assignments] + 0.35 * rng.standard_normal((count, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """Read every vector out of a flat (optionally ID-mapped) index"""
+    index = faiss.read_index(index_path)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    """Fraction of the exact top-k that the approximate search returned"""
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+
+def time_queries(index: faiss.Index, queries: np.ndarray, k: int, params) -> (np.ndarray, List[float]):
+    """Search one query at a time (like the API does) and record per-query latency"""
+    labels = np.empty((len(queries), k), dtype=np.int64)
+    timings = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), k, params=params)
+        timings.append((time.perf_counter() - start) * 1000)
+        labels[i] = found[0]
+    return labels, timings
+
+
+def run(vectors: np.ndarray, query_count: int, k: int, modes: List[str]):
+    policy = IndexPolicy(mode=VECTOR_INDEX_MODE_FLAT)
+    rng = np.random.default_rng(7)
+    queries = vectors[rng.choice(len(vectors), query_count, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype('float32')
+
+    print(f"{len(vectors)} vectors, dimension {vectors.shape[1]}, {query_count} queries, recall@{k}")
+    print(f"{'mode':>9} | {'recall':>7} | {'median ms':>9} | {'p95 ms':>8} | {'build s':>8}")
+    print("-" * 54)
+
+    truth = None
+    for mode in [VECTOR_INDEX_MODE_FLAT] + modes:
+        if len(vectors) < policy.min_training_vectors(mode):
+            print(f"{mode:>9} | needs at least {policy.min_training_vectors(mode)} vectors")
+            continue
+
+        start = time.perf_counter()
+        index = policy.build(mode, vectors)
+        build_seconds = time.perf_counter() - start
+
+        labels, timings = time_queries(index, queries, k, policy.search_params(mode))
+        if truth is None:
+            truth = labels
+        p95 = sorted(timings)[int(0.95 * (len(timings) - 1))]
+        print(f"{mode:>9} | {recall_at_k(truth, labels):>7.3f} | {statistics.median(timings):>9.3f} | "
+              f"{p95:>8.3f} | {build_seconds:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension")
+    parser.add_argument("--index", default=None, help="benchmark the vectors of an existing FAISS index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", choices=VECTOR_ANN_MODES, default=VECTOR_ANN_MODES)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index) if args.index else synthetic_vectors(args.vectors, args.dim)
+    run(vectors, min(args.queries, len(vectors)), args.k, args.modes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Embedding throughput: fixed-count batches in input order vs. length-bucketed batches.
+
+The corpus mixes one bank statement (hundreds of one-line transaction chunks)
+with one 100-page PDF (page-length chunks), interleaved as they are when both
+are ingested together. The "before" path slices the texts into batches of
+EMBEDDING_BATCH_SIZE in input order, so short lines are padded to the longest
+page in their batch; the "after" path is
+SentenceTransformerEmbeddingService.generate_embeddings, which sorts by token
+length and fills batches up to a padded-token budget. The embedding cache is
+disabled so both paths run the model on every text.
+
+Reports texts/second and padded tokens for each, and checks both return the
+same embeddings in the same order.
+
+Usage:
+    python benchmark_embedding_batching.py [--transactions 600] [--pages 100] [--repeat 3]
+"""
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import List
+
+import numpy as np
+
+sys.path.append('.')
+from app.core.config import settings
+
+MERCHANTS = ["COFFEE SHOP", "GROCERY MART", "GAS STATION", "ONLINE STORE", "PHARMACY", "RESTAURANT", "PAYROLL"]
+REPORT_SENTENCES = [
+    "Revenue grew in every region compared with the prior fiscal year.",
+    "Operating expenses were driven mainly by headcount and cloud infrastructure.",
+    "The committee reviewed the liquidity position and the outstanding credit facilities.",
+    "Management expects margins to stabilize as supply chain costs normalize.",
+    "Risk factors include currency movements, regulatory changes and customer concentration.",
+    "Capital expenditure focused on data centers and the modernization of legacy systems.",
+]
+
+
+def bank_statement_chunks(count: int, rng: random.Random) -> List[str]:
+    """One chunk per transaction line, as the financial processor produces"""
+    return [
+        f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024 DEBIT CARD PURCHASE "
+        f"{rng.choice(MERCHANTS)} -${rng.randint(1, 500)}.{rng.randint(0, 99):02d} BALANCE ${rng.randint(100, 9000)}.00"
+        for _ in range(count)
+    ]
+
+
+def pdf_chunks(pages: int, rng: random.Random, chunks_per_page: int = 3, chunk_chars: int = 1000) -> List[str]:
+    """Page text of a long report, split into chunks of about chunk_chars characters"""
+    chunks = []
+    for page in range(pages):
+        text = f"Page {page + 1}. "
+        while len(text) < chunks_per_page * chunk_chars:
+            text += rng.choice(REPORT_SENTENCES) + " "
+        chunks.extend(text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars))
+    return chunks
+
+
+def mixed_corpus(transactions: int, pages: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    texts = bank_statement_chunks(transactions, rng) + pdf_chunks(pages, rng)
+    rng.shuffle(texts)
+    return texts
+
+
+def padded_tokens(batches: List[List[int]], lengths: List[int]) -> int:
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+def run(transactions: int, pages: int, repeat: int):
+    from app.services.embedding_service import SentenceTransformerEmbeddingService
+
+    settings.EMBEDDING_CACHE_ENABLED = False
+    texts = mixed_corpus(transactions, pages)
+    service = SentenceTransformerEmbeddingService()
+    service.cache = None
+    model = service._load_model()
+    lengths = service._token_lengths(texts)
+    batch_size = service.batch_size
+
+    def before() -> np.ndarray:
+        return np.vstack([
+            model.encode(texts[i:i + batch_size], normalize_embeddings=service.normalize_embeddings,
+                         show_progress_bar=False, batch_size=batch_size)
+            for i in range(0, len(texts), batch_size)
+        ])
+
+    def after() -> np.ndarray:
+        return asyncio.run(service.generate_embeddings(texts))
+
+    # Warm up (model load, kernels)
+    model.encode(texts[:batch_size], show_progress_bar=False)
+
+    results = {}
+    for name, function in [("input order", before), ("length-bucketed", after)]:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            embeddings = function()
+            timings.append(time.perf_counter() - start)
+        results[name] = (embeddings, statistics.median(timings))
+
+    fixed_batches = [list(range(i, min(i + batch_size, len(texts)))) for i in range(0, len(texts), batch_size)]
+    bucketed_batches = service._length_batches(lengths, service._token_budget(), settings.EMBEDDING_BATCH_MAX_TEXTS)
+    padded = {
+        "input order": (len(fixed_batches), padded_tokens(fixed_batches, lengths)),
+        "length-bucketed": (len(bucketed_batches), padded_tokens(bucketed_batches, lengths)),
+    }
+
+    print(f"{len(texts)} texts ({transactions} transaction lines, {len(texts) - transactions} PDF chunks), "
+          f"{sum(lengths)} real tokens, model {service.model_name}")
+    print(f"{'batching':>16} | {'batches':>7} | {'padded tokens':>13} | {'seconds':>8} | {'texts/s':>8}")
+    print("-" * 66)
+    for name, (_, seconds) in results.items():
+        batches, tokens = padded[name]
+        print(f"{name:>16} | {batches:>7} | {tokens:>13} | {seconds:>8.3f} | {len(texts) / seconds:>8.1f}")
+    speedup = results["input order"][1] / results["length-bucketed"][1]
+    same = np.allclose(results["input order"][0], results["length-bucketed"][0], atol=1e-4)
+    print(f"speedup {speedup:.2f}x, embeddings {'match' if same else 'DIFFER'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=600, help="bank statement transaction lines")
+    parser.add_argument("--pages", type=int, default=100, help="pages of the long PDF")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.transactions, args.pages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Time to first token with and without reuse of the prompt template's static prefix.
+
+Each question is answered from a few retrieved chunks, the way /ask builds its
+prompt with generate_prompt. The "cold" run resets the model's KV cache before
+every prompt, so the whole prompt is evaluated, which is what happened while the
+templates began with the question. The "prefix cache" run goes through
+prepare_prompt_prefix, so only the context and the question are evaluated. TTFT
+is measured from submitting the prompt to the first streamed token.
+
+Needs llama-cpp-python and a GGUF model file.
+
+Usage:
+    python benchmark_llm_prefix_cache.py --model models/phi-2-instruct-Q4_K_M.gguf [--model-name phi-2] [--questions 8]
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import List, Tuple
+
+sys.path.append('.')
+from app.core.config import settings
+
+QUESTIONS = [
+    "How much did I spend at the grocery store in March?",
+    "How much was the Apple invoice?",
+    "When did I pay Alex Jones with Zelle?",
+    "Where did I go on vacation in 2023?",
+    "What was my largest purchase last month?",
+    "How much did I pay for my phone bill?",
+    "Which subscriptions did I pay for in April?",
+    "What programming languages do I know?",
+]
+MERCHANTS = ["GROCERY MART", "APPLE.COM/BILL", "ZELLE TO ALEX JONES", "THY ISTANBUL", "PHONE CO", "STREAMING SVC"]
+
+
+def corpus(count: int, seed: int = 7) -> List[Tuple[str, List[str]]]:
+    """Questions with three retrieved chunks each"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        chunks = [
+            " ".join(
+                f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024 {rng.choice(MERCHANTS)} -${rng.randint(5, 900)}.{rng.randint(0, 99):02d}"
+                for _ in range(8)
+            )
+            for _ in range(3)
+        ]
+        items.append((QUESTIONS[i % len(QUESTIONS)], chunks))
+    return items
+
+
+def run(model_path: str, model_name: str, questions: int):
+    from app.utils import llm as llm_utils
+
+    settings.LLM_MODEL_PATH = model_path
+    model = llm_utils.get_llm()
+    prefix = llm_utils.get_prompt_prefix(model_name)
+    prompts = [llm_utils.generate_prompt(question, chunks, model_name=model_name) for question, chunks in corpus(questions)]
+    prefix_tokens = len(model.tokenize(prefix.encode("utf-8"), special=True))
+    prompt_tokens = [len(model.tokenize(prompt.encode("utf-8"), special=True)) for prompt in prompts]
+
+    def time_to_first_token(prompt: str, cached: bool) -> float:
+        start = time.perf_counter()
+        if cached:
+            llm_utils.prepare_prompt_prefix(model, prefix)
+        else:
+            model.reset()
+        for _ in model(prompt, stream=True, max_tokens=1, temperature=0.0):
+            break
+        return time.perf_counter() - start
+
+    # Warm up (weights paged in, kernels)
+    time_to_first_token(prompts[0], cached=False)
+
+    results = {}
+    for name, cached in [("cold", False), ("prefix cache", True)]:
+        settings.LLM_PREFIX_CACHE_ENABLED = cached
+        results[name] = [time_to_first_token(prompt, cached) for prompt in prompts]
+
+    print(f"{len(prompts)} prompts, model {model_path} ({model_name or 'default'} template), "
+          f"prefix {prefix_tokens} tokens, prompts {statistics.mean(prompt_tokens):.0f} tokens on average")
+    print(f"{'run':>12} | {'median TTFT ms':>14} | {'max TTFT ms':>11}")
+    print("-" * 45)
+    for name, timings in results.items():
+        print(f"{name:>12} | {statistics.median(timings) * 1000:>14.1f} | {max(timings) * 1000:>11.1f}")
+    speedup = statistics.median(results["cold"]) / statistics.median(results["prefix cache"])
+    print(f"median TTFT {speedup:.2f}x faster with the prefix cache; prefix use: {llm_utils.get_prefix_cache_stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.LLM_MODEL_PATH, help="GGUF model file")
+    parser.add_argument("--model-name", default=None, choices=["phi-2", "mistral-7b"], help="prompt template to use")
+    parser.add_argument("--questions", type=int, default=8)
+    args = parser.parse_args()
+    run(args.model, args.model_name, args.questions)
+
+
+if __name__ == "__main__":
+    main()
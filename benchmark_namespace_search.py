@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark document retrieval latency as the number of namespaces grows.
+
+Each namespace is populated with random vectors (no model time spent on
+ingestion), then the same question is searched across all of a user's
+namespaces. With the per-request QueryContext the query is embedded once,
+so latency should stay roughly flat instead of growing with one forward
+pass per namespace.
+
+Usage:
+    python benchmark_namespace_search.py [--counts 1 5 10 20 40] [--chunks 50] [--runs 5]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from typing import List
+
+import numpy as np
+
+sys.path.append('.')
+from app.services.vector_store_service import FAISSVectorStoreService
+from app.services.embedding_service import EmbeddingService, QueryContext, get_embedding_service
+
+QUERY = "How much did I pay for groceries last month?"
+USER_ID = 1
+
+
+class CountingEmbeddingService(EmbeddingService):
+    """Delegates to the real embedding service and counts forward passes"""
+
+    def __init__(self, inner: EmbeddingService):
+        self.inner = inner
+        self.calls = 0
+
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        self.calls += 1
+        return await self.inner.generate_embeddings(texts)
+
+    async def generate_embedding(self, text: str) -> List[float]:
+        self.calls += 1
+        return await self.inner.generate_embedding(text)
+
+    def get_dimension(self) -> int:
+        return self.inner.get_dimension()
+
+
+def build_namespaces(service: FAISSVectorStoreService, count: int, chunks: int, dimension: int):
+    """Write `count` namespaces of random vectors for the benchmark user"""
+    import faiss
+
+    rng = np.random.default_rng(42)
+    for i in range(count):
+        namespace = f"user_{USER_ID}_doc_bench_{i}"
+        vectors = rng.standard_normal((chunks, dimension)).astype('float32')
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexFlatL2(dimension)
+        index.add(vectors)
+        doc_map = [
+            {"content": f"Benchmark chunk {j} of document {i}", "metadata": {"document_id": i, "chunk_index": j}}
+            for j in range(chunks)
+        ]
+        service._save_index(namespace, index, doc_map, "generic")
+
+
+async def run(counts: List[int], chunks: int, runs: int):
+    embedding_service = CountingEmbeddingService(get_embedding_service())
+    dimension = embedding_service.get_dimension()
+
+    # Warm up the model so the first measurement does not include loading it
+    await embedding_service.generate_embedding(QUERY)
+
+    print(f"{'namespaces':>10} | {'median ms':>10} | {'encodes/query':>13}")
+    print("-" * 40)
+
+    for count in counts:
+        with tempfile.TemporaryDirectory() as storage_path:
+            service = FAISSVectorStoreService(storage_path=storage_path)
+            build_namespaces(service, count, chunks, dimension)
+
+            timings = []
+            embedding_service.calls = 0
+            for _ in range(runs):
+                query_context = QueryContext(QUERY, embedding_service)
+                start = time.perf_counter()
+                await service.search_similar_chunks(
+                    query=QUERY,
+                    embedding_service=embedding_service,
+                    user_id=USER_ID,
+                    top_k=10,
+                    query_context=query_context
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+
+            print(f"{count:>10} | {statistics.median(timings):>10.2f} | {embedding_service.calls / runs:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per namespace")
+    parser.add_argument("--runs", type=int, default=5, help="searches per namespace count")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.counts, args.chunks, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -103,13 +103,13 @@ def cleanup_orphaned_vector_files():
         
         # Check vector files
         index_files = list(vector_path.glob("*.index"))
-        pkl_files = list(vector_path.glob("*.pkl"))
+        pkl_files = list(vector_path.glob("*.pkl")) + list(vector_path.glob("*.chunks"))
         
         orphaned_files = []
         
         for file in index_files + pkl_files:
             # Extract email ID from filename
-            # Expected format: user_{user_id}_email_gmail_{email_id}.{index|pkl}
+            # Expected format: user_{user_id}_email_gmail_{email_id}.{index|chunks|pkl}
             parts = file.stem.split('_')
             if len(parts) >= 5 and parts[0] == 'user' and parts[2] == 'email':
                 try:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fold per-email FAISS files into one email index per user.
+
+Reads every legacy `user_{id}_email_{email_id}.index` and its chunk store (or
+pickled metadata list) under `{VECTOR_DB_PATH}/emails`, appends their vectors to
+the user's `user_{id}_emails.index`, records each email's vector range in the
+user's email metadata index and deletes the per-email files. Emails already in
+the user index are replaced, so the script can be re-run safely.
+
+The backend also migrates a user's remaining per-email files the first time it
+touches that user's emails; this script does it for everyone up front.
+
+Usage:
+    python migrate_email_indices.py
+    python migrate_email_indices.py --user-id 3
+    python migrate_email_indices.py --dry-run
+"""
+
+import re
+import sys
+import logging
+import argparse
+from typing import List
+
+sys.path.append('.')
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LEGACY_INDEX_PATTERN = re.compile(r"^user_(\d+)_email_.+\.index$")
+
+
+def find_users_with_legacy_indices(email_path) -> List[int]:
+    """User IDs that still have per-email index files"""
+    user_ids = set()
+    for index_file in email_path.glob("user_*_email_*.index"):
+        match = LEGACY_INDEX_PATTERN.match(index_file.name)
+        if match:
+            user_ids.add(int(match.group(1)))
+    return sorted(user_ids)
+
+
+def migrate(user_id: int = None, dry_run: bool = False) -> bool:
+    from app.services.email.email_store import EmailStore
+
+    email_store = EmailStore()
+    user_ids = [user_id] if user_id is not None else find_users_with_legacy_indices(email_store.base_path)
+    if not user_ids:
+        logger.info("No per-email indices found; nothing to migrate")
+        return True
+
+    success = True
+    for uid in user_ids:
+        legacy_count = len(email_store._get_legacy_email_indices(uid))
+        if dry_run:
+            logger.info(f"User {uid}: would migrate {legacy_count} per-email indices")
+            continue
+        try:
+            migrated = email_store.migrate_legacy_email_indices(uid)
+            logger.info(f"User {uid}: migrated {migrated} of {legacy_count} per-email indices")
+        except Exception as e:
+            logger.error(f"User {uid}: migration failed: {e}")
+            success = False
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold per-email FAISS files into one email index per user")
+    parser.add_argument("--user-id", type=int, default=None, help="only migrate this user")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be migrated")
+    args = parser.parse_args()
+
+    success = migrate(args.user_id, args.dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Fold per-namespace FAISS files into the consolidated per-user layout.
+
+Reads every legacy `{namespace}.index` and its chunk store (or pickled document
+map) from the vector
+store root and the financial/long_form/generic category directories, and adds
+their vectors to one ID-mapped index per user (or per user and category) under
+`users/`. Namespaces that are already present in the target index are skipped,
+so the script can be re-run safely.
+
+Usage:
+    python migrate_vector_layout.py --layout user
+    python migrate_vector_layout.py --layout user_category --remove-legacy
+    python migrate_vector_layout.py --layout user --dry-run
+
+Afterwards set VECTOR_STORE_LAYOUT to the same layout and restart the backend.
+"""
+
+import os
+import sys
+import logging
+import argparse
+from typing import List, Tuple
+
+import faiss
+
+sys.path.append('.')
+from app.services.chunk_store import ChunkStore
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def find_legacy_namespaces(storage_path: str, categories: List[str]) -> List[Tuple[str, str, str]]:
+    """Find (namespace, category, index_path) for every legacy namespace"""
+    found = []
+    locations = [(storage_path, None)] + [(os.path.join(storage_path, c), c) for c in categories]
+
+    for directory, category in locations:
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".index"):
+                continue
+            namespace = filename[:-6]
+            index_path = os.path.join(directory, filename)
+            if not ChunkStore.exists_for_index(index_path):
+                logger.warning(f"Skipping {index_path}: no chunk store or document map found")
+                continue
+            found.append((namespace, category, index_path))
+
+    return found
+
+
+def migrate(layout: str, storage_path: str = None, remove_legacy: bool = False, dry_run: bool = False) -> bool:
+    """Migrate legacy namespace indices into the consolidated layout"""
+    from app.services.vector_store_service import FAISSVectorStoreService
+    from app.core.constants import VECTOR_STORE_LAYOUT_NAMESPACE
+
+    if layout == VECTOR_STORE_LAYOUT_NAMESPACE:
+        logger.error("Target layout must be a consolidated layout (user or user_category)")
+        return False
+
+    target = FAISSVectorStoreService(storage_path=storage_path, layout=layout)
+    legacy = find_legacy_namespaces(target.storage_path, list(target.CATEGORY_DIRECTORIES.values()))
+    logger.info(f"=== Migrating {len(legacy)} namespaces to '{layout}' layout in {target.storage_path} ===")
+
+    migrated = skipped = failed = 0
+
+    for namespace, category, index_path in legacy:
+        category = category or target._get_category_from_namespace(namespace)
+
+        if target._get_user_id_from_namespace(namespace) is None:
+            logger.warning(f"Skipping {namespace}: cannot determine owning user")
+            skipped += 1
+            continue
+
+        if target.has_namespace(namespace, category):
+            logger.info(f"Skipping {namespace}: already in {target._get_storage_key(namespace, category)}")
+            skipped += 1
+            continue
+
+        try:
+            index = faiss.read_index(index_path)
+            with ChunkStore.for_index(index_path) as chunk_store:
+                entries = [entry for _, entry in chunk_store.items()]
+
+            count = min(index.ntotal, len(entries))
+            if count != index.ntotal or count != len(entries):
+                logger.warning(f"{namespace}: {index.ntotal} vectors but {len(entries)} entries, migrating {count}")
+
+            if dry_run:
+                logger.info(f"[dry-run] Would migrate {count} vectors from {namespace} "
+                            f"into {target._get_storage_key(namespace, category)}")
+                migrated += 1
+                continue
+
+            if count:
+                vectors = index.reconstruct_n(0, count)
+                target.add_vectors(namespace, vectors, entries[:count], category)
+            logger.info(f"✅ Migrated {count} vectors from {namespace} "
+                        f"into {target._get_storage_key(namespace, category)}")
+            migrated += 1
+
+            if remove_legacy:
+                os.remove(index_path)
+                ChunkStore.remove_for_index(index_path)
+
+        except Exception as e:
+            logger.error(f"❌ Failed to migrate {namespace}: {e}")
+            failed += 1
+
+    if not dry_run:
+        # Fold the appended segments into each user's base index before exiting
+        for key in target.catalog.get_user_namespaces(None):
+            target.merge_segments(key)
+
+    logger.info(f"Done: {migrated} migrated, {skipped} skipped, {failed} failed")
+    return failed == 0
+
+
+def main():
+    from app.core.constants import VECTOR_STORE_LAYOUTS
+
+    parser = argparse.ArgumentParser(description="Fold per-namespace FAISS files into per-user indices")
+    parser.add_argument("--layout", choices=VECTOR_STORE_LAYOUTS[1:], default="user",
+                        help="target consolidated layout")
+    parser.add_argument("--storage-path", default=None, help="vector store root (defaults to VECTOR_DB_PATH)")
+    parser.add_argument("--remove-legacy", action="store_true", help="delete legacy files after migrating them")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be migrated")
+    args = parser.parse_args()
+
+    success = migrate(args.layout, args.storage_path, args.remove_legacy, args.dry_run)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Recompute users' email statistics from scratch.
+
+Email statistics (/emails/stats) are counters kept in each user's email metadata
+index and updated as emails are stored and deleted. This rebuilds that index -
+metadata, vector ranges and counters - from the chunks in the user's email
+vector index, e.g. after restoring files from a backup or if the counters are
+suspected to have drifted.
+
+Usage:
+    python rebuild_email_stats.py
+    python rebuild_email_stats.py --user-id 3
+"""
+
+import re
+import sys
+import logging
+import argparse
+from typing import List
+
+sys.path.append('.')
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+USER_FILE_PATTERN = re.compile(r"^user_(\d+)(?:_emails\.index|\.email_meta|_email_.+\.index)$")
+
+
+def find_users(email_path) -> List[int]:
+    """User IDs with an email index, metadata index or legacy per-email files"""
+    user_ids = set()
+    for path in email_path.iterdir():
+        match = USER_FILE_PATTERN.match(path.name)
+        if match:
+            user_ids.add(int(match.group(1)))
+    return sorted(user_ids)
+
+
+def rebuild(user_id: int = None) -> bool:
+    from app.services.email.email_store import EmailStore
+
+    email_store = EmailStore()
+    user_ids = [user_id] if user_id is not None else find_users(email_store.base_path)
+    if not user_ids:
+        logger.info("No stored emails found; nothing to rebuild")
+        return True
+
+    success = True
+    for uid in user_ids:
+        try:
+            stats = email_store.rebuild_email_stats(uid)
+            logger.info(f"User {uid}: {stats['total_emails']} emails, {stats['total_chunks']} chunks, "
+                        f"{len(stats['categories'])} tags, {len(stats['email_types'])} email types")
+        except Exception as e:
+            logger.error(f"User {uid}: rebuild failed: {e}")
+            success = False
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute users' email statistics from the stored chunks")
+    parser.add_argument("--user-id", type=int, default=None, help="only rebuild this user")
+    args = parser.parse_args()
+
+    sys.exit(0 if rebuild(args.user_id) else 1)
+
+
+if __name__ == "__main__":
+    main()
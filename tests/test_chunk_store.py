@@ -0,0 +1,74 @@
+"""
+Unit tests for the SQLite chunk store
+"""
+
+import pytest
+
+from app.services.chunk_store import ChunkStore
+
+
+@pytest.fixture
+def chunk_store(tmp_path):
+    store = ChunkStore.for_index(str(tmp_path / "user_1.index"))
+    store.put_many(range(4), [
+        {"namespace": "user_1_doc_a", "chunk_index": 0, "content": "Zelle to Alex Jones $1,250.00",
+         "metadata": {"page": 1, "year": 2023}},
+        {"namespace": "user_1_doc_a", "chunk_index": 1, "content": "Card payment at Grocery Mart xxxx4242",
+         "metadata": {"page": 2, "year": 2023}},
+        {"namespace": "user_1_doc_b", "chunk_index": 0, "content": "Zelle from Alex Jones, Zelle refund",
+         "metadata": {"page": 1, "year": 2024}},
+        {"namespace": "user_1_doc_b", "chunk_index": 1, "content": "Annual summary",
+         "metadata": {"page": 2, "year": 2024}},
+    ])
+    yield store
+    store.close()
+
+
+class TestChunkStore:
+    """Rows are read back by vector ID and filtered by namespace and metadata"""
+
+    def test_rows_round_trip(self, chunk_store):
+        entry = chunk_store.get(1)
+
+        assert entry == {
+            "namespace": "user_1_doc_a",
+            "chunk_index": 1,
+            "content": "Card payment at Grocery Mart xxxx4242",
+            "metadata": {"page": 2, "year": 2023}
+        }
+        assert chunk_store.get(9) is None
+        assert len(chunk_store) == 4
+
+    def test_ids_are_filtered(self, chunk_store):
+        assert chunk_store.ids() == [0, 1, 2, 3]
+        assert chunk_store.ids(namespaces=["user_1_doc_b"]) == [2, 3]
+        assert chunk_store.ids(metadata_filter={"page": 1}) == [0, 2]
+        assert chunk_store.ids(namespaces=["user_1_doc_a"], metadata_filter={"year": 2024}) == []
+
+    def test_deleted_rows_leave_every_index(self, chunk_store):
+        assert chunk_store.delete([0, 2]) == 2
+
+        assert chunk_store.ids() == [1, 3]
+        assert chunk_store.ids(metadata_filter={"page": 1}) == []
+        assert chunk_store.lexical_search(["zelle"], limit=10) == []
+
+
+class TestLexicalSearch:
+    """BM25 search over the same filters, matching amounts and card digits as whole tokens"""
+
+    def test_hits_are_ranked_by_bm25(self, chunk_store):
+        hits = chunk_store.lexical_search(["zelle"], limit=10)
+
+        # The chunk mentioning the term twice ranks first; scores are positive, higher is better
+        assert [vector_id for vector_id, _ in hits] == [2, 0]
+        assert hits[0][1] > hits[1][1] > 0
+
+    def test_amounts_and_card_digits_match(self, chunk_store):
+        assert [vector_id for vector_id, _ in chunk_store.lexical_search(["1250.00"], limit=10)] == [0]
+        assert [vector_id for vector_id, _ in chunk_store.lexical_search(["4242"], limit=10)] == [1]
+
+    def test_hits_respect_filters_and_limit(self, chunk_store):
+        assert [v for v, _ in chunk_store.lexical_search(["zelle"], limit=10, namespaces=["user_1_doc_a"])] == [0]
+        assert [v for v, _ in chunk_store.lexical_search(["zelle"], limit=10, metadata_filter={"year": 2024})] == [2]
+        assert len(chunk_store.lexical_search(["zelle", "summary"], limit=2)) == 2
+        assert chunk_store.lexical_search(["zelle"], limit=10, namespaces=[]) == []
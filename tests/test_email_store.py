@@ -0,0 +1,133 @@
+"""
+Unit tests for the per-user email vector store
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.email.email_store import EmailStore
+
+QUERY = [1.0, 0.0, 0.0, 0.0]
+OLD = "2020-01-15T10:00:00"
+
+
+def chunk(similarity, text, date=OLD, tags=(), email_type=None):
+    """A chunk whose embedding has the given cosine similarity to QUERY"""
+    metadata = {
+        'chunk_text': text,
+        'date': date,
+        'classification_tags': list(tags),
+        'sender': 'someone@example.com',
+        'sender_domain': 'example.com'
+    }
+    if email_type:
+        metadata['email_type'] = email_type
+    return {'embedding': [similarity, float(np.sqrt(1.0 - similarity ** 2)), 0.0, 0.0], 'metadata': metadata}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_DB_PATH", str(tmp_path))
+    return EmailStore()
+
+
+class TestEmailSearch:
+    """Recency and priority boosts re-rank candidates beyond the raw top k"""
+
+    def test_boosted_hits_below_raw_top_k_are_promoted(self, store):
+        recent = (datetime.now() - timedelta(days=3)).isoformat()
+        store.store_email_batch([
+            ("a", [chunk(0.90, "quarterly newsletter")]),
+            ("b", [chunk(0.85, "team lunch")]),
+            ("c", [chunk(0.80, "your offer letter", recent, ["job_offer"])]),  # raw rank k + 1
+            ("d", [chunk(0.78, "conference schedule")]),
+            ("e", [chunk(0.76, "library reminder")]),
+            ("f", [chunk(0.70, "new sign-in to your account", recent, ["security"])]),  # raw rank 3k
+        ], user_id=1)
+
+        results = store.search_emails(QUERY, user_id=1, k=2)
+
+        assert [r['text'] for r in results] == ["your offer letter", "new sign-in to your account"]
+        assert results[0]['score'] == pytest.approx(0.80 + 0.12 + 0.1)
+        assert results[1]['score'] == pytest.approx(0.70 + 0.15 + 0.1)
+
+    def test_single_chunk_emails_get_their_own_ids(self, store):
+        store.store_email_batch([("a", [chunk(0.9, "first email")])], user_id=1)
+        store.store_email_batch([("b", [chunk(0.2, "second email")])], user_id=1)
+
+        assert store.search_emails(QUERY, user_id=1, k=1)[0]['text'] == "first email"
+        assert sorted(r['text'] for r in store.search_emails(QUERY, user_id=1, k=5)) == ["first email", "second email"]
+
+    def test_unboosted_ranking_is_unchanged(self, store):
+        store.store_email_batch([
+            (str(i), [chunk(similarity, f"email {i}")]) for i, similarity in enumerate([0.6, 0.9, 0.7, 0.8])
+        ], user_id=1)
+
+        results = store.search_emails(QUERY, user_id=1, k=3)
+
+        assert [r['text'] for r in results] == ["email 1", "email 3", "email 2"]
+
+
+class TestEmailIndexCache:
+    """Only vectors, IDs and per-email arrays stay resident; chunk text is read per search"""
+
+    def test_chunk_text_is_not_resident(self, store):
+        long_text = "statement line " * 10000
+        store.store_email_batch([("a", [chunk(0.9, long_text)]), ("b", [chunk(0.5, "short")])], user_id=1)
+
+        results = store.search_emails(QUERY, user_id=1, k=1)
+        cached = store._get_cached_index(1)
+
+        assert results[0]['text'] == long_text
+        assert cached.chunk_ids.tolist() == [0, 1]
+        assert cached.nbytes < len(long_text)
+
+
+class TestEmailDeletion:
+    """Deleted and re-stored emails are reflected in searches and in the statistics counters"""
+
+    def build(self, store):
+        store.store_email_batch([
+            ("a", [chunk(0.9, "offer part one", "2024-03-01T09:00:00", ["job_offer"], "personal"),
+                   chunk(0.8, "offer part two", "2024-03-01T09:00:00", ["job_offer"], "personal")]),
+            ("b", [chunk(0.7, "weekly digest", "2023-01-10T09:00:00", ["newsletter"], "promotional")]),
+            ("c", [chunk(0.6, "receipt", "2024-06-30T09:00:00", ["financial", "receipt"], "personal")]),
+        ], user_id=1)
+
+    def test_deleted_email_is_excluded_from_search(self, store):
+        self.build(store)
+        assert store.search_emails(QUERY, user_id=1, k=1)[0]['text'] == "offer part one"
+
+        assert store.delete_email(1, "a")
+
+        results = store.search_emails(QUERY, user_id=1, k=5)
+        assert sorted(r['text'] for r in results) == ["receipt", "weekly digest"]
+        # A fresh store reads the tombstones back from disk
+        assert sorted(r['text'] for r in EmailStore().search_emails(QUERY, user_id=1, k=5)) == ["receipt", "weekly digest"]
+
+    def test_counters_follow_stores_and_deletes(self, store):
+        self.build(store)
+
+        stats = store.get_email_stats(1)
+        assert stats['total_emails'] == 3
+        assert stats['total_chunks'] == 4
+        assert stats['categories'] == {"job_offer": 1, "newsletter": 1, "financial": 1, "receipt": 1}
+        assert stats['email_types'] == {"personal": 2, "promotional": 1}
+        assert stats['date_range']['earliest'].startswith("2023-01-10")
+        assert stats['date_range']['latest'].startswith("2024-06-30")
+
+        store.delete_email(1, "c")
+        # Storing an email again replaces its earlier copy instead of counting it twice
+        store.store_email_batch([("b", [chunk(0.7, "weekly digest", "2023-01-10T09:00:00", ["newsletter"], "promotional")])],
+                                user_id=1)
+
+        stats = store.get_email_stats(1)
+        assert stats['total_emails'] == 2
+        assert stats['total_chunks'] == 3
+        assert {tag: n for tag, n in stats['categories'].items() if n} == {"job_offer": 1, "newsletter": 1}
+        assert {kind: n for kind, n in stats['email_types'].items() if n} == {"personal": 1, "promotional": 1}
+        assert stats['date_range']['latest'].startswith("2024-03-01")
+        assert store.rebuild_email_stats(1)['total_chunks'] == 3
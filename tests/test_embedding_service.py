@@ -0,0 +1,226 @@
+"""
+Unit tests for the shared embedding model registry
+"""
+
+import time
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import embedding_service
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+
+
+class FakeSentenceTransformer:
+    """Stands in for SentenceTransformer, recording model loads and encoded batches"""
+    loads = []
+    batches = []
+
+    def __init__(self, model_name, device=None):
+        FakeSentenceTransformer.loads.append((model_name, device))
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False, batch_size=32):
+        if isinstance(texts, str):
+            return np.ones(4, dtype=np.float32)
+        FakeSentenceTransformer.batches.append(list(texts))
+        return np.array([[len(text), 1, 1, 1] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    FakeSentenceTransformer.loads = []
+    FakeSentenceTransformer.batches = []
+    monkeypatch.setattr(embedding_service, "SentenceTransformer", FakeSentenceTransformer)
+    monkeypatch.setattr(embedding_service, "_models", {})
+    monkeypatch.setattr(embedding_service, "_default_embedding_service", None)
+    monkeypatch.setattr(embedding_service.settings, "EMBEDDING_CACHE_ENABLED", False)
+    return FakeSentenceTransformer
+
+
+class TestEmbeddingModelRegistry:
+    """The embedding model is loaded once per process, however many services use it"""
+
+    def test_model_loads_once_across_services(self, fake_model):
+        services = [
+            embedding_service.SentenceTransformerEmbeddingService(),
+            embedding_service.SentenceTransformerEmbeddingService(),
+            embedding_service.get_embedding_service(),
+            embedding_service.QueryContext("rent").embedding_service,
+        ]
+
+        async def embed_everywhere():
+            for service in services:
+                await service.generate_embedding("how much was rent")
+                await service.generate_embeddings(["rent", "groceries"])
+            await embedding_service.generate_embedding("rent")
+
+        asyncio.run(embed_everywhere())
+
+        assert len(fake_model.loads) == 1
+        assert embedding_service.get_embedding_model() is services[0]._load_model()
+
+    def test_one_model_per_name_and_device(self, fake_model):
+        embedding_service.load_embedding_model("model-a", "cpu")
+        embedding_service.load_embedding_model("model-a", "cpu")
+        embedding_service.load_embedding_model("model-a", "cuda")
+        embedding_service.load_embedding_model("model-b", "cpu")
+
+        assert fake_model.loads == [("model-a", "cpu"), ("model-a", "cuda"), ("model-b", "cpu")]
+
+
+class TestEmbeddingMicroBatching:
+    """Concurrent single-text requests share encode calls"""
+
+    def test_concurrent_requests_are_batched(self, fake_model, monkeypatch):
+        monkeypatch.setattr(embedding_service.settings, "EMBEDDING_MICROBATCH_ENABLED", True)
+        service = embedding_service.SentenceTransformerEmbeddingService()
+        texts = ["x" * length for length in range(1, 11)]
+
+        async def embed_concurrently():
+            return await asyncio.gather(*[service.generate_embedding(text) for text in texts])
+
+        embeddings = asyncio.run(embed_concurrently())
+
+        # Every caller gets the row of its own text
+        assert [embedding[0] for embedding in embeddings] == [float(len(text)) for text in texts]
+        assert len(fake_model.batches) < len(texts)
+        stats = service.get_stats()
+        assert stats["requests"] == len(texts)
+        assert stats["batches"] == len(fake_model.batches)
+
+    def test_requests_on_concurrent_event_loops_are_served(self):
+        # The sync vector store wrappers embed on their own event loops, possibly from several threads
+        async def encode_batch(texts):
+            await asyncio.sleep(0)
+            time.sleep(0.01)
+            return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+        batcher = EmbeddingBatcher(encode_batch, max_batch_size=8, max_wait_ms=5)
+        results = {}
+
+        def embed_on_own_loop(worker):
+            async def embed_several():
+                texts = ["x" * (worker * 100 + i + 1) for i in range(20)]
+                return [await asyncio.wait_for(batcher.embed(text), timeout=3) for text in texts]
+            try:
+                results[worker] = [int(embedding[0]) for embedding in asyncio.run(embed_several())]
+            except Exception as e:
+                results[worker] = e
+
+        threads = [threading.Thread(target=embed_on_own_loop, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == {worker: [worker * 100 + i + 1 for i in range(20)] for worker in range(8)}
+        assert batcher.get_stats()["requests"] == 160
+
+
+class SlowSentenceTransformer(FakeSentenceTransformer):
+    """Blocks its thread for a while per encode call, like a CPU forward pass"""
+
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False, batch_size=32):
+        time.sleep(0.1)
+        return super().encode(texts, normalize_embeddings, show_progress_bar, batch_size)
+
+
+class TestEmbeddingExecutor:
+    """Embedding inference runs off the event loop"""
+
+    def test_event_loop_stays_responsive_while_embedding(self, fake_model, monkeypatch):
+        monkeypatch.setattr(embedding_service, "SentenceTransformer", SlowSentenceTransformer)
+        monkeypatch.setattr(embedding_service.settings, "EMBEDDING_BATCH_MAX_TEXTS", 10)
+        service = embedding_service.SentenceTransformerEmbeddingService()
+        document_chunks = [f"chunk {i} of a large document" for i in range(50)]
+
+        async def embed_while_ticking():
+            gaps = []
+
+            async def ticker(done: asyncio.Event):
+                last = time.perf_counter()
+                while not done.is_set():
+                    await asyncio.sleep(0.005)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            done = asyncio.Event()
+            ticking = asyncio.create_task(ticker(done))
+            embeddings = await service.generate_embeddings(document_chunks)
+            done.set()
+            await ticking
+            return embeddings, gaps
+
+        embeddings, gaps = asyncio.run(embed_while_ticking())
+
+        assert embeddings.shape == (len(document_chunks), 4)
+        # Five 100 ms encode calls ran, yet the loop was never blocked for one of them
+        assert len(gaps) > 20
+        assert max(gaps) < 0.08
+
+
+class TestEmbeddingCache:
+    """Texts embedded before are served from the persistent cache"""
+
+    def test_reingesting_unchanged_text_skips_the_model(self, fake_model, tmp_path):
+        service = embedding_service.SentenceTransformerEmbeddingService(batch_size=4)
+        service.cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_bytes=0)
+        chunks = [f"transaction {i}: coffee ${i}.50" for i in range(10)]
+
+        first = asyncio.run(service.generate_embeddings(chunks))
+        encoded = sum(len(batch) for batch in fake_model.batches)
+
+        # A new process (fresh service and connection) re-ingests the same corpus plus one new chunk
+        service = embedding_service.SentenceTransformerEmbeddingService(batch_size=4)
+        service.cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_bytes=0)
+        second = asyncio.run(service.generate_embeddings(chunks + ["transaction   10:  rent"]))
+
+        assert encoded == len(chunks)
+        assert sum(len(batch) for batch in fake_model.batches) == len(chunks) + 1
+        np.testing.assert_array_equal(second[:len(chunks)], first)
+        assert service.cache.get_stats()["hits"] == len(chunks)
+
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_bytes=20000)
+        vectors = np.ones((1, 384), dtype=np.float32)
+        for i in range(40):
+            cache.put_many("model", [f"text {i}"], vectors)
+
+        stats = cache.get_stats()
+        assert stats["evictions"] > 0
+        assert stats["cached_bytes"] <= 20000
+        assert 0 in cache.get_many("model", ["text 39"])
+        assert cache.get_many("model", ["text 0"]) == {}
+
+
+class TestLengthBucketedBatching:
+    """Texts are batched by length within a token budget and returned in input order"""
+
+    def test_batches_by_length_and_restores_order(self, fake_model, monkeypatch):
+        monkeypatch.setattr(embedding_service.settings, "EMBEDDING_BATCH_TOKEN_BUDGET", 400)
+        service = embedding_service.SentenceTransformerEmbeddingService()
+        # Short transaction lines interleaved with long pages
+        texts = []
+        for i in range(20):
+            texts.append(f"01/{i + 1:02d} COFFEE -$4.{i:02d}")
+            if i % 4 == 0:
+                texts.append("Page text of a long report. " * 30)
+
+        embeddings = asyncio.run(service.generate_embeddings(texts))
+
+        # Rows come back in input order (the fake model encodes each text's length)
+        assert embeddings[:, 0].tolist() == [float(len(text)) for text in texts]
+        # Long pages never share a batch with transaction lines
+        for batch in fake_model.batches:
+            assert len({len(text) > 100 for text in batch}) == 1
+        lengths = service._token_lengths(texts)
+        for batch in fake_model.batches:
+            longest = max(lengths[texts.index(text)] for text in batch)
+            assert len(batch) * longest <= 400
@@ -0,0 +1,94 @@
+"""
+Unit tests for the bounded, per-user fair LLM scheduler
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from app.core.exceptions import InferenceQueueFullError
+from app.services.llm_scheduler import LLMScheduler
+
+
+def slow_generate(label, order, seconds=0.05):
+    """Stands in for generate_response: blocks its thread like a llama.cpp call"""
+    time.sleep(seconds)
+    order.append(label)
+    return f"answer {label}"
+
+
+class TestLLMScheduler:
+    """Generation runs off the event loop, one call at a time, taking turns between users"""
+
+    def test_users_take_turns(self):
+        scheduler = LLMScheduler(max_pending=10, max_pending_per_user=5)
+        order = []
+
+        async def ask():
+            # The first call occupies the worker while the rest queue up
+            first = asyncio.create_task(scheduler.submit("warmup", slow_generate, "warmup", order))
+            await asyncio.sleep(0.01)
+            heavy = [asyncio.create_task(scheduler.submit(1, slow_generate, f"heavy-{i}", order)) for i in range(3)]
+            light = asyncio.create_task(scheduler.submit(2, slow_generate, "light", order))
+            return await asyncio.gather(first, *heavy, light)
+
+        answers = asyncio.run(ask())
+
+        assert answers[-1] == "answer light"
+        # The light user is served right after the heavy user's first question, not after all three
+        assert order == ["warmup", "heavy-0", "light", "heavy-1", "heavy-2"]
+        stats = scheduler.get_stats()
+        assert stats["completed"] == 5
+        assert stats["pending"] == 0
+
+    def test_full_queue_is_rejected_with_retry_hint(self):
+        scheduler = LLMScheduler(max_pending=2, max_pending_per_user=1)
+        order = []
+
+        async def flood():
+            running = asyncio.create_task(scheduler.submit("a", slow_generate, "running", order, 0.2))
+            await asyncio.sleep(0.01)
+            queued = [asyncio.create_task(scheduler.submit(user, slow_generate, user, order)) for user in ("b", "c")]
+            await asyncio.sleep(0)
+            with pytest.raises(InferenceQueueFullError) as per_user:
+                await scheduler.submit("b", slow_generate, "b again", order)
+            with pytest.raises(InferenceQueueFullError) as full:
+                await scheduler.submit("d", slow_generate, "d", order)
+            await asyncio.gather(running, *queued)
+            return per_user.value, full.value
+
+        per_user, full = asyncio.run(flood())
+
+        assert per_user.per_user and not full.per_user
+        assert full.retry_after >= 1
+        stats = scheduler.get_stats()
+        assert (stats["rejected_user"], stats["rejected_full"]) == (1, 1)
+        assert order == ["running", "b", "c"]
+
+    def test_event_loop_stays_responsive_while_generating(self):
+        scheduler = LLMScheduler(max_pending=4, max_pending_per_user=4)
+        order = []
+
+        async def generate_while_ticking():
+            gaps = []
+            done = asyncio.Event()
+
+            async def ticker():
+                last = time.perf_counter()
+                while not done.is_set():
+                    await asyncio.sleep(0.005)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            ticking = asyncio.create_task(ticker())
+            await asyncio.gather(*[scheduler.submit(1, slow_generate, i, order, 0.1) for i in range(3)])
+            done.set()
+            await ticking
+            return gaps
+
+        gaps = asyncio.run(generate_while_ticking())
+
+        assert len(gaps) > 20
+        assert max(gaps) < 0.08
@@ -0,0 +1,46 @@
+"""
+Unit tests for the streamed /ask endpoint's event generator
+"""
+
+import asyncio
+import json
+
+from app.api.endpoints.queries import _answer_events
+
+
+def parse(events):
+    parsed = []
+    for event in events:
+        name, data = event.strip().split("\n")
+        parsed.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+async def collect(first_token, queued, answer):
+    events: asyncio.Queue = asyncio.Queue()
+    for item in queued:
+        events.put_nowait(item)
+
+    async def answering():
+        return {"answer": answer}
+
+    task = asyncio.create_task(answering())
+    await task
+    return parse([event async for event in _answer_events(first_token, events, task, 0.0)])
+
+
+class TestAnswerEvents:
+    """Every generated token is streamed before the final event"""
+
+    def test_tokens_queued_behind_the_end_marker_are_sent(self):
+        events = asyncio.run(collect("Hello", [None, " world"], "Hello world"))
+
+        assert [name for name, _ in events] == ["token", "token", "final"]
+        assert "".join(data["text"] for name, data in events if name == "token") == "Hello world"
+        assert events[-1][1]["answer"] == "Hello world"
+
+    def test_changed_answer_is_corrected(self):
+        events = asyncio.run(collect("Hello", [None], "Hi"))
+
+        assert [name for name, _ in events] == ["token", "correction", "final"]
+        assert events[1][1] == {"answer": "Hi"}
@@ -0,0 +1,64 @@
+"""
+Unit tests for the bounded answer cache
+"""
+
+import numpy as np
+
+from app.utils.caching import ResponseCache
+
+CHUNKS = ResponseCache.context_key(["03/14/2024 GROCERY MART -$82.10", "03/20/2024 GROCERY MART -$45.00"])
+
+
+def embedding(*values):
+    return np.array(values, dtype=np.float32)
+
+
+class TestResponseCache:
+    """Answers are reused per user and retrieved chunks, within bounds"""
+
+    def test_exact_and_near_duplicate_hits(self):
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95)
+        cache.set(1, "How much did I spend at Grocery Mart?", CHUNKS, "$127.10", embedding(1, 0, 0))
+
+        assert cache.get(1, "  how much did I spend at grocery mart?", CHUNKS) == "$127.10"
+        # A rephrasing whose embedding is nearly the same
+        assert cache.get(1, "What did I spend at Grocery Mart?", CHUNKS, embedding(0.99, 0.1, 0)) == "$127.10"
+        # A different question over the same chunks
+        assert cache.get(1, "When did I shop at Grocery Mart?", CHUNKS, embedding(0.6, 0.8, 0)) is None
+
+        stats = cache.get_stats()
+        assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+        assert stats["memory_bytes"] > 0
+
+    def test_scoped_to_user_chunks_and_numbers(self):
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95)
+        cache.set(1, "How much did I spend in 2024?", CHUNKS, "$127.10", embedding(1, 0, 0))
+
+        assert cache.get(2, "How much did I spend in 2024?", CHUNKS, embedding(1, 0, 0)) is None
+        other_chunks = ResponseCache.context_key(["04/02/2024 GROCERY MART -$12.00"])
+        assert cache.get(1, "How much did I spend in 2024?", other_chunks, embedding(1, 0, 0)) is None
+        # Near-identical wording, different year
+        assert cache.get(1, "How much did I spend in 2023?", CHUNKS, embedding(1, 0, 0)) is None
+
+    def test_bounded_by_size_and_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95)
+        for i in range(3):
+            cache.set(1, f"question {i}", CHUNKS, f"answer {i}")
+        assert cache.get(1, "question 0", CHUNKS) is None
+        assert cache.get(1, "question 2", CHUNKS) == "answer 2"
+        assert cache.get_stats()["evictions"] == 1
+
+        expired = ResponseCache(max_entries=2, ttl_seconds=-1, similarity_threshold=0.95)
+        expired.set(1, "question", CHUNKS, "answer")
+        assert expired.get(1, "question", CHUNKS) is None
+        assert expired.get_stats()["size"] == 0
+
+    def test_invalidated_when_user_data_changes(self):
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95)
+        cache.set(1, "question", CHUNKS, "answer", embedding(1, 0))
+        cache.set(2, "question", CHUNKS, "answer for 2")
+
+        assert cache.invalidate_user(1) == 1
+        assert cache.get(1, "question", CHUNKS, embedding(1, 0)) is None
+        assert cache.get(2, "question", CHUNKS) == "answer for 2"
+        assert cache.get_stats()["invalidations"] == 1
@@ -0,0 +1,79 @@
+"""
+Unit tests for the vector namespace catalog
+"""
+
+import os
+
+from app.services import vector_catalog
+from app.services.vector_catalog import VectorCatalog
+
+
+def register(catalog, namespace, user_id=1, vector_count=3):
+    catalog.register(namespace, user_id, "generic", vector_count, f"/data/{namespace}.index", f"/data/{namespace}.chunks")
+
+
+class TestVectorCatalog:
+    """Writes are journaled, replayed on load and folded into the manifest"""
+
+    def test_writes_survive_a_restart(self, tmp_path):
+        manifest_path = str(tmp_path / "catalog.json")
+        catalog = VectorCatalog(manifest_path)
+        catalog.load(lambda: [])
+        register(catalog, "user_1_doc_a")
+        register(catalog, "user_1_doc_b")
+        register(catalog, "user_2_doc_c", user_id=2)
+        register(catalog, "user_1_doc_a", vector_count=7)
+        catalog.remove("user_1_doc_b")
+
+        restarted = VectorCatalog(manifest_path)
+        restarted.load(lambda: [])
+
+        assert sorted(restarted.get_user_namespaces(1)) == ["user_1_doc_a"]
+        assert restarted.get("user_1_doc_a")["vector_count"] == 7
+        assert restarted.get_user_namespaces(2) == ["user_2_doc_c"]
+
+    def test_writes_append_to_the_journal(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vector_catalog, "JOURNAL_COMPACT_MIN_LINES", 4)
+        catalog = VectorCatalog(str(tmp_path / "catalog.json"))
+        catalog.load(lambda: [])
+        manifest_mtime = os.stat(catalog.manifest_path).st_mtime_ns
+
+        for i in range(4):
+            register(catalog, "user_1_doc_a", vector_count=i)
+        assert os.stat(catalog.manifest_path).st_mtime_ns == manifest_mtime
+        with open(catalog.journal_path) as f:
+            assert len(f.readlines()) == 4
+
+        # The next write folds the journal into the manifest
+        register(catalog, "user_1_doc_a", vector_count=4)
+        assert not os.path.exists(catalog.journal_path)
+        restarted = VectorCatalog(catalog.manifest_path)
+        restarted.load(lambda: [])
+        assert restarted.get("user_1_doc_a")["vector_count"] == 4
+
+    def test_torn_journal_line_is_skipped(self, tmp_path):
+        catalog = VectorCatalog(str(tmp_path / "catalog.json"))
+        catalog.load(lambda: [])
+        register(catalog, "user_1_doc_a")
+        with open(catalog.journal_path, "a") as f:
+            f.write('{"namespace": "user_1_doc_b", "ent')
+
+        restarted = VectorCatalog(catalog.manifest_path)
+        restarted.load(lambda: [])
+
+        assert restarted.get_user_namespaces(1) == ["user_1_doc_a"]
+
+    def test_write_after_a_torn_line_survives_a_restart(self, tmp_path):
+        catalog = VectorCatalog(str(tmp_path / "catalog.json"))
+        catalog.load(lambda: [])
+        register(catalog, "user_1_doc_a")
+        with open(catalog.journal_path, "a") as f:
+            f.write('{"namespace": "user_1_doc_b", "ent')
+
+        restarted = VectorCatalog(catalog.manifest_path)
+        restarted.load(lambda: [])
+        register(restarted, "user_1_doc_c")
+
+        reloaded = VectorCatalog(catalog.manifest_path)
+        reloaded.load(lambda: [])
+        assert sorted(reloaded.get_user_namespaces(1)) == ["user_1_doc_a", "user_1_doc_c"]
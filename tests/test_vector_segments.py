@@ -0,0 +1,59 @@
+"""
+Unit tests for segment persistence of the FAISS vector store
+"""
+
+import numpy as np
+
+from app.services.vector_segments import SegmentLog
+from app.services.vector_store_service import FAISSVectorStoreService
+
+NAMESPACE = "user_1_doc_report"
+
+
+def add_batches(service, batches, size=4, dimension=8):
+    rng = np.random.default_rng(0)
+    for batch in range(batches):
+        entries = [{"content": f"batch {batch} chunk {i}", "metadata": {}} for i in range(size)]
+        service.add_vectors(NAMESPACE, rng.random((size, dimension), dtype=np.float32), entries, "generic")
+
+
+def corrupt(path):
+    with open(path, "r+b") as f:
+        f.seek(60)
+        f.write(b"xx")
+
+
+class TestSegmentReplay:
+    """Batches appended as segments come back after a restart, aligned with their chunk rows"""
+
+    def test_segments_replayed_after_restart(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "namespace")
+        service.segment_merge_threshold = 0
+        add_batches(service, 3)
+
+        restarted = FAISSVectorStoreService(str(tmp_path), "namespace")
+        index, chunk_store = restarted._get_loaded_index(NAMESPACE)
+
+        assert index.ntotal == 12
+        assert chunk_store.get(9)["content"] == "batch 2 chunk 1"
+
+    def test_replay_stops_at_a_corrupt_segment(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "namespace")
+        service.segment_merge_threshold = 0
+        add_batches(service, 3)
+        log = SegmentLog.for_index(service._get_index_files(NAMESPACE)[0])
+        corrupt(log.list_segments()[0][1])
+
+        restarted = FAISSVectorStoreService(str(tmp_path), "namespace")
+        index, chunk_store = restarted._get_loaded_index(NAMESPACE)
+
+        # The last segment would land at the wrong positions, so it is set aside too
+        assert index.ntotal == 4
+        assert chunk_store.max_id() == 3
+        assert log.list_segments() == []
+
+        # New batches line up with their chunk rows again
+        add_batches(restarted, 1)
+        index, chunk_store = FAISSVectorStoreService(str(tmp_path), "namespace")._get_loaded_index(NAMESPACE)
+        assert index.ntotal == 8
+        assert chunk_store.get(4)["content"] == "batch 0 chunk 0"
@@ -0,0 +1,185 @@
+"""
+Unit tests for the FAISS vector store service
+"""
+
+import os
+import asyncio
+import threading
+
+import numpy as np
+
+from app.services.vector_store_service import FAISSVectorStoreService
+
+DIMENSION = 8
+
+
+def add_document(service, namespace, texts, seed=0):
+    vectors = np.random.default_rng(seed).random((len(texts), DIMENSION), dtype=np.float32)
+    entries = [{"content": text, "metadata": {"source": namespace}} for text in texts]
+    service.add_vectors(namespace, vectors, entries, "generic")
+    return vectors
+
+
+class TestMemoryBudget:
+    """Least recently used indices are evicted without breaking searches already holding them"""
+
+    def test_evicted_chunk_store_stays_readable(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "namespace")
+        add_document(service, "user_1_doc_a", ["first a", "second a"])
+        add_document(service, "user_1_doc_b", ["first b", "second b"], seed=1)
+        service._unload("user_1_doc_a")
+        service._unload("user_1_doc_b")
+
+        index, chunk_store = service._get_loaded_index("user_1_doc_a")
+        service.memory_budget_bytes = 1
+        service._get_loaded_index("user_1_doc_b")
+
+        assert "user_1_doc_a" not in service._indices
+        assert service.get_memory_stats()["evictions"] == 1
+        # A search that fetched the store before the eviction still reads its rows
+        assert chunk_store.get(1)["content"] == "second a"
+        # and the next lookup reloads the pair
+        assert service._get_loaded_index("user_1_doc_a")[1].get(0)["content"] == "first a"
+
+    def test_deleted_chunk_store_is_not_reopened(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "namespace")
+        add_document(service, "user_1_doc_a", ["first a", "second a"])
+        _, chunk_store = service._get_loaded_index("user_1_doc_a")
+
+        service.delete_namespace("user_1_doc_a")
+
+        assert chunk_store.get(0) is None
+        assert not os.path.exists(chunk_store.path)
+
+
+class TestHybridSearch:
+    """BM25 hits are fused with the vector ranking without changing what "score" means"""
+
+    def build(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "namespace")
+        query = np.zeros((1, DIMENSION), dtype=np.float32)
+        query[0, 0] = 1.0
+        texts = ["annual summary of the account"] + ["zelle to alex jones 4242"] + [
+            f"card payment number {i}" for i in range(30)
+        ]
+        # The summary sits on the query; every other chunk points the opposite way (similarity 0)
+        vectors = np.repeat(-query, len(texts), axis=0)
+        vectors[0] = query[0]
+        entries = [{"content": text, "metadata": {}} for text in texts]
+        service.add_vectors("user_1_doc_statement", vectors, entries, "generic")
+        return service, query
+
+    def test_score_stays_the_similarity(self, tmp_path):
+        service, query = self.build(tmp_path)
+
+        results = asyncio.run(service._search_namespace(query, "user_1_doc_statement", top_k=5, lexical_terms=["zelle"]))
+        results = service._fuse_rankings(results)
+        by_content = {result["content"]: result for result in results}
+
+        summary = by_content["annual summary of the account"]
+        zelle = by_content["zelle to alex jones 4242"]
+        assert summary["score"] == summary["vector_score"] == 1.0
+        assert zelle["score"] == zelle["vector_score"] == 0.0
+        # The exact-token hit is ranked first by the fusion, ahead of the nearest vector
+        ranked = sorted(results, key=lambda r: r["fused_score"], reverse=True)
+        assert [r["content"] for r in ranked] == ["zelle to alex jones 4242", "annual summary of the account"]
+        assert all(0.0 < r["fused_score"] <= 1.0 for r in results)
+
+    def test_lexical_hits_are_capped(self, tmp_path):
+        service, query = self.build(tmp_path)
+
+        results = asyncio.run(service._search_namespace(query, "user_1_doc_statement", top_k=3, lexical_terms=["payment"]))
+
+        assert len([r for r in results if "lexical_score" in r]) == 3
+        assert len(results) <= 6
+
+
+class TestConsolidatedDeletes:
+    """Deleted documents are tombstoned out of searches, compacted away and stay gone after a restart"""
+
+    def build(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "user")
+        # Compaction is run explicitly below, never in the background
+        service.compaction_tombstone_ratio = 2.0
+        vectors = add_document(service, "user_1_doc_a", ["first a", "second a"])
+        add_document(service, "user_1_doc_b", ["first b", "second b", "third b"], seed=1)
+        return service, vectors[:1]
+
+    def search(self, service, query):
+        results = asyncio.run(service._search_namespace(query, "user_1", top_k=10))
+        return sorted(result["content"] for result in results)
+
+    def test_deleted_document_is_excluded_from_search(self, tmp_path):
+        service, query = self.build(tmp_path)
+        assert "first a" in self.search(service, query)
+
+        assert service.delete_namespace("user_1_doc_a") == 2
+
+        assert self.search(service, query) == ["first b", "second b", "third b"]
+        assert service.catalog.get("user_1")["vector_count"] == 3
+        assert not service.has_namespace("user_1_doc_a")
+        # The tombstones are persisted, so a restart does not resurrect the document
+        assert self.search(FAISSVectorStoreService(str(tmp_path), "user"), query) == ["first b", "second b", "third b"]
+
+    def test_single_chunk_document_keeps_its_id_after_restart(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "user")
+        query = add_document(service, "user_1_doc_a", ["only a"])
+
+        restarted = FAISSVectorStoreService(str(tmp_path), "user")
+        add_document(restarted, "user_1_doc_b", ["only b"], seed=1)
+
+        chunk_store = restarted._get_loaded_index("user_1")[1]
+        assert [chunk_store.get(i)["content"] for i in chunk_store.ids()] == ["only a", "only b"]
+        assert self.search(restarted, query) == ["only a", "only b"]
+
+    def test_compaction_keeps_the_surviving_rows(self, tmp_path):
+        service, query = self.build(tmp_path)
+        service.delete_namespace("user_1_doc_a")
+
+        assert service.compact("user_1") == 2
+
+        index, chunk_store = service._get_loaded_index("user_1")
+        assert index.ntotal == 3
+        assert chunk_store.ids() == [2, 3, 4]
+        assert chunk_store.get(3)["content"] == "second b"
+        assert not service._get_tombstones("user_1")
+
+        restarted = FAISSVectorStoreService(str(tmp_path), "user")
+        assert restarted._get_loaded_index("user_1")[0].ntotal == 3
+        assert self.search(restarted, query) == ["first b", "second b", "third b"]
+        # New vectors never reuse a compacted ID
+        add_document(restarted, "user_1_doc_c", ["first c"], seed=2)
+        assert restarted._get_loaded_index("user_1")[1].ids(namespaces=["user_1_doc_c"]) == [5]
+
+    def test_searches_run_while_compacting(self, tmp_path):
+        service = FAISSVectorStoreService(str(tmp_path), "user")
+        service.compaction_tombstone_ratio = 2.0
+        query = add_document(service, "user_1_doc_a", [f"deleted {i}" for i in range(2000)])[:1]
+        add_document(service, "user_1_doc_b", [f"kept {i}" for i in range(2000)], seed=1)
+        service.delete_namespace("user_1_doc_a")
+        searched_index, _ = service._get_loaded_index("user_1")
+
+        compacted = threading.Event()
+        contents, errors = [], []
+
+        def search_until_compacted():
+            try:
+                while not compacted.is_set():
+                    results = asyncio.run(service._search_namespace(query, "user_1", top_k=10))
+                    contents.extend(result["content"] for result in results)
+            except Exception as e:
+                errors.append(e)
+
+        searcher = threading.Thread(target=search_until_compacted)
+        searcher.start()
+        try:
+            assert service.compact("user_1") == 2000
+        finally:
+            compacted.set()
+            searcher.join()
+
+        assert not errors
+        assert contents and all(content.startswith("kept") for content in contents)
+        # Searches holding the old index saw it unchanged; the compacted copy replaced it
+        assert searched_index.ntotal == 4000
+        assert service._get_loaded_index("user_1")[0].ntotal == 2000
@@ -154,7 +154,7 @@ def check_vector_storage():
         
         # Count vector files
         index_files = list(vector_path.glob("*.index"))
-        pkl_files = list(vector_path.glob("*.pkl"))
+        pkl_files = list(vector_path.glob("*.pkl")) + list(vector_path.glob("*.chunks"))
         
         logger.info(f"Found {len(index_files)} index files and {len(pkl_files)} metadata files")
         